@@ -0,0 +1,367 @@
+"""
+Latency / throughput benchmark for central.py's OCPP handlers.
+
+Starts central's WebSocket server (``central.ocpp_handler``) in a child
+process on an ephemeral port and drives it with lightweight raw OCPP 1.6J
+clients. Reports p50/p95/p99 round-trip latency per action, sustained
+messages/sec and server RSS per connection, and writes the results as JSON
+so runs can be compared across commits:
+
+    python benchmarks/bench_central.py --clients 200 --cycles 20 --out after.json
+    python benchmarks/bench_central.py --out after.json --baseline before.json
+    python benchmarks/bench_central.py --diff before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ACTIONS = (
+    "BootNotification",
+    "Heartbeat",
+    "StatusNotification",
+    "MeterValues",
+    "StartTransaction",
+    "StopTransaction",
+)
+
+# metrics where a higher value is worse (used by compare())
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+
+
+# ---------------------------------------------------------------- server side
+def _rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _serve(conn, env: Dict[str, str]) -> None:
+    """Child process: run central's OCPP server and report the port."""
+    os.environ.update(env)
+    import central
+
+    async def run():
+        await central.tx_store.open()
+        await central.meter_ingestor.start(central.build_meter_sink(central.METER_SINK, central.METER_DB_PATH))
+        async with websockets.serve(
+            central.ocpp_handler, "127.0.0.1", 0, subprotocols=["ocpp1.6"]
+        ) as server:
+            conn.send(server.sockets[0].getsockname()[1])
+            await asyncio.Future()
+
+    asyncio.run(run())
+
+
+# ---------------------------------------------------------------- client side
+class BenchClient:
+    """Minimal OCPP 1.6J client that times each CALL until its CALLRESULT."""
+
+    def __init__(self, cpid: str, url: str, samples: Dict[str, List[float]]):
+        self.cpid = cpid
+        self.url = f"{url}/{cpid}"
+        self.samples = samples
+        self.ws = None
+        self.messages = 0
+        self._waiting: Dict[str, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        self.ws = await websockets.connect(self.url, subprotocols=["ocpp1.6"], max_queue=None)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _read_loop(self) -> None:
+        async for raw in self.ws:
+            msg = json.loads(raw)
+            if msg[0] == 2:
+                # คำสั่งจาก CSMS (GetConfiguration, ChangeConfiguration, ...): ตอบทันที
+                payload = {"configurationKey": []} if msg[2] == "GetConfiguration" else {"status": "Accepted"}
+                await self.ws.send(json.dumps([3, msg[1], payload]))
+                continue
+            fut = self._waiting.pop(msg[1], None)
+            if fut is not None and not fut.done():
+                fut.set_result(msg)
+
+    async def call(self, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        uid = uuid.uuid4().hex
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting[uid] = fut
+        t0 = time.perf_counter()
+        await self.ws.send(json.dumps([2, uid, action, payload]))
+        msg = await fut
+        self.samples.setdefault(action, []).append((time.perf_counter() - t0) * 1000)
+        self.messages += 1
+        if msg[0] != 3:
+            raise RuntimeError(f"{self.cpid} {action} failed: {msg}")
+        return msg[2]
+
+    async def boot(self) -> None:
+        await self.call(
+            "BootNotification",
+            {"chargePointVendor": "Bench", "chargePointModel": "Load", "firmwareVersion": "1.0"},
+        )
+        await self.status(1, "Available")
+
+    async def status(self, connector_id: int, status: str) -> None:
+        await self.call(
+            "StatusNotification",
+            {"connectorId": connector_id, "errorCode": "NoError", "status": status, "timestamp": _now()},
+        )
+
+    async def session_cycle(self, meter_values: int) -> None:
+        """Heartbeat + one full charging session on connector 1."""
+        await self.call("Heartbeat", {})
+        await self.status(1, "Preparing")
+        conf = await self.call(
+            "StartTransaction",
+            {"connectorId": 1, "idTag": f"TAG-{self.cpid}", "meterStart": 0, "timestamp": _now()},
+        )
+        await self.status(1, "Charging")
+        wh = 0
+        for _ in range(meter_values):
+            wh += 100
+            await self.call(
+                "MeterValues",
+                {
+                    "connectorId": 1,
+                    "transactionId": conf["transactionId"],
+                    "meterValue": [{
+                        "timestamp": _now(),
+                        "sampledValue": [
+                            {"value": str(wh), "measurand": "Energy.Active.Import.Register", "unit": "Wh"},
+                            {"value": "32.0", "measurand": "Current.Import", "unit": "A"},
+                            {"value": "230.0", "measurand": "Voltage", "unit": "V"},
+                            {"value": "7.4", "measurand": "Power.Active.Import", "unit": "kW"},
+                        ],
+                    }],
+                },
+            )
+        await self.call(
+            "StopTransaction",
+            {"transactionId": conf["transactionId"], "meterStop": wh, "timestamp": _now()},
+        )
+        await self.status(1, "Available")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ---------------------------------------------------------------- results
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, ``q`` in [0, 100]."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for action in ACTIONS:
+        values = samples.get(action)
+        if not values:
+            continue
+        out[action] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "max_ms": round(max(values), 3),
+        }
+    return out
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.10) -> List[str]:
+    """
+    Print a side-by-side table and return the regressions: latency
+    percentiles that grew, or throughput that fell, by more than
+    ``threshold`` (relative).
+    """
+    regressions = []
+    rows = []
+    for action in ACTIONS:
+        a = base.get("actions", {}).get(action)
+        b = new.get("actions", {}).get(action)
+        if not a or not b:
+            continue
+        for key in LOWER_IS_BETTER:
+            change = (b[key] - a[key]) / a[key] if a[key] else 0.0
+            rows.append((f"{action} {key}", a[key], b[key], change))
+            if change > threshold:
+                regressions.append(f"{action} {key}: {a[key]} -> {b[key]} ms ({change:+.0%})")
+    a = base.get("throughput", {}).get("msgs_per_sec")
+    b = new.get("throughput", {}).get("msgs_per_sec")
+    if a and b:
+        change = (b - a) / a
+        rows.append(("throughput msgs/s", a, b, change))
+        if -change > threshold:
+            regressions.append(f"throughput: {a} -> {b} msgs/s ({change:+.0%})")
+    a = base.get("memory", {}).get("per_connection_kb")
+    b = new.get("memory", {}).get("per_connection_kb")
+    if a and b:
+        rows.append(("memory KB/connection", a, b, (b - a) / a))
+
+    print(f"{'metric':<34}{'base':>12}{'new':>12}{'change':>10}")
+    for name, a, b, change in rows:
+        print(f"{name:<34}{a:>12}{b:>12}{change:>+10.1%}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------------------------------------------------- runner
+async def drive(url: str, server_pid: int, args: argparse.Namespace) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {}
+    clients = [BenchClient(f"BENCH{i:05d}", url, samples) for i in range(args.clients)]
+    rss_before = _rss_kb(server_pid)
+
+    # phase 1: connect + boot (ทยอยต่อทีละ batch เพื่อไม่ให้ accept backlog เต็ม)
+    for i in range(0, len(clients), args.connect_batch):
+        batch = clients[i:i + args.connect_batch]
+        await asyncio.gather(*(c.connect() for c in batch))
+    await asyncio.gather(*(c.boot() for c in clients))
+    rss_connected = _rss_kb(server_pid)
+
+    # phase 2: sustained session traffic from every client at once
+    for c in clients:
+        c.messages = 0
+
+    async def run_client(c: BenchClient):
+        for _ in range(args.cycles):
+            await c.session_cycle(args.meter_values)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_client(c) for c in clients))
+    elapsed = time.perf_counter() - t0
+    messages = sum(c.messages for c in clients)
+    rss_after = _rss_kb(server_pid)
+    await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    memory = {"baseline_rss_kb": rss_before, "connected_rss_kb": rss_connected, "after_rss_kb": rss_after}
+    if rss_before is not None and rss_connected is not None:
+        memory["per_connection_kb"] = round((rss_connected - rss_before) / max(1, args.clients), 2)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "date": _now(),
+            "python": platform.python_version(),
+            "clients": args.clients,
+            "cycles": args.cycles,
+            "meter_values": args.meter_values,
+            "tx_store": args.tx_store,
+            "meter_sink": args.meter_sink,
+            "log_level": args.log_level,
+            "codec": args.codec,
+            "skip_validation": args.skip_validation,
+        },
+        "actions": summarize(samples),
+        "throughput": {
+            "messages": messages,
+            "seconds": round(elapsed, 3),
+            "msgs_per_sec": round(messages / elapsed, 1) if elapsed else 0.0,
+        },
+        "memory": memory,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            "TX_STORE": args.tx_store,
+            "TX_DB_PATH": os.path.join(tmp, "transactions.db"),
+            "METER_SINK": args.meter_sink,
+            "METER_DB_PATH": os.path.join(tmp, "meter_values.db"),
+            "CAPABILITY_DB_PATH": os.path.join(tmp, "capabilities.db"),
+            "LOG_LEVEL": args.log_level,
+            "OCPP_CODEC": args.codec,
+            "OCPP_SKIP_VALIDATION": args.skip_validation,
+            # วัด handler ไม่ใช่ admission control: ทุก client ต้องได้ Accepted
+            "BOOT_RATE_PER_SEC": "0",
+        }
+        ctx = multiprocessing.get_context("spawn")
+        parent, child = ctx.Pipe()
+        server = ctx.Process(target=_serve, args=(child, env), daemon=True)
+        server.start()
+        try:
+            if not parent.poll(30):
+                raise RuntimeError("benchmark server did not start")
+            port = parent.recv()
+            return asyncio.run(drive(f"ws://127.0.0.1:{port}/ocpp", server.pid, args))
+        finally:
+            server.terminate()
+            server.join()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark central.py OCPP message handling")
+    p.add_argument("--clients", type=int, default=100, help="concurrent charge points")
+    p.add_argument("--cycles", type=int, default=10, help="charging sessions per client")
+    p.add_argument("--meter-values", type=int, default=5, help="MeterValues per session")
+    p.add_argument("--connect-batch", type=int, default=200, help="connections opened at once")
+    p.add_argument("--tx-store", default="memory", choices=("memory", "sqlite"))
+    p.add_argument("--meter-sink", default="none", choices=("none", "sqlite", "jsonl"))
+    p.add_argument("--log-level", default="WARNING", help="server log level during the run")
+    p.add_argument("--codec", default="auto", choices=("auto", "orjson", "json"), help="server OCPP_CODEC")
+    p.add_argument("--skip-validation", default="", help="server OCPP_SKIP_VALIDATION, e.g. Heartbeat,MeterValues")
+    p.add_argument("--out", help="write results JSON here")
+    p.add_argument("--baseline", help="compare the run with this results JSON")
+    p.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    p.add_argument("--diff", nargs=2, metavar=("BASE", "NEW"), help="only compare two results files")
+    args = p.parse_args(argv)
+
+    if args.diff:
+        base, new = (json.loads(Path(f).read_text()) for f in args.diff)
+        regressions = compare(base, new, args.threshold)
+    else:
+        result = run(args)
+        print(json.dumps(result, indent=2))
+        if args.out:
+            Path(args.out).write_text(json.dumps(result, indent=2) + "\n")
+        regressions = []
+        if args.baseline:
+            regressions = compare(json.loads(Path(args.baseline).read_text()), result, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+CPU cost per OCPP frame of the codec layer (ocpp_common/codec.py) and of the
+precompiled dispatch (csms/dispatch.py) against the ocpp library's own
+json + jsonschema + routing path.
+
+Raw frames are fed straight into ``ChargePoint.route_message`` (decode,
+schema validation, handler, encoding of the reply) and ``call()`` is
+answered by a connection stub, so only per-message CPU is measured: no
+sockets, no waiting on the loop.
+
+    python benchmarks/bench_codec.py --messages 20000
+    python benchmarks/bench_codec.py --out codec.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from ocpp.routing import on  # noqa: E402
+from ocpp.v16 import ChargePoint, call, call_result  # noqa: E402
+from ocpp.v16.enums import Action  # noqa: E402
+
+from ocpp_common import codec  # noqa: E402
+from csms.dispatch import PrecompiledDispatch  # noqa: E402
+
+TS = "2024-01-01T00:00:00Z"
+METER_VALUE = [
+    {
+        "timestamp": TS,
+        "sampledValue": [
+            {"value": "12345.6", "measurand": "Energy.Active.Import.Register", "unit": "Wh"},
+            {"value": "7200.0", "measurand": "Power.Active.Import", "unit": "W"},
+            {"value": "31.2", "measurand": "Current.Import", "unit": "A", "phase": "L1"},
+            {"value": "230.1", "measurand": "Voltage", "unit": "V", "phase": "L1-N"},
+            {"value": "54", "measurand": "SoC", "unit": "Percent", "location": "EV"},
+        ],
+    }
+]
+# inbound CALLs (charger -> CSMS)
+FRAMES = {
+    "Heartbeat": [2, "1", "Heartbeat", {}],
+    "StatusNotification": [
+        2, "1", "StatusNotification",
+        {"connectorId": 1, "errorCode": "NoError", "status": "Charging", "timestamp": TS},
+    ],
+    "MeterValues": [2, "1", "MeterValues", {"connectorId": 1, "transactionId": 42, "meterValue": METER_VALUE}],
+}
+# (mode, codec, actions without schema validation, precompiled dispatch); "ocpp" = library as shipped
+MODES = (
+    ("ocpp", None, "", False),
+    ("json", "json", "", False),
+    ("orjson", "orjson", "", False),
+    ("orjson+skip", "orjson", "Heartbeat,StatusNotification,MeterValues", False),
+    ("orjson+dispatch", "orjson", "", True),
+    ("orjson+dispatch+skip", "orjson", "Heartbeat,StatusNotification,MeterValues", True),
+)
+
+
+class BenchChargePoint(codec.ValidationBypass, ChargePoint):
+    @on(Action.Heartbeat)
+    def on_heartbeat(self, **kwargs):
+        return call_result.HeartbeatPayload(current_time=TS)
+
+    @on(Action.StatusNotification)
+    def on_status_notification(self, connector_id, error_code, status, **kwargs):
+        return call_result.StatusNotificationPayload()
+
+    @on(Action.MeterValues)
+    def on_meter_values(self, connector_id, meter_value, **kwargs):
+        return call_result.MeterValuesPayload()
+
+
+class DispatchChargePoint(PrecompiledDispatch, BenchChargePoint):
+    pass
+
+
+class StubConnection:
+    """Collects what the charge point sends; answers its CALLs like a peer would."""
+
+    def __init__(self):
+        self.cp: Optional[ChargePoint] = None
+        self.sent = 0
+
+    async def send(self, message: str) -> None:
+        self.sent += 1
+        frame = json.loads(message)
+        if frame[0] == 2:
+            reply = {"currentTime": TS} if frame[2] == "Heartbeat" else {}
+            await self.cp.route_message(json.dumps([3, frame[1], reply]))
+
+
+async def _measure(
+    mode: str, codec_name: Optional[str], skip: str, dispatch: bool, messages: int
+) -> Dict[str, float]:
+    if codec_name is None:
+        codec.uninstall()
+    else:
+        codec.install(codec_name)
+    BenchChargePoint.skip_validation = codec.parse_actions(skip)
+    conn = StubConnection()
+    cp = (DispatchChargePoint if dispatch else BenchChargePoint)("BENCH", conn)
+    conn.cp = cp
+    out: Dict[str, float] = {}
+    for action, frame in FRAMES.items():
+        raw = json.dumps(frame, separators=(",", ":"))
+        for _ in range(200):  # warm-up (schema cache, dataclass paths)
+            await cp.route_message(raw)
+        t0 = time.perf_counter()
+        for _ in range(messages):
+            await cp.route_message(raw)
+        out[f"in.{action}"] = (time.perf_counter() - t0) / messages * 1e6
+    # outbound (what the simulator does): call() + validation of request and response
+    outbound = {
+        "Heartbeat": lambda: call.HeartbeatPayload(),
+        "MeterValues": lambda: call.MeterValuesPayload(connector_id=1, meter_value=METER_VALUE, transaction_id=42),
+    }
+    for action, make in outbound.items():
+        for _ in range(200):
+            await cp.call(make())
+        t0 = time.perf_counter()
+        for _ in range(messages):
+            await cp.call(make())
+        out[f"out.{action}"] = (time.perf_counter() - t0) / messages * 1e6
+    return {k: round(v, 2) for k, v in out.items()}
+
+
+def run(messages: int) -> Dict[str, Any]:
+    import logging
+
+    # ocpp logs every frame at INFO: not what is measured here
+    logging.getLogger("ocpp").setLevel(logging.WARNING)
+    results = {}
+    for mode, codec_name, skip, dispatch in MODES:
+        if codec_name == "orjson" and codec.orjson is None:
+            continue
+        results[mode] = asyncio.run(_measure(mode, codec_name, skip, dispatch, messages))
+    codec.uninstall()
+    base = results["ocpp"]
+    speedup = {
+        mode: {k: round(base[k] / v, 2) for k, v in res.items()} for mode, res in results.items() if mode != "ocpp"
+    }
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "messages": messages,
+            "orjson": getattr(codec.orjson, "__version__", None),
+        },
+        "us_per_message": results,
+        "speedup_vs_ocpp": speedup,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark the OCPP frame codec and dispatch")
+    p.add_argument("--messages", type=int, default=5000, help="frames per action and mode")
+    p.add_argument("--out", help="write results JSON here")
+    args = p.parse_args(argv)
+    result = run(args.messages)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
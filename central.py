@@ -5,12 +5,16 @@ import logging
 import json
 import hashlib
 from datetime import datetime
-from typing import List, Any, Dict, Tuple
-import itertools
+from typing import List, Any, Callable, Dict, Optional, Tuple
+import multiprocessing
+import signal
+import socket
 import threading
+import time
 
 from websockets import serve
-from ocpp.routing import on
+from ocpp.charge_point import camel_to_snake_case
+from ocpp.routing import after, on
 from ocpp.v16 import ChargePoint, call, call_result
 from ocpp.v16.enums import (
     RegistrationStatus,
@@ -21,17 +25,280 @@ from ocpp.v16.enums import (
 )
 
 # --- เพิ่ม import สำหรับ HTTP API ---
-from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
-logging.basicConfig(level=logging.INFO)
+from csms.config import (
+    OCPP_HOST,
+    OCPP_PORT,
+    HTTP_HOST,
+    HTTP_PORT,
+    CSMS_WORKERS,
+    WORKER_RPC_HOST,
+    WORKER_RPC_BASE_PORT,
+    WORKER_RPC_TIMEOUT_SEC,
+    METER_SINK,
+    METER_DB_PATH,
+    METER_QUEUE_MAX,
+    METER_BATCH_SIZE,
+    METER_FLUSH_SEC,
+    METER_SERIES_CAPACITY,
+    METER_MAX_SERIES,
+    TX_STORE,
+    TX_DB_PATH,
+    EVENTS_BUFFER,
+    EVENTS_KEEPALIVE_SEC,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_SAMPLE,
+    LOG_QUEUE,
+    LOG_QUEUE_MAX,
+    LOG_OCPP_LEVEL,
+    CAPABILITY_DB_PATH,
+    BOOT_RATE_PER_SEC,
+    BOOT_BURST,
+    BOOT_PENDING_MIN_SEC,
+    BOOT_PENDING_MAX_SEC,
+    BOOT_PENDING_JITTER,
+    HEARTBEAT_MIN_SEC,
+    HEARTBEAT_MAX_SEC,
+    HEARTBEAT_TARGET_PER_SEC,
+    COMMAND_TIMEOUT_SEC,
+    COMMAND_QUEUE_MAX,
+    BULK_CONCURRENCY,
+    TIMER_TICK_SEC,
+    NO_SESSION_TIMEOUT_SEC,
+    PENDING_START_TTL_SEC,
+    PENDING_START_MAX,
+    CHARGER_STATE_GRACE_SEC,
+    OCPP_PING_INTERVAL_SEC,
+    OCPP_PING_TIMEOUT_SEC,
+    OCPP_PING_MIN_SEC,
+    AUTH_BACKEND,
+    AUTH_DB_PATH,
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TTL_SEC,
+    AUTH_NEGATIVE_TTL_SEC,
+    AUTH_FAIL_OPEN,
+    AUTH_LOCAL_LIST_MAX,
+    OCPP_CODEC,
+    OCPP_SKIP_VALIDATION,
+    OCPP_TRUSTED_CPIDS,
+)
+from csms.registry import SessionRegistry, RemoteCallError
+from csms.meter_ingest import MeterIngestor, build_meter_sink, parse_meter_values
+from csms.timeseries import MeterSeriesStore
+from csms.tx_store import build_tx_store
+from csms.session_index import SessionIndex
+from csms.events import EventBus, EVENT_TYPES
+from csms.capabilities import CHARGER_SETTINGS, CapabilityCache, parse_configuration_keys, parse_configuration_values
+from csms.admission import BootAdmission
+from csms.commands import PRIORITIES, CommandError, CommandQueue, fan_out, outcome_of, summarize as summarize_outcomes
+from ocpp_common.codec import ValidationBypass, install as install_codec, parse_actions
+from csms.dispatch import PrecompiledDispatch, constant_result
+from ocpp_common.logs import ContextLogger, Lazy, configure_logging
+from csms.timers import Timer, TimerWheel
+from csms.pending import PendingStarts
+from csms.charger_state import ChargerState, ChargerStates
+from csms.liveness import Liveness, Probe
+from csms.auth import ACCEPTED, Authorizer, build_auth_backend
+from csms.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, merge_families, render as render_metrics
+
+# log ผ่าน queue ให้ thread แยกเป็นคนเขียน (event loop ไม่ต้องรอ I/O), LOG_FORMAT=json สำหรับ log แบบมีโครงสร้าง
+configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE, LOG_QUEUE, LOG_QUEUE_MAX)
+if LOG_OCPP_LEVEL:
+    logging.getLogger("ocpp").setLevel(LOG_OCPP_LEVEL)
+log = logging.getLogger("csms")
+# encode/decode frame ด้วย orjson (ถ้ามี) แทน json ของ ocpp และโหลด schema validator ไว้ล่วงหน้า
+log.info("OCPP codec: %s", install_codec(OCPP_CODEC))
 
 # === เก็บ reference ของ CP ที่ต่ออยู่ เพื่อเรียกใช้สั่ง start/stop ได้จากคอนโซล/HTTP ===
-connected_cps: Dict[str, "CentralSystem"] = {}
+# โหมด worker: แต่ละ process เก็บเฉพาะตู้ที่ต่อกับตัวเอง และรู้ว่าตู้อื่นอยู่ที่ worker ไหน
+connected_cps: SessionRegistry = SessionRegistry()
+
+# === buffer ของ MeterValues ก่อนเขียนลง storage (ไม่ block handler) ===
+meter_ingestor = MeterIngestor(
+    max_queue=METER_QUEUE_MAX,
+    batch_size=METER_BATCH_SIZE,
+    flush_interval=METER_FLUSH_SEC,
+)
+
+# === ค่า meter ล่าสุดต่อหัวชาร์จ (ring buffer ขนาดคงที่) สำหรับ /api/v1/meter ===
+meter_store = MeterSeriesStore(capacity=METER_SERIES_CAPACITY, max_series=METER_MAX_SERIES)
+
+# === ที่เก็บธุรกรรม: ออกเลข transactionId ให้ StartTransaction.conf และจำธุรกรรมที่ยังเปิดอยู่ ===
+# (sqlite: เลขไม่ซ้ำข้ามการ restart และกู้ active_tx คืนเมื่อตู้ต่อกลับมา)
+tx_store = build_tx_store(TX_STORE, TX_DB_PATH)
+
+# === index ธุรกรรมทั้ง fleet: txId / idTag / cpid -> session (ค้นหา O(1) แทนการวนทุกตู้) ===
+session_index = SessionIndex()
+
+# === pub/sub ของ event (status / session / meter) สำหรับ /api/v1/events ===
+event_bus = EventBus(buffer_size=EVENTS_BUFFER)
+
+# === configuration keys ที่ตู้รองรับ: จำต่อรุ่น/firmware และต่อ cpid เพื่อไม่ต้อง GetConfiguration ทุกครั้งที่ boot ===
+capability_cache = CapabilityCache(CAPABILITY_DB_PATH)
+
+# === จำกัดอัตรา BootNotification ที่รับ (ตอบ Pending เมื่อเกิน) และปรับ heartbeat interval ตามจำนวนตู้ ===
+boot_admission = BootAdmission(
+    rate=BOOT_RATE_PER_SEC,
+    burst=BOOT_BURST,
+    pending_min=BOOT_PENDING_MIN_SEC,
+    pending_max=BOOT_PENDING_MAX_SEC,
+    jitter=BOOT_PENDING_JITTER,
+    heartbeat_min=HEARTBEAT_MIN_SEC,
+    heartbeat_max=HEARTBEAT_MAX_SEC,
+    heartbeat_target_per_sec=HEARTBEAT_TARGET_PER_SEC,
+)
+
+# === timer ทั้งหมดของ process ใน wheel เดียว: arm/cancel O(1), ตื่นครั้งเดียวต่อ tick แทน task ต่อ timer ===
+timers = TimerWheel(tick=TIMER_TICK_SEC)
+
+# === สถานะต่อ cpid ที่อยู่ต่อข้ามการเชื่อมต่อ: WebSocket หลุดชั่วคราวไม่ทำให้ลืม active_tx ===
+def _new_pending_starts() -> PendingStarts:
+    return PendingStarts(
+        timers, PENDING_START_TTL_SEC, PENDING_START_MAX,
+        on_outcome=lambda outcome: remote_start_outcomes.labels(outcome).inc(),
+    )
+
+
+def _charger_state_expired(state: ChargerState) -> None:
+    # ไม่กลับมาภายใน grace หรือไปต่อที่ worker อื่น: ถือว่าตู้ไปแล้ว
+    # (ธุรกรรมที่ค้างยังอยู่ใน tx_store, โหลดใหม่เมื่อตู้ต่อเข้ามา)
+    state.pending_starts.clear("disconnected")
+    session_index.drop_cp(state.cpid)
+    meter_store.drop(state.cpid)
+    log.info("[Central] State of %s dropped", state.cpid, extra={"cpid": state.cpid, "action": "disconnect"})
+
+
+charger_states = ChargerStates(timers, CHARGER_STATE_GRACE_SEC, _new_pending_starts, _charger_state_expired)
+
+# === ping/pong ทุกการเชื่อมต่อบน timer wheel เดียวกัน (ปิด socket ที่ค้างครึ่งทางเร็ว) ===
+liveness = Liveness(timers, OCPP_PING_INTERVAL_SEC, OCPP_PING_TIMEOUT_SEC)
+
+# === ตรวจ idTag กับฐานข้อมูลลูกค้า ผ่าน cache (LRU/TTL) และรวมการค้น idTag เดียวกันที่มาพร้อมกัน ===
+authorizer = Authorizer(
+    build_auth_backend(AUTH_BACKEND, AUTH_DB_PATH),
+    cache_size=AUTH_CACHE_SIZE,
+    ttl=AUTH_CACHE_TTL_SEC,
+    negative_ttl=AUTH_NEGATIVE_TTL_SEC,
+    fail_open=AUTH_FAIL_OPEN,
+)
+
+# === Prometheus metrics สำหรับ /metrics ===
+metrics = MetricsRegistry()
+ocpp_messages = metrics.counter(
+    "ocpp_messages_received", "OCPP CALLs received from charge points", ["action", "outcome"]
+)
+ocpp_handler_seconds = metrics.histogram(
+    "ocpp_handler_seconds", "Time to validate, handle and answer an incoming OCPP CALL", ["action"]
+)
+ocpp_calls = metrics.counter(
+    "ocpp_calls_sent", "OCPP CALLs sent to charge points", ["action", "outcome"]
+)
+ocpp_call_seconds = metrics.histogram(
+    "ocpp_call_seconds", "Round trip of outbound OCPP CALLs until the charge point answers", ["action"]
+)
+bulk_commands = metrics.counter(
+    "bulk_commands", "Commands fanned out by /api/v1/bulk (per charger)", ["action"]
+)
+remote_start_outcomes = metrics.counter(
+    "ocpp_remote_starts", "Pending remote starts by how they ended (completed, expired, mismatch, ...)", ["outcome"]
+)
+authorizations = metrics.counter(
+    "ocpp_authorizations", "idTag authorizations (Authorize and local StartTransaction) by result", ["status"]
+)
+local_list_updates = metrics.counter(
+    "ocpp_local_list_updates", "SendLocalList sent to chargers by update type and response", ["type", "status"]
+)
+commands_expired = metrics.counter(
+    "ocpp_commands_expired", "Queued commands dropped at their deadline before being sent", ["action"]
+)
+connection_takeovers = metrics.counter(
+    "ocpp_connection_takeovers", "New connections of a charger that replaced a still-open one"
+)
+http_requests = metrics.counter(
+    "http_requests", "HTTP API requests", ["method", "route", "status"]
+)
+http_request_seconds = metrics.histogram(
+    "http_request_seconds", "HTTP API request latency", ["method", "route"]
+)
+# gauge คำนวณตอน scrape เท่านั้น ไม่มีต้นทุนบน hot path
+metrics.gauge("ocpp_connected_charge_points", "Charge points connected to this process").set_function(
+    lambda: len(connected_cps)
+)
+metrics.gauge("ocpp_active_transactions", "Open transactions of connected charge points").set_function(
+    lambda: len(session_index)
+)
+metrics.gauge("ocpp_pending_remote_starts", "RemoteStartTransaction requests waiting for StartTransaction").set_function(
+    lambda: sum(len(cp.pending_starts) for cp in connected_cps.values())
+)
+metrics.gauge("ocpp_no_session_watchdogs", "Armed no-session watchdog timers").set_function(
+    lambda: sum(len(cp.no_session_timers) for cp in connected_cps.values())
+)
+metrics.gauge("ocpp_timers_armed", "Timers armed in the process timer wheel").set_function(lambda: len(timers))
+metrics.counter("ocpp_timers_fired", "Timers of the timer wheel that fired since start").set_function(
+    lambda: timers.fired
+)
+metrics.gauge("ocpp_charger_states", "Chargers with state kept in this process (connected or within grace)").set_function(
+    lambda: len(charger_states)
+)
+metrics.gauge("ocpp_detached_charge_points", "Disconnected chargers whose state waits for a reconnect").set_function(
+    lambda: charger_states.detached
+)
+metrics.counter("ocpp_charger_states_resumed", "Reconnects that got their charger state back").set_function(
+    lambda: charger_states.resumed
+)
+metrics.counter("ocpp_charger_states_expired", "Charger states dropped after the grace period").set_function(
+    lambda: charger_states.expired
+)
+metrics.counter("ocpp_pings_sent", "WebSocket pings sent by the CSMS liveness check").set_function(
+    lambda: liveness.pings
+)
+metrics.counter("ocpp_ping_timeouts", "Connections closed because no pong arrived in time").set_function(
+    lambda: liveness.timeouts
+)
+metrics.gauge("ocpp_command_queue_depth", "Outbound commands waiting in per-charger queues").set_function(
+    lambda: sum(len(cp.commands) for cp in connected_cps.values())
+)
+metrics.gauge("events_subscribers", "Open /api/v1/events subscriptions").set_function(
+    lambda: len(event_bus.subscribers)
+)
+
+
+def export_stats(name: str, help: str, stats: Callable[[], Dict[str, Any]], counts: Tuple[str, ...]):
+    """
+    stats() ของ component เป็น metric label stat: ค่าที่นับสะสมใน counts เป็น counter
+    <name>_events_total (rate()/increase() ใช้ได้) ที่เหลือ (ขนาด/ค่าล่าสุด) เป็น gauge <name>
+    """
+    metrics.counter(f"{name}_events", f"{help} counters", ["stat"]).set_function(
+        lambda: {(k,): v for k, v in stats().items() if k in counts}
+    )
+    metrics.gauge(name, f"{help} state", ["stat"]).set_function(
+        lambda: {(k,): v for k, v in stats().items() if k not in counts}
+    )
 
-# === ตัวนับ transactionId ที่ CSMS จะ “ออกเลข” ให้ StartTransaction.conf ===
-_tx_counter = itertools.count(1)
+
+export_stats(
+    "meter_ingest", "MeterValues ingest pipeline", lambda: meter_ingestor.stats(),
+    ("accepted", "dropped", "written", "writeErrors", "batches"),
+)
+export_stats(
+    "capability_cache", "Charger capability cache", lambda: capability_cache.stats(),
+    ("hits", "misses", "invalidations", "coalesced"),
+)
+export_stats(
+    "auth_cache", "idTag authorization cache", lambda: authorizer.stats(),
+    ("hits", "misses", "coalesced", "errors", "evictions"),
+)
+export_stats(
+    "boot_admission", "BootNotification admission", lambda: boot_admission.stats(), ("accepted", "pending")
+)
+metrics.gauge("ocpp_heartbeat_interval_seconds", "Heartbeat interval given to newly accepted charge points").set_function(
+    lambda: boot_admission.heartbeat_interval(connected_cps.fleet_size())
+)
 
 
 def make_display_message_call(message_type: str, uri: str):
@@ -46,7 +313,7 @@ def make_display_message_call(message_type: str, uri: str):
         for attempt_kwargs in ({"message": payload}, {"payload": payload}, {"content": payload}, {"display": payload}):
             try:
                 instance = DisplayMessageCls(**attempt_kwargs)  # type: ignore
-                logging.info(f"Instantiated call.DisplayMessage with args {attempt_kwargs}")
+                logging.info("Instantiated call.DisplayMessage with args %s", attempt_kwargs)
                 return instance
             except Exception:
                 continue
@@ -54,28 +321,107 @@ def make_display_message_call(message_type: str, uri: str):
     try:
         return call.DataTransferPayload("com.yourcompany.payment", "DisplayQRCode", json.dumps(payload))
     except Exception as e:
-        logging.error(f"Failed to build DataTransfer fallback: {e}")
+        logging.error("Failed to build DataTransfer fallback: %s", e)
         raise
 
 
-class CentralSystem(ChargePoint):
+# คำตอบคงที่: ใช้ instance เดียวร่วมกัน และ JSON ของมันถูกสร้าง/validate ครั้งเดียว (ห้ามแก้ค่า)
+AUTHORIZE_ACCEPTED = constant_result(call_result.AuthorizePayload(id_tag_info={"status": AuthorizationStatus.accepted}))
+STATUS_NOTIFICATION_CONF = constant_result(call_result.StatusNotificationPayload())
+METER_VALUES_CONF = constant_result(call_result.MeterValuesPayload())
+DATA_TRANSFER_ACCEPTED = constant_result(call_result.DataTransferPayload(status=DataTransferStatus.accepted))
+
+
+class CentralSystem(PrecompiledDispatch, ValidationBypass, ChargePoint):
     """
     CSMS (Central) สำหรับ OCPP 1.6
     """
 
+    # action ที่ไม่ตรวจ JSON schema สำหรับตู้ที่เชื่อถือได้ (ดู ocpp_common.codec.ValidationBypass)
+    skip_validation = parse_actions(OCPP_SKIP_VALIDATION)
+    trusted_ids = tuple(parse_actions(OCPP_TRUSTED_CPIDS))
+
+    def __init__(self, id, connection, states: Optional[ChargerStates] = None):
+        super().__init__(id, connection)
+        # สถานะธุรกรรม/สถานะหัว/remote start ที่รออยู่ อยู่ใน ChargerState ของ cpid ไม่ใช่ของการเชื่อมต่อนี้
+        # resumed = ตู้ต่อกลับมาภายใน grace และได้สถานะเดิมคืน
+        if states is not None:
+            self.state, self.resumed = states.attach(id, self)
+        else:
+            self.state, self.resumed = ChargerState(id, _new_pending_starts()), False
+        # ping/pong ของการเชื่อมต่อนี้ (ตั้งใน ocpp_handler)
+        self.probe: Optional[Probe] = None
+        # timer watchdog (ใน timer wheel ของ process) สำหรับ connector ที่ยังไม่มี session
+        self.no_session_timers: Dict[int, Timer] = {}
+        # ผลของ BootNotification ล่าสุด (Pending = ยังไม่ให้เข้าระบบ ตู้จะ boot ใหม่ตาม interval)
+        self.registration: str | None = None
+        # รองรับ local list แต่ตอน boot ยังไม่มี idTag ให้ส่ง: อ่านค่าของตู้เมื่อมี idTag แรก
+        self.local_list_pending = False
+        # ทุก record ของตู้นี้มี field cpid (+ action ต่อข้อความ สำหรับ LOG_SAMPLE)
+        self.log = ContextLogger(logging.getLogger("csms.cp"), {"cpid": id})
+        # คำสั่งขาออกทั้งหมดผ่านคิวนี้: ทีละคำสั่งตาม priority พร้อม deadline
+        self.commands = CommandQueue(
+            self.call, COMMAND_QUEUE_MAX, COMMAND_TIMEOUT_SEC, lambda action: commands_expired.labels(action).inc()
+        )
+
     # เก็บสถานะธุรกรรมต่อ connector เพื่อให้ทราบทั้ง transactionId และ idTag
     # key: connector_id (int) -> value: {"transaction_id": int, "id_tag": str}
-    def __init__(self, id, connection):
-        super().__init__(id, connection)
-        self.active_tx: Dict[int, Dict[str, Any]] = {}
-        # เก็บรายการ remote start ที่สั่งไว้ เพื่อใช้ตรวจสอบตอนรับ StartTransaction
-        self.pending_remote: Dict[int, str] = {}
-        # เก็บข้อมูลเพิ่มเติมระหว่างรอ StartTransaction (เช่น vid)
-        self.pending_start: Dict[int, Dict[str, Any]] = {}
-        # เก็บสถานะล่าสุดของแต่ละ connector
-        self.connector_status: Dict[int, str] = {}
-        # เก็บ task watchdog สำหรับ connector ที่ยังไม่มี session
-        self.no_session_tasks: Dict[int, asyncio.Task] = {}
+    @property
+    def active_tx(self) -> Dict[int, Dict[str, Any]]:
+        return self.state.active_tx
+
+    @active_tx.setter
+    def active_tx(self, value: Dict[int, Dict[str, Any]]):
+        self.state.active_tx = value
+
+    # สถานะล่าสุดของแต่ละ connector
+    @property
+    def connector_status(self) -> Dict[int, str]:
+        return self.state.connector_status
+
+    # remote start ที่รอ StartTransaction (idTag ที่ต้องตรง, vid) ต่อ connector; หมดอายุเองตาม TTL
+    @property
+    def pending_starts(self) -> PendingStarts:
+        return self.state.pending_starts
+
+    async def _handle_call(self, msg):
+        # วัดเวลาทุก CALL ที่เข้ามา: validate + handler + ส่งคำตอบ
+        # (ocpp คืน None เมื่อ handler error และตอบ CallError ไปแล้ว)
+        action = msg.action if msg.action in self.route_map else "other"
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            if await super()._handle_call(msg) is not None:
+                outcome = "ok"
+        finally:
+            ocpp_handler_seconds.labels(action).observe(time.perf_counter() - start)
+            ocpp_messages.labels(action, outcome).inc()
+
+    async def call(self, payload, suppress=True, unique_id=None):
+        action = payload.__class__.__name__[:-7]
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await super().call(payload, suppress, unique_id)
+            # CallError จากตู้ (suppress=True) คืนค่า None
+            outcome = "ok" if result is not None else "call_error"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            ocpp_call_seconds.labels(action).observe(time.perf_counter() - start)
+            ocpp_calls.labels(action, outcome).inc()
+
+    async def send_command(self, payload, priority: str = "normal", timeout: Optional[float] = None):
+        """
+        ส่ง CALL ผ่านคิวของตู้ (ไม่เรียก self.call ตรงๆ) แล้วรอคำตอบ
+        raise CommandError เมื่อคิวเต็ม/เลย deadline/ตู้หลุด
+        """
+        return await self.commands.submit(payload, priority, timeout)
 
     # เมธอดสั่งเริ่มชาร์จ
     async def remote_start(self, connector_id: int, id_tag: str):
@@ -86,18 +432,19 @@ class CentralSystem(ChargePoint):
             id_tag=id_tag,
             connector_id=connector_id
         )
-        logging.info(f"→ RemoteStartTransaction to {self.id} (connector={connector_id}, idTag={id_tag})")
-        resp = await self.call(req)
-        logging.info(f"← RemoteStartTransaction.conf: {resp}")
+        extra = {"action": "RemoteStartTransaction", "connectorId": connector_id}
+        self.log.info("→ RemoteStartTransaction to %s (connector=%s, idTag=%s)", self.id, connector_id, id_tag, extra=extra)
+        resp = await self.send_command(req)
+        self.log.info("← RemoteStartTransaction.conf: %s", resp, extra=extra)
         status = getattr(resp, "status", None)
         if status == RemoteStartStopStatus.accepted:
             # จดจำว่า connector นี้มี remote start pending
-            self.pending_remote[int(connector_id)] = id_tag
-            logging.info(
-                "RemoteStartTransaction accepted (chargerจะส่ง StartTransaction.req ตามมา)"
+            self.pending_starts.accept(int(connector_id), id_tag)
+            self.log.info(
+                "RemoteStartTransaction accepted (chargerจะส่ง StartTransaction.req ตามมา)", extra=extra
             )
         else:
-            logging.warning(f"RemoteStartTransaction rejected: {status}")
+            self.log.warning("RemoteStartTransaction rejected: %s", status, extra=extra)
         return status
 
     # เมธอดสั่งหยุดชาร์จ
@@ -106,196 +453,383 @@ class CentralSystem(ChargePoint):
         ส่ง RemoteStopTransaction ด้วย transaction_id
         """
         req = call.RemoteStopTransactionPayload(transaction_id=transaction_id)
-        logging.info(f"→ RemoteStopTransaction to {self.id} (tx={transaction_id})")
-        resp = await self.call(req)
-        logging.info(f"← RemoteStopTransaction.conf: {resp}")
+        extra = {"action": "RemoteStopTransaction", "transactionId": transaction_id}
+        self.log.info("→ RemoteStopTransaction to %s (tx=%s)", self.id, transaction_id, extra=extra)
+        # หยุดชาร์จ/ปลดล็อกมาก่อนคำสั่งอื่นที่รออยู่
+        resp = await self.send_command(req, "high")
+        self.log.info("← RemoteStopTransaction.conf: %s", resp, extra=extra)
         status = getattr(resp, "status", None)
         if status == RemoteStartStopStatus.accepted:
-            logging.info("RemoteStopTransaction accepted")
+            self.log.info("RemoteStopTransaction accepted", extra=extra)
         else:
-            logging.warning(f"RemoteStopTransaction rejected: {status}")
+            self.log.warning("RemoteStopTransaction rejected: %s", status, extra=extra)
 
     async def unlock_connector(self, connector_id: int):
         """ส่งคำสั่ง UnlockConnector ไปยัง charger"""
         req = call.UnlockConnectorPayload(connector_id=connector_id)
-        logging.info(f"→ UnlockConnector to {self.id} (connector={connector_id})")
-        resp = await self.call(req)
-        logging.info(f"← UnlockConnector.conf: {resp}")
+        extra = {"action": "UnlockConnector", "connectorId": connector_id}
+        self.log.info("→ UnlockConnector to %s (connector=%s)", self.id, connector_id, extra=extra)
+        resp = await self.send_command(req, "high")
+        self.log.info("← UnlockConnector.conf: %s", resp, extra=extra)
         return getattr(resp, "status", None)
 
-    async def _no_session_watchdog(self, connector_id: int, timeout: int = 90):
+    def arm_no_session_watchdog(self, connector_id: int, timeout: float = NO_SESSION_TIMEOUT_SEC):
         """
         หากหัวรายงาน Preparing/Occupied แต่ยังไม่มีธุรกรรมภายใน timeout จะปลดล็อกสาย
         """
+        if connector_id not in self.no_session_timers:
+            self.no_session_timers[connector_id] = timers.schedule(
+                timeout, self._no_session_expired, connector_id, timeout
+            )
+
+    def cancel_no_session_watchdog(self, connector_id: int):
+        timer = self.no_session_timers.pop(connector_id, None)
+        if timer is not None:
+            timer.cancel()
+            self.log.debug("Watchdog for connector %s cancelled", connector_id)
+
+    def _no_session_expired(self, connector_id: int, timeout: float):
+        # callback ของ timer wheel: ห้าม block, งานที่ต้องรอคำตอบตู้ทำใน task
+        self.no_session_timers.pop(connector_id, None)
+        status = self.connector_status.get(connector_id)
+        if status in ("Preparing", "Occupied") and connector_id not in self.active_tx:
+            self.log.info(
+                "No session started for connector %s after %ss → unlocking", connector_id, timeout
+            )
+            asyncio.create_task(self._release_after_watchdog(connector_id))
+
+    async def _release_after_watchdog(self, connector_id: int):
         try:
-            await asyncio.sleep(timeout)
-            status = self.connector_status.get(connector_id)
-            if status in ("Preparing", "Occupied") and connector_id not in self.active_tx:
-                logging.info(
-                    f"No session started for connector {connector_id} after {timeout}s → unlocking"
-                )
-                await self.unlock_connector(connector_id)
-                self.pending_remote.pop(connector_id, None)
-                self.pending_start.pop(connector_id, None)
-        except asyncio.CancelledError:
-            logging.debug(f"Watchdog for connector {connector_id} cancelled")
-        finally:
-            self.no_session_tasks.pop(connector_id, None)
+            await self.unlock_connector(connector_id)
+        except Exception as e:
+            self.log.warning("Watchdog unlock of connector %s failed: %s", connector_id, e)
+            return
+        self.pending_starts.finish(connector_id, "released")
 
     @on(Action.BootNotification)
     async def on_boot_notification(self, charge_point_model, charge_point_vendor, **kwargs):
-        logging.info(f"← BootNotification from vendor={charge_point_vendor}, model={charge_point_model}")
+        accepted, interval = boot_admission.decide(connected_cps.fleet_size())
+        self.registration = RegistrationStatus.accepted if accepted else RegistrationStatus.pending
+        self.log.info(
+            "← BootNotification from vendor=%s, model=%s → %s (interval=%ss)",
+            charge_point_vendor, charge_point_model, self.registration, interval,
+            extra={"action": "BootNotification"},
+        )
         response = call_result.BootNotificationPayload(
             current_time=datetime.utcnow().isoformat() + "Z",
-            interval=300,
-            status=RegistrationStatus.accepted
+            interval=interval,
+            status=self.registration
         )
+        return response
 
-        # ดึง supported keys (optional)
-        supported_keys: List[str] = []
-        try:
-            conf_req = call.GetConfigurationPayload()
-            conf_resp = await asyncio.wait_for(self.call(conf_req), timeout=10)
-            logging.info(f"→ GetConfiguration response: {conf_resp}")
-
-            items: Any = []
-            if hasattr(conf_resp, "configuration_key"):
-                items = getattr(conf_resp, "configuration_key")
-            elif hasattr(conf_resp, "configurationKey"):
-                items = getattr(conf_resp, "configurationKey")
-            elif isinstance(conf_resp, dict):
-                items = conf_resp.get("configuration_key") or conf_resp.get("configurationKey") or []
-            for entry in items:
-                if isinstance(entry, dict):
-                    key_name = entry.get("key")
+    @after(Action.BootNotification)
+    async def after_boot_notification(self, charge_point_model, charge_point_vendor, firmware_version=None, **kwargs):
+        """
+        ทำงานหลังส่ง BootNotification.conf แล้ว (ocpp สร้างเป็น task แยก)
+        เดิม GetConfiguration ถูก await ใน handler ทำให้ loop รับข้อความของตู้นี้ค้าง
+        จนคำตอบถูกทิ้งและ boot ช้าเท่า timeout ทุกครั้ง
+        """
+        if self.registration != RegistrationStatus.accepted:
+            # Pending: ยังไม่ทำงานเพิ่ม รอ boot ครั้งถัดไป
+            return
+        # ดึง supported keys (optional): จาก cache ก่อน ถ้าไม่รู้จักรุ่น/firmware นี้จึงถามตู้
+        supported_keys = await capability_cache.resolve(
+            self.id, charge_point_vendor, charge_point_model, firmware_version, self._fetch_configuration_keys
+        ) or []
+
+        # ping ถี่ตาม WebSocketPingInterval ของตู้ (ค่าจำไว้ใน capability cache ไม่ต้องถามทุก boot)
+        if "WebSocketPingInterval" in supported_keys and self.state.ping_interval is None:
+            settings = await self._charger_settings(["WebSocketPingInterval"])
+            self._tune_ping_interval(settings.get("WebSocketPingInterval"))
+
+        # local authorization list: ตู้ตรวจ idTag ที่รู้จักได้เองโดยไม่ต้องส่ง Authorize
+        # backend แก้ไม่ได้ (AUTH_BACKEND=none) ไม่มี list ให้ส่งเลย: ไม่ต้องถามตู้
+        if "LocalAuthListEnabled" in supported_keys and not authorizer.backend.read_only:
+            try:
+                if await authorizer.backend.version() > 0:
+                    await self._probe_local_list()
+                    if self.state.local_list_max:
+                        await self.sync_local_list()
                 else:
-                    key_name = getattr(entry, "key", None)
-                if key_name:
-                    supported_keys.append(key_name)
-            logging.info(f"Supported configuration keys parsed: {supported_keys}")
-        except asyncio.TimeoutError:
-            logging.warning("Timeout fetching GetConfiguration; proceeding without supported keys.")
-        except Exception as e:
-            logging.warning(f"Failed to fetch supported configuration keys: {e}")
+                    self.local_list_pending = True
+            except Exception as e:
+                self.log.warning("Local list sync failed: %s", e, extra={"action": "SendLocalList"})
 
         # ตัวอย่างส่ง QR แสดงผล (optional)
         qr_url = "https://your-domain.com/qr?order_id=TEST123"
         target_key = "QRcodeConnectorID1"
         if target_key in supported_keys:
-            logging.info(f"Using supported key '{target_key}' to send ChangeConfiguration for QR")
+            self.log.info("Using supported key '%s' to send ChangeConfiguration for QR", target_key)
             change_req = call.ChangeConfigurationPayload(key=target_key, value=qr_url)
-            asyncio.create_task(self._send_change_configuration(change_req))
+            await self._send_change_configuration(change_req)
         else:
-            logging.info(f"Key '{target_key}' not supported; attempting fallback display (DisplayMessage/DataTransfer) for QR")
+            self.log.info("Key '%s' not supported; attempting fallback display (DisplayMessage/DataTransfer) for QR", target_key)
             try:
                 fallback = make_display_message_call(message_type="QRCode", uri=qr_url)
-                asyncio.create_task(self._send_change_configuration(fallback))
             except Exception as e:
-                logging.error(f"Failed to send fallback display message: {e}")
+                self.log.error("Failed to send fallback display message: %s", e)
+                return
+            await self._send_change_configuration(fallback)
 
-        return response
+    async def _fetch_configuration_keys(self) -> List[str] | None:
+        """GetConfiguration → รายชื่อ key (None ถ้าตู้ไม่ตอบ จะได้ไม่ถูกจำลง cache)"""
+        try:
+            conf_req = call.GetConfigurationPayload()
+            conf_resp = await self.send_command(conf_req, "low", timeout=10)
+            self.log.debug("→ GetConfiguration response: %s", conf_resp, extra={"action": "GetConfiguration"})
+            if conf_resp is None:
+                return None
+            supported_keys = parse_configuration_keys(conf_resp)
+            self.log.info("Supported configuration keys parsed: %s", supported_keys, extra={"action": "GetConfiguration"})
+            # คำตอบเดียวกันมีค่าของ key ต่อตู้ด้วย: จำไว้เลยไม่ต้องถามซ้ำ
+            await capability_cache.store_settings(self.id, parse_configuration_values(conf_resp, CHARGER_SETTINGS))
+            return supported_keys
+        except CommandError as e:
+            self.log.warning("GetConfiguration not answered (%s); proceeding without supported keys.", e.reason)
+        except Exception as e:
+            self.log.warning("Failed to fetch supported configuration keys: %s", e)
+        return None
+
+    async def _read_configuration(self, keys: List[str]) -> Dict[str, str]:
+        """ค่าของ configuration keys ที่ตู้ตอบมา (key ที่ตู้ไม่รู้จักจะไม่มีใน dict)"""
+        resp = await self.send_command(call.GetConfigurationPayload(key=keys), "low", timeout=10)
+        if resp is None:
+            return {}
+        return {
+            item["key"]: item.get("value") for item in resp.configuration_key or []
+            if item.get("key") in keys and item.get("value") is not None
+        }
+
+    async def _charger_settings(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """
+        ค่า CHARGER_SETTINGS ของตู้นี้: จาก capability cache ก่อน
+        ถาม GetConfiguration (ครั้งเดียวรวมทุก key) เฉพาะ key ที่ยังไม่เคยรู้ แล้วจำไว้
+        """
+        settings = capability_cache.settings(self.id)
+        missing = [key for key in keys if key not in settings]
+        if not missing:
+            return settings
+        try:
+            values = await self._read_configuration(missing)
+        except Exception as e:
+            self.log.debug("Configuration %s not read: %s", missing, e, extra={"action": "GetConfiguration"})
+            return settings  # ไม่จำ: ลองใหม่ boot ถัดไป
+        await capability_cache.store_settings(self.id, {key: values.get(key) for key in missing})
+        return capability_cache.settings(self.id)
+
+    def _tune_ping_interval(self, raw: Optional[str]):
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            return
+        if value <= 0:
+            return  # ตู้ไม่ ping เอง: ใช้ค่า default
+        self.state.ping_interval = min(max(value, OCPP_PING_MIN_SEC), OCPP_PING_INTERVAL_SEC)
+        if self.probe is not None:
+            self.probe.set_interval(self.state.ping_interval)
+        self.log.info("Ping interval for %s: %ss", self.id, self.state.ping_interval, extra={"action": "ping"})
+
+    async def _probe_local_list(self):
+        """
+        ใช้ local list เฉพาะเมื่อ LocalAuthListEnabled=true และส่งไม่เกินที่ตู้รับได้
+        (LocalAuthListMaxLength / SendLocalListMaxLength / AUTH_LOCAL_LIST_MAX)
+        ค่าของตู้จำไว้ใน capability cache: ถามตู้ครั้งแรกครั้งเดียว
+        """
+        keys = ["LocalAuthListEnabled", "LocalAuthListMaxLength", "SendLocalListMaxLength"]
+        self.local_list_pending = False
+        values = await self._charger_settings(keys)
+        limit = 0
+        if (values.get("LocalAuthListEnabled") or "").strip().lower() == "true":
+            limit = AUTH_LOCAL_LIST_MAX
+            for key in keys[1:]:
+                try:
+                    limit = min(limit, int(values[key]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        self.state.local_list_max = max(0, limit)
+
+    async def sync_local_list(self, full: bool = False) -> Optional[str]:
+        """
+        ส่ง SendLocalList ให้ local list ของตู้ตรงกับฐานข้อมูล (Differential ถ้าทำได้)
+        คืน status ที่ตู้ตอบ หรือ None เมื่อไม่ต้องส่ง (รวมถึงตู้ที่ไม่ใช้ local list)
+        """
+        if not self.state.local_list_max:
+            return None
+        resp = await self.send_command(call.GetLocalListVersionPayload(), "low")
+        if resp is None:
+            return None  # CallError: ตู้ไม่รองรับ
+        update = await authorizer.local_list_update(resp.list_version, self.state.local_list_max, full)
+        if update is None:
+            return None
+        update_type, version, entries = update
+        resp = await self.send_command(
+            call.SendLocalListPayload(list_version=version, update_type=update_type, local_authorization_list=entries),
+            "low",
+        )
+        status = outcome_of(resp)
+        local_list_updates.labels(update_type, status).inc()
+        self.log.info(
+            "→ SendLocalList %s v%s (%s entries): %s", update_type, version, len(entries), status,
+            extra={"action": "SendLocalList"},
+        )
+        if status == "VersionMismatch" and update_type == "Differential":
+            return await self.sync_local_list(full=True)
+        return status
 
     async def _send_change_configuration(self, request_payload):
         try:
-            resp = await self.call(request_payload)
-            logging.info(f"→ ChangeConfiguration / Custom response: {resp}")
+            resp = await self.send_command(request_payload, "low")
+            self.log.info("→ ChangeConfiguration / Custom response: %s", resp, extra={"action": "ChangeConfiguration"})
         except Exception as e:
-            logging.error(f"!!! ChangeConfiguration/custom failed: {e}")
+            self.log.error("!!! ChangeConfiguration/custom failed: %s", e, extra={"action": "ChangeConfiguration"})
 
     @on(Action.Authorize)
     async def on_authorize(self, id_tag, **kwargs):
-        logging.info(f"← Authorize request, idTag={id_tag}")
-        return call_result.AuthorizePayload(id_tag_info={"status": AuthorizationStatus.accepted})
+        info = await authorizer.authorize(id_tag)
+        authorizations.labels(info["status"]).inc()
+        self.log.info("← Authorize request, idTag=%s → %s", id_tag, info["status"], extra={"action": "Authorize"})
+        if info is ACCEPTED:
+            return AUTHORIZE_ACCEPTED
+        return call_result.AuthorizePayload(id_tag_info=info)
 
     @on(Action.StatusNotification)
     async def on_status_notification(self, connector_id, error_code, status, **kwargs):
-        logging.info(
-            f"← StatusNotification: connector {connector_id} → status={status}, errorCode={error_code}"
+        self.log.info(
+            "← StatusNotification: connector %s → status=%s, errorCode=%s", connector_id, status, error_code,
+            extra={"action": "StatusNotification"},
         )
         c_id = int(connector_id)
         self.connector_status[c_id] = status
+        event_bus.publish("status", self.id, {"connectorId": c_id, "status": status, "errorCode": error_code})
         # จับเวลาเมื่อหัวอยู่ในสถานะ Preparing/Occupied แต่ยังไม่มีธุรกรรม
         if status in ("Preparing", "Occupied"):
-            if c_id not in self.active_tx and c_id not in self.no_session_tasks:
-                self.no_session_tasks[c_id] = asyncio.create_task(
-                    self._no_session_watchdog(c_id)
-                )
+            if c_id not in self.active_tx:
+                self.arm_no_session_watchdog(c_id)
         else:
-            task = self.no_session_tasks.pop(c_id, None)
-            if task:
-                task.cancel()
-        return call_result.StatusNotificationPayload()
+            self.cancel_no_session_watchdog(c_id)
+        return STATUS_NOTIFICATION_CONF
 
     @on(Action.Heartbeat)
     def on_heartbeat(self, **kwargs):
-        logging.info("← Heartbeat received")
+        self.log.info("← Heartbeat received", extra={"action": "Heartbeat"})
         return call_result.HeartbeatPayload(current_time=datetime.utcnow().isoformat() + "Z")
 
     @on(Action.MeterValues)
-    async def on_meter_values(self, connector_id, meter_value, **kwargs):
-        logging.info(f"← MeterValues from connector {connector_id}: {meter_value}")
-        return call_result.MeterValuesPayload()
+    async def on_meter_values(self, connector_id, meter_value, transaction_id=None, **kwargs):
+        # payload เต็มแปลงเป็นข้อความเฉพาะเมื่อเปิด DEBUG และทำใน thread เขียน log
+        self.log.debug("MeterValues payload: %s", Lazy(lambda: json.dumps(meter_value)), extra={"action": "MeterValues"})
+        samples = parse_meter_values(self.id, connector_id, meter_value, transaction_id)
+        meter_store.extend(samples)
+        if event_bus.subscribers:
+            event_bus.publish(
+                "meter",
+                self.id,
+                {
+                    "connectorId": int(connector_id),
+                    "transactionId": transaction_id,
+                    "samples": [
+                        {"ts": ts, "measurand": m, "phase": ph, "unit": u, "value": v}
+                        for ts, _, _, _, m, ph, u, v in samples
+                    ],
+                },
+            )
+        accepted = meter_ingestor.offer(samples)
+        if accepted < len(samples):
+            self.log.warning(
+                "MeterValues buffer full: dropped %s samples from %s/%s", len(samples) - accepted, self.id, connector_id,
+                extra={"action": "MeterValues"},
+            )
+        self.log.info(
+            "← MeterValues from connector %s: %s samples", connector_id, len(samples),
+            extra={"action": "MeterValues", "connectorId": connector_id, "transactionId": transaction_id},
+        )
+        return METER_VALUES_CONF
 
     @on(Action.DataTransfer)
     async def on_data_transfer(self, vendor_id, message_id=None, data=None, **kwargs):
         """Handle custom DataTransfer messages from the charger."""
-        logging.info(
-            f"← DataTransfer: vendorId={vendor_id}, messageId={message_id}, data={data}"
+        self.log.info(
+            "← DataTransfer: vendorId=%s, messageId=%s, data=%s", vendor_id, message_id, data,
+            extra={"action": "DataTransfer"},
         )
-        return call_result.DataTransferPayload(status=DataTransferStatus.accepted)
+        return DATA_TRANSFER_ACCEPTED
 
     # ดักรับ StartTransaction เพื่อ “ออกเลข” และจดจำ transaction
     @on(Action.StartTransaction)
     async def on_start_transaction(self, connector_id, id_tag, meter_start, timestamp, reservation_id=None, **kwargs):
-        expected = self.pending_remote.get(int(connector_id))
+        expected = self.pending_starts.expected_id_tag(int(connector_id))
         if expected is not None and expected != id_tag:
-            logging.warning(
-                f"StartTransaction for connector {connector_id} received with unexpected idTag (expected={expected}, got={id_tag}); rejecting"
+            self.log.warning(
+                "StartTransaction for connector %s received with unexpected idTag (expected=%s, got=%s); rejecting",
+                connector_id, expected, id_tag, extra={"action": "StartTransaction"},
             )
-            await self.unlock_connector(int(connector_id))
-            self.pending_remote.pop(int(connector_id), None)
-            self.pending_start.pop(int(connector_id), None)
+            # ไม่รอคำตอบใน handler: ตู้ต้องได้ StartTransaction.conf ก่อน
+            asyncio.create_task(self.unlock_connector(int(connector_id)))
+            self.pending_starts.finish(int(connector_id), "mismatch")
             return call_result.StartTransactionPayload(
                 transaction_id=0,
                 id_tag_info={"status": AuthorizationStatus.invalid},
             )
 
         # ถ้ามี remote start pending ให้ลบ flag ทิ้ง
-        pending = self.pending_start.pop(int(connector_id), None)
-        self.pending_remote.pop(int(connector_id), None)
+        pending = self.pending_starts.finish(int(connector_id), "completed")
+        # remote start ที่ CSMS สั่งเองถือว่าผ่านแล้ว; local start ตรวจ idTag (ตู้หยุดเองถ้าไม่ Accepted)
+        if pending is not None and pending.accepted:
+            id_tag_info = ACCEPTED
+        else:
+            id_tag_info = await authorizer.authorize(id_tag)
+            authorizations.labels(id_tag_info["status"]).inc()
 
         # ไม่บังคับว่าต้องมี pending start เสมอ: รองรับ local start หรือ remote start ที่ไม่ได้ผ่าน API
-        tx_id = next(_tx_counter)  # CSMS ออกเลข transactionId
+        tx_id = tx_store.next_transaction_id()  # CSMS ออกเลข transactionId
         info = {
             "transaction_id": tx_id,
             "id_tag": id_tag,
         }
-        if pending and "vid" in pending:
-            info["vid"] = pending["vid"]
+        if pending is not None and pending.vid:
+            info["vid"] = pending.vid
         # เก็บทั้ง transactionId และข้อมูลอื่นเพื่อให้ API ภายนอกเรียกดูได้
+        # รอจน commit ลง store ก่อนตอบ (group commit: หลาย StartTransaction ใช้ fsync เดียวกัน)
+        await tx_store.start_transaction(self.id, int(connector_id), info, meter_start, timestamp)
         self.active_tx[int(connector_id)] = info
+        session = session_index.add(self.id, int(connector_id), info)
+        event_bus.publish("session.start", self.id, dict(session, meterStart=meter_start, vid=info.get("vid")))
         # ยกเลิก watchdog ถ้ามี
-        task = self.no_session_tasks.pop(int(connector_id), None)
-        if task:
-            task.cancel()
-        logging.info(
-            f"← StartTransaction from {self.id}: connector={connector_id}, idTag={id_tag}, meterStart={meter_start}, vid={info.get('vid')}"
-        )
-        logging.info(f"→ Assign transactionId={tx_id}")
-        return call_result.StartTransactionPayload(
-            transaction_id=tx_id,
-            id_tag_info={"status": AuthorizationStatus.accepted},
+        self.cancel_no_session_watchdog(int(connector_id))
+        self.log.info(
+            "← StartTransaction from %s: connector=%s, idTag=%s (%s), meterStart=%s, vid=%s → Assign transactionId=%s",
+            self.id, connector_id, id_tag, id_tag_info["status"], meter_start, info.get("vid"), tx_id,
+            extra={"action": "StartTransaction", "connectorId": connector_id, "transactionId": tx_id},
         )
+        return call_result.StartTransactionPayload(transaction_id=tx_id, id_tag_info=id_tag_info)
 
 
 # ดักรับ StopTransaction เพื่อเคลียร์สถานะ
     @on(Action.StopTransaction)
-    async def on_stop_transaction(self, transaction_id, meter_stop, timestamp, **kwargs):
-        for c_id, info in list(self.active_tx.items()):
-            if info.get("transaction_id") == int(transaction_id):
-                self.active_tx.pop(c_id, None)
-                break
-        logging.info(f"← StopTransaction from {self.id}: tx={transaction_id}, meterStop={meter_stop}")
+    async def on_stop_transaction(self, transaction_id, meter_stop, timestamp, reason=None, **kwargs):
+        session = session_index.get_tx(int(transaction_id))
+        if session is not None and session["cpid"] != self.id:
+            session = None
+        if session is not None:
+            session_index.remove(int(transaction_id))
+            info = self.active_tx.get(session["connectorId"])
+            if info is not None and info.get("transaction_id") == int(transaction_id):
+                self.active_tx.pop(session["connectorId"], None)
+        event_bus.publish(
+            "session.stop",
+            self.id,
+            {
+                "transactionId": int(transaction_id),
+                "connectorId": session["connectorId"] if session else None,
+                "meterStop": meter_stop,
+                "reason": reason,
+            },
+        )
+        await tx_store.stop_transaction(int(transaction_id), meter_stop, timestamp, reason)
+        self.log.info(
+            "← StopTransaction from %s: tx=%s, meterStop=%s", self.id, transaction_id, meter_stop,
+            extra={"action": "StopTransaction", "transactionId": transaction_id},
+        )
         return call_result.StopTransactionPayload(
             id_tag_info={"status": AuthorizationStatus.accepted}
         )
@@ -349,14 +883,27 @@ def compute_hash_canonical(
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logging.info(f">>> {request.method} {request.url.path}")
+    start = time.perf_counter()
+    status = 500
     try:
         response = await call_next(request)
-        logging.info(f"<<< {request.method} {request.url.path} -> {response.status_code}")
+        status = response.status_code
         return response
     except Exception:
-        logging.exception("Handler crashed")
+        log.exception("Handler crashed")
         raise
+    finally:
+        # ใช้ path template ของ route (ไม่ใช่ URL จริง) เพื่อไม่ให้ label บวมตาม cpid
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        elapsed = time.perf_counter() - start
+        # บรรทัดเดียวต่อ request (เดิม log ก่อนและหลัง)
+        log.info(
+            "HTTP %s %s -> %s (%.1f ms)", request.method, request.url.path, status, elapsed * 1000,
+            extra={"action": "http", "route": route_path, "status": status},
+        )
+        http_request_seconds.labels(request.method, route_path).observe(elapsed)
+        http_requests.labels(request.method, route_path, str(status)).inc()
 
 
 @app.get("/api/v1/health")
@@ -364,6 +911,18 @@ def health():
     """Basic health check endpoint."""
     return {"ok": True, "time": datetime.utcnow().isoformat() + "Z"}
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (no API key, like most exporters)."""
+    if not connected_cps.shared:
+        return PlainTextResponse(render_metrics(metrics.collect()), media_type=METRICS_CONTENT_TYPE)
+    # โหมด worker: รวมของทุก worker โดยติด label worker="<id>"
+    snapshots = {str(connected_cps.worker_id): metrics.collect()}
+    for res in await connected_cps.gather("metrics", {}):
+        snapshots[str(res["worker"])] = res["families"]
+    return PlainTextResponse(render_metrics(merge_families(snapshots)), media_type=METRICS_CONTENT_TYPE)
+
 class StartReq(BaseModel):
     cpid: str
     connectorId: int
@@ -394,21 +953,43 @@ class ReleaseReq(BaseModel):
     cpid: str
     connectorId: int
 
-class ActiveSession(BaseModel):
-    cpid: str
-    connectorId: int
-    idTag: str
-    transactionId: int
+class BulkReq(BaseModel):
+    action: str                         # OCPP 1.6 action เช่น Reset, ChangeConfiguration, TriggerMessage
+    payload: Dict[str, Any] = {}        # field ของ action (camelCase หรือ snake_case)
+    cpids: List[str] | None = None      # None = ทุกตู้ที่ต่ออยู่
+    priority: str = "low"
+    timeout: float | None = None        # deadline ต่อตู้ (วินาที)
+    concurrency: int | None = None      # ไม่เกิน BULK_CONCURRENCY
+
+class IdTagReq(BaseModel):
+    status: str = "Accepted"            # Accepted | Blocked | Expired | Invalid
+    expiryDate: str | None = None       # ISO 8601
+    parentIdTag: str | None = None
 
 def require_key(x_api_key: str | None):
     if API_KEY and x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="invalid api key")
 
+# CommandError.reason -> HTTP status
+_COMMAND_ERROR_STATUS = {"queue_full": 429, "expired": 504, "timeout": 504, "disconnected": 503}
+
+def command_http_error(e: CommandError) -> HTTPException:
+    return HTTPException(status_code=_COMMAND_ERROR_STATUS.get(e.reason, 502), detail=str(e))
+
+async def forward_to_owner(cpid: str, op: str, body: Dict[str, Any]):
+    """ส่งคำสั่งต่อไปยัง worker ที่ถือ WebSocket ของตู้นี้ (โหมด CSMS_WORKERS > 1)"""
+    try:
+        return await connected_cps.forward(cpid, op, body)
+    except RemoteCallError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
 @app.post("/api/v1/start")
 async def api_start(req: StartReq, x_api_key: str | None = Header(default=None, alias="X-API-Key")):
     require_key(x_api_key)
     cp = connected_cps.get(req.cpid)
     if not cp:
+        if connected_cps.is_remote(req.cpid):
+            return await forward_to_owner(req.cpid, "start", req.dict())
         raise HTTPException(status_code=404, detail=f"ChargePoint '{req.cpid}' not connected")
     try:
         # compute hash if provided
@@ -429,22 +1010,24 @@ async def api_start(req: StartReq, x_api_key: str | None = Header(default=None,
             sorted_kv,
         )
         if req.hash and req.hash.lower() != expected_hash.lower():
-            logging.warning(
-                f"hash mismatch: provided={req.hash} computed={expected_hash}"
-            )
+            logging.warning("hash mismatch: provided=%s computed=%s", req.hash, expected_hash)
 
         id_tag = req.idTag or DEFAULT_ID_TAG
         # เตรียมข้อมูล pending สำหรับ StartTransaction ที่จะตามมา
-        cp.pending_start[int(req.connectorId)] = {"id_tag": id_tag}
-        if req.vid:
-            cp.pending_start[int(req.connectorId)]["vid"] = req.vid
-        status = await cp.remote_start(req.connectorId, id_tag)
+        cp.pending_starts.expect(int(req.connectorId), id_tag, req.vid)
+        try:
+            status = await cp.remote_start(req.connectorId, id_tag)
+        except Exception:
+            cp.pending_starts.finish(int(req.connectorId), "rejected")
+            raise
         if status != RemoteStartStopStatus.accepted:
-            cp.pending_start.pop(int(req.connectorId), None)
+            cp.pending_starts.finish(int(req.connectorId), "rejected")
         # ถ้า charger รับ จะตามด้วย StartTransaction.req → เราจะ assign transactionId ให้เอง
         return {"ok": True, "hash": expected_hash, "message": "RemoteStartTransaction sent"}
     except HTTPException:
         raise
+    except CommandError as e:
+        raise command_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -453,6 +1036,8 @@ async def api_stop(req: StopReq, x_api_key: str | None = Header(default=None, al
     require_key(x_api_key)
     cp = connected_cps.get(req.cpid)
     if not cp:
+        if connected_cps.is_remote(req.cpid):
+            return await forward_to_owner(req.cpid, "stop", req.dict())
         raise HTTPException(status_code=404, detail=f"ChargePoint '{req.cpid}' not connected")
     try:
         sorted_kv = "-"
@@ -474,9 +1059,7 @@ async def api_stop(req: StopReq, x_api_key: str | None = Header(default=None, al
                 sorted_kv,
             )
             if req.hash and req.hash.lower() != expected_hash.lower():
-                logging.warning(
-                    f"hash mismatch: provided={req.hash} computed={expected_hash}"
-                )
+                logging.warning("hash mismatch: provided=%s computed=%s", req.hash, expected_hash)
 
         tx_id = req.transactionId
         if tx_id is None:
@@ -486,10 +1069,9 @@ async def api_stop(req: StopReq, x_api_key: str | None = Header(default=None, al
                 if session and req.idTag and session.get("id_tag") != req.idTag:
                     session = None
             if session is None and req.idTag:
-                for info in cp.active_tx.values():
-                    if info.get("id_tag") == req.idTag:
-                        session = info
-                        break
+                tagged = session_index.for_tag(req.idTag, req.cpid)
+                if tagged:
+                    session = cp.active_tx.get(tagged[0]["connectorId"])
             if session:
                 tx_id = session.get("transaction_id")
         if tx_id is None:
@@ -500,6 +1082,8 @@ async def api_stop(req: StopReq, x_api_key: str | None = Header(default=None, al
         return {"ok": True, "transactionId": tx_id, "hash": expected_hash, "message": "RemoteStopTransaction sent"}
     except HTTPException:
         raise
+    except CommandError as e:
+        raise command_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -508,6 +1092,8 @@ async def api_stop_by_connector(req: StopByConnectorReq, x_api_key: str | None =
     require_key(x_api_key)
     cp = connected_cps.get(req.cpid)
     if not cp:
+        if connected_cps.is_remote(req.cpid):
+            return await forward_to_owner(req.cpid, "charge_stop", req.dict())
         raise HTTPException(status_code=404, detail=f"ChargePoint '{req.cpid}' not connected")
     session = cp.active_tx.get(req.connectorId)
     if session is None:
@@ -518,6 +1104,8 @@ async def api_stop_by_connector(req: StopByConnectorReq, x_api_key: str | None =
         return {"ok": True, "transactionId": tx_id, "message": "RemoteStopTransaction sent"}
     except HTTPException:
         raise
+    except CommandError as e:
+        raise command_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -528,75 +1116,501 @@ async def api_release(req: ReleaseReq, x_api_key: str | None = Header(default=No
     require_key(x_api_key)
     cp = connected_cps.get(req.cpid)
     if not cp:
+        if connected_cps.is_remote(req.cpid):
+            return await forward_to_owner(req.cpid, "release", req.dict())
         raise HTTPException(status_code=404, detail=f"ChargePoint '{req.cpid}' not connected")
     if req.connectorId in cp.active_tx:
         raise HTTPException(status_code=400, detail="Connector has active transaction")
-    task = cp.no_session_tasks.pop(req.connectorId, None)
-    if task:
-        task.cancel()
-    cp.pending_remote.pop(req.connectorId, None)
-    cp.pending_start.pop(req.connectorId, None)
+    cp.cancel_no_session_watchdog(req.connectorId)
+    cp.pending_starts.finish(req.connectorId, "released")
     try:
         await cp.unlock_connector(req.connectorId)
         return {"ok": True, "message": "UnlockConnector sent"}
     except HTTPException:
         raise
+    except CommandError as e:
+        raise command_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def build_call_payload(action: str, payload: Dict[str, Any]):
+    """call.<Action>Payload จากชื่อ action + dict (ValueError ถ้าไม่รู้จักหรือ field ไม่ตรง)"""
+    cls = getattr(call, f"{action}Payload", None)
+    if cls is None:
+        raise ValueError(f"unknown OCPP 1.6 action '{action}'")
+    try:
+        return cls(**camel_to_snake_case(payload))
+    except TypeError as e:
+        raise ValueError(f"invalid payload for {action}: {e}")
+
+
+async def local_bulk(
+    action: str,
+    payload: Dict[str, Any],
+    cpids: List[str] | None,
+    priority: str,
+    timeout: float | None,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """ส่งคำสั่งไปยังตู้ที่ต่อกับ process นี้ (ตู้ใน cpids ที่ไม่ได้อยู่ที่นี่ถูกข้าม)"""
+    req = build_call_payload(action, payload)
+    targets = list(connected_cps) if cpids is None else [c for c in cpids if c in connected_cps]
+
+    async def run(cpid: str):
+        cp = connected_cps.get(cpid)
+        if cp is None:
+            raise CommandError("disconnected", f"{action}: charger disconnected")
+        resp = await cp.send_command(req, priority, timeout)
+        if isinstance(req, call.ChangeConfigurationPayload) and req.key in CHARGER_SETTINGS:
+            await capability_cache.forget_settings(cpid)  # ค่าที่จำไว้ไม่ตรงแล้ว: อ่านใหม่ boot ถัดไป
+        return resp
+
+    results = await fan_out(targets, run, concurrency)
+    bulk_commands.labels(action).inc(len(results))
+    return {"worker": connected_cps.worker_id, "results": results}
+
+
+@app.post("/api/v1/bulk")
+async def api_bulk(req: BulkReq, x_api_key: str | None = Header(default=None, alias="X-API-Key")):
+    """
+    ส่งคำสั่ง OCPP เดียวกันไปยังหลายตู้ (สูงสุด BULK_CONCURRENCY พร้อมกัน)
+    แต่ละตู้เข้าคิวคำสั่งของตัวเองตาม priority/timeout แล้วรวมผลเป็น summary + ผลรายตู้
+    """
+    require_key(x_api_key)
+    if req.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITIES)}")
+    try:
+        build_call_payload(req.action, req.payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    concurrency = max(1, min(req.concurrency or BULK_CONCURRENCY, BULK_CONCURRENCY))
+    body = {
+        "action": req.action,
+        "payload": req.payload,
+        "cpids": req.cpids,
+        "priority": req.priority,
+        "timeout": req.timeout,
+        # เพดานรวม แบ่งให้แต่ละ worker
+        "concurrency": max(1, concurrency // connected_cps.workers),
+    }
+    start = time.perf_counter()
+    results = (await local_bulk(**body))["results"]
+    if connected_cps.shared:
+        # คำสั่งรอได้นานกว่า RPC timeout ปกติ: เผื่อตามจำนวนรอบที่ต้องส่ง
+        targets = len(req.cpids) if req.cpids is not None else len(connected_cps.all_cpids())
+        rounds = targets // body["concurrency"] + 1
+        rpc_timeout = rounds * (req.timeout or COMMAND_TIMEOUT_SEC) + WORKER_RPC_TIMEOUT_SEC
+        for res in await connected_cps.gather("bulk", body, timeout=rpc_timeout):
+            results.update(res["results"])
+    for cpid in req.cpids or ():
+        if cpid not in results:
+            results[cpid] = {"outcome": "not_connected"}
+    return {
+        "action": req.action,
+        "total": len(results),
+        "summary": summarize_outcomes(results),
+        "elapsedMs": round((time.perf_counter() - start) * 1000, 1),
+        "results": results,
+    }
+
+
+async def push_local_lists(cpids: List[str]) -> None:
+    async def run(cpid: str):
+        cp = connected_cps.get(cpid)
+        if cp is None:
+            raise CommandError("disconnected", "SendLocalList: charger disconnected")
+        if cp.local_list_pending:
+            await cp._probe_local_list()
+        return await cp.sync_local_list()
+
+    results = await fan_out(cpids, run, BULK_CONCURRENCY)
+    failed = {cpid: r for cpid, r in results.items() if r["outcome"] != "ok"}
+    if failed:
+        logging.warning("Local list push failed on %s of %s chargers: %s", len(failed), len(cpids), failed)
+
+
+def local_id_tags_changed(id_tags: List[str]) -> Dict[str, Any]:
+    """ลืมผลใน cache ของ idTag ที่เปลี่ยน และส่ง local list ใหม่ให้ตู้ที่ต่อกับ process นี้ (ไม่รอตู้ตอบ)"""
+    for id_tag in id_tags:
+        authorizer.invalidate(id_tag)
+    targets = []
+    for cpid in list(connected_cps):
+        cp = connected_cps.get(cpid)
+        if cp is not None and (cp.state.local_list_max or cp.local_list_pending):
+            targets.append(cpid)
+    if targets:
+        asyncio.create_task(push_local_lists(targets))
+    return {"worker": connected_cps.worker_id, "chargers": len(targets)}
+
+
+async def id_tags_changed(id_tags: List[str], version: int) -> Dict[str, Any]:
+    chargers = local_id_tags_changed(id_tags)["chargers"]
+    if connected_cps.shared:
+        for res in await connected_cps.gather("id_tags", {"id_tags": id_tags}):
+            chargers += res["chargers"]
+    return {"ok": True, "version": version, "localListPushes": chargers}
+
+
+def require_writable_auth_backend():
+    if authorizer.backend.read_only:
+        raise HTTPException(
+            status_code=409, detail=f"auth backend '{AUTH_BACKEND}' is read-only (set AUTH_BACKEND=sqlite)"
+        )
+
+
+_ID_TAG_STATUSES = {s.value for s in AuthorizationStatus if s.value != "ConcurrentTx"}
+
+
+@app.put("/api/v1/id_tags/{id_tag}")
+async def api_put_id_tag(id_tag: str, req: IdTagReq, x_api_key: str | None = Header(default=None, alias="X-API-Key")):
+    """เพิ่ม/แก้ idTag ใน auth backend แล้วส่ง local list แบบ Differential ให้ตู้ที่ใช้ local list"""
+    require_key(x_api_key)
+    if req.status not in _ID_TAG_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {sorted(_ID_TAG_STATUSES)}")
+    require_writable_auth_backend()
+    version = await authorizer.backend.put(id_tag, req.status, req.expiryDate, req.parentIdTag)
+    return await id_tags_changed([id_tag], version)
+
+
+@app.delete("/api/v1/id_tags/{id_tag}")
+async def api_delete_id_tag(id_tag: str, x_api_key: str | None = Header(default=None, alias="X-API-Key")):
+    require_key(x_api_key)
+    require_writable_auth_backend()
+    version = await authorizer.backend.delete(id_tag)
+    return await id_tags_changed([id_tag], version)
+
+
+@app.get("/api/v1/meter/ingest")
+async def api_meter_ingest_stats(x_api_key: str | None = Header(default=None, alias="X-API-Key")):
+    """สถิติของ MeterValues buffer (จำนวนที่รับ/เขียนแล้ว/ถูกทิ้งเพราะเต็ม)"""
+    require_key(x_api_key)
+    return meter_ingestor.stats()
+
+
+@app.get("/api/v1/meter/{cpid}/{connectorId}")
+async def api_meter_series(
+    cpid: str,
+    connectorId: int,
+    measurand: str | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    step: float | None = None,
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+):
+    """
+    ค่า meter ย้อนหลังของหัวชาร์จ (คอลัมน์ ts เป็น epoch วินาที)
+    since/until กรองช่วงเวลา, step > 0 เฉลี่ยเป็นช่วงละ step วินาที
+    """
+    require_key(x_api_key)
+    if cpid not in connected_cps and connected_cps.is_remote(cpid):
+        return await forward_to_owner(
+            cpid,
+            "meter",
+            {"cpid": cpid, "connectorId": connectorId, "measurand": measurand,
+             "since": since, "until": until, "step": step},
+        )
+    series = meter_store.query(cpid, connectorId, measurand, since, until, step)
+    if not series:
+        raise HTTPException(status_code=404, detail="No meter data for this connector")
+    return {"cpid": cpid, "connectorId": connectorId, "series": series}
+
+
+@app.get("/api/v1/events")
+async def api_events(
+    request: Request,
+    cpid: str | None = None,
+    types: str | None = None,
+    key: str | None = None,
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+):
+    """
+    Server-Sent Events ของ status/session/meter แทนการ poll /api/v1/active
+    - cpid=CP1,CP2 และ types=status,session.start,session.stop,meter ใช้กรอง
+    - key=<api key> สำหรับ EventSource ของ browser ที่ตั้ง header เองไม่ได้
+    - client ที่อ่านช้าจน buffer เต็มจะได้ event "overflow" แล้วถูกตัด
+    """
+    require_key(x_api_key or key)
+    cpids = [c for c in cpid.split(",") if c] if cpid else None
+    type_list = [t for t in types.split(",") if t] if types else None
+    unknown = [t for t in type_list or () if t not in EVENT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown event types: {unknown}")
+
+    sub = event_bus.subscribe(cpids, type_list)
+    relays = [
+        asyncio.create_task(relay_worker_events(w, sub, {"cpid": cpids, "types": type_list}))
+        for w in range(connected_cps.workers)
+        if connected_cps.shared and w != connected_cps.worker_id
+    ]
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await sub.get(timeout=EVENTS_KEEPALIVE_SEC)
+                if event is None:
+                    if sub.closed:
+                        yield f"event: {sub.reason}\ndata: {{}}\n\n"
+                        return
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                event_id = event["id"]
+                if connected_cps.shared:
+                    event_id = f"{event.get('worker', connected_cps.worker_id)}.{event_id}"
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            sub.close()
+            for task in relays:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def relay_worker_events(worker_id: int, sub, body: Dict[str, Any]):
+    """ส่งต่อ event จาก worker อื่นเข้า subscription ของ client ที่ต่อกับ worker นี้"""
+    try:
+        async for event in connected_cps.stream(worker_id, "events", body):
+            if event.get("type") == "keepalive":
+                continue
+            event["worker"] = worker_id
+            sub.deliver(event)
+            if sub.closed:
+                return
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.warning("Event relay from worker %s stopped: %s", worker_id, e)
+
+
+async def local_event_stream(cpid: list | None = None, types: list | None = None):
+    """stream สำหรับ op "events" ที่ worker อื่นขอ"""
+    sub = event_bus.subscribe(cpid, types)
+    try:
+        while True:
+            event = await sub.get(timeout=EVENTS_KEEPALIVE_SEC)
+            if event is None:
+                if sub.closed:
+                    return
+                yield {"type": "keepalive"}
+                continue
+            yield event
+    finally:
+        sub.close()
+
+
 @app.get("/api/v1/active")
-async def api_active_sessions(x_api_key: str | None = Header(default=None, alias="X-API-Key")):
-    """คืนรายการธุรกรรมที่กำลังชาร์จอยู่ทั้งหมด."""
+async def api_active_sessions(
+    response: Response,
+    limit: int | None = None,
+    cursor: int | None = None,
+    since: str | None = None,
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+    if_none_match: str | None = Header(default=None, alias="If-None-Match"),
+):
+    """
+    คืนรายการธุรกรรมที่กำลังชาร์จอยู่ทั้งหมด.
+
+    - limit/cursor: แบ่งหน้าตาม transactionId (ส่ง nextCursor กลับมาเป็น cursor ของหน้าถัดไป)
+    - version (และ ETag): เปลี่ยนทุกครั้งที่มีธุรกรรมเปิด/ปิด; ส่ง If-None-Match เดิมมาจะได้ 304
+    - since=<version>: คืนเฉพาะ opened/closed หลัง version นั้น
+      (ถ้าย้อนไกลเกิน change log จะได้รายการเต็มพร้อม "resync": true)
+    """
     require_key(x_api_key)
-    sessions: list[ActiveSession] = []
-    for cpid, cp in connected_cps.items():
-        for conn_id, info in cp.active_tx.items():
-            sessions.append(
-                ActiveSession(
-                    cpid=cpid,
-                    connectorId=conn_id,
-                    idTag=info.get("id_tag", ""),
-                    transactionId=info.get("transaction_id", 0),
-                )
-            )
-    return {"sessions": [s.dict() for s in sessions]}
+    if not connected_cps.shared:
+        etag = f'"{session_index.version}"'
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+    body = {"cursor": cursor, "limit": limit, "since": since}
+    views = [local_active_view(**body)] + await connected_cps.gather("active", body)
+    resync = False
+    if since is not None and any("sessions" in v for v in views):
+        # อย่างน้อยหนึ่ง worker ให้ delta ไม่ได้ -> ส่งรายการเต็มของทุก worker
+        resync = True
+        body["since"] = None
+        views = [local_active_view(**body)] + await connected_cps.gather("active", body)
+    views.sort(key=lambda v: v["worker"])
+    version = ".".join(str(v["version"]) for v in views)
+    etag = f'"{version}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    if since is not None and not resync:
+        return {
+            "version": version,
+            "opened": [s for v in views for s in v["opened"]],
+            "closed": [s for v in views for s in v["closed"]],
+        }
+    sessions = [s for v in views for s in v["sessions"]]
+    more = any(v["nextCursor"] is not None for v in views)
+    if len(views) > 1:
+        sessions.sort(key=lambda s: s["transactionId"])
+        if limit is not None and len(sessions) > limit:
+            sessions = sessions[:limit]
+            more = True
+    result = {
+        "version": version,
+        "sessions": sessions,
+        "nextCursor": sessions[-1]["transactionId"] if more and sessions else None,
+    }
+    if resync:
+        result["resync"] = True
+    return result
+
+
+def local_active_view(cursor: int | None = None, limit: int | None = None, since: str | None = None) -> Dict[str, Any]:
+    """
+    ธุรกรรมของตู้ที่ต่ออยู่กับ process นี้ (dict ใน index สร้างครั้งเดียวตอนเริ่มธุรกรรม)
+    since เป็น version ของทุก worker คั่นด้วย "." (โหมด process เดียวคือเลขเดียว)
+    """
+    view: Dict[str, Any] = {"worker": connected_cps.worker_id, "version": session_index.version}
+    if since is not None:
+        parts = since.split(".")
+        try:
+            since_version = int(parts[connected_cps.worker_id])
+        except (IndexError, ValueError):
+            since_version = None
+        delta = session_index.changes_since(since_version) if since_version is not None else None
+        if delta is not None:
+            view["opened"], view["closed"] = delta
+            return view
+    view["sessions"], view["nextCursor"] = session_index.page(cursor, limit)
+    return view
+
+
+# คำสั่งที่ worker อื่นส่งต่อมาให้ (ผ่าน connected_cps.forward / gather)
+_FORWARDED_OPS = {
+    "start": (StartReq, api_start),
+    "stop": (StopReq, api_stop),
+    "charge_stop": (StopByConnectorReq, api_stop_by_connector),
+    "release": (ReleaseReq, api_release),
+}
+
+
+async def dispatch_forwarded(op: str, body: Dict[str, Any]):
+    if op == "active":
+        return local_active_view(**body)
+    if op == "events":
+        return local_event_stream(**body)
+    if op == "meter":
+        return await api_meter_series(**body, x_api_key=API_KEY)
+    if op == "metrics":
+        return {"worker": connected_cps.worker_id, "families": metrics.collect()}
+    if op == "bulk":
+        return await local_bulk(**body)
+    if op == "id_tags":
+        return local_id_tags_changed(**body)
+    model, endpoint = _FORWARDED_OPS[op]
+    return await endpoint(model(**body), x_api_key=API_KEY)
 
 
 # ================================
 #    RUN OCPP WS + HTTP API
 # ================================
-async def run_http_api():
+def reuse_port_socket(host: str, port: int) -> socket.socket:
+    """socket ที่หลาย process bind พอร์ตเดียวกันได้ (kernel กระจาย connection ให้)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def build_http_server() -> uvicorn.Server:
+    config = uvicorn.Config(app, host=HTTP_HOST, port=HTTP_PORT, loop="asyncio", log_level="info")
+    return uvicorn.Server(config)
+
+
+async def run_http_api(server: uvicorn.Server, reuse_port: bool = False):
     """
-    รัน FastAPI ด้วย uvicorn ภายใน event loop เดียวกัน
+    รัน FastAPI ด้วย uvicorn ภายใน event loop เดียวกัน (หยุดด้วย server.should_exit = True)
     """
-    config = uvicorn.Config(app, host="0.0.0.0", port=8080, loop="asyncio", log_level="info")
-    server = uvicorn.Server(config)
-    await server.serve()
+    if reuse_port:
+        await server.serve(sockets=[reuse_port_socket(HTTP_HOST, HTTP_PORT)])
+    else:
+        await server.serve()
 
 
-async def main():
+def close_replaced_connection(cp_id: str, old: "CentralSystem", reason: str) -> None:
+    """การเชื่อมต่อใหม่ของตู้ชนะ: ปิดการเชื่อมต่อเก่าด้วย code 1001 และนับเป็น takeover"""
+    connection_takeovers.inc()
+    log.warning("[Central] %s reconnected while its previous connection was open: closing the old one (%s)",
+                cp_id, reason, extra={"cpid": cp_id, "action": "takeover"})
+    old.commands.close()
+    asyncio.create_task(old._connection.close(code=1001, reason=reason))
+
+
+def _connection_moved(cp_id: str, old: Optional["CentralSystem"]) -> None:
     """
-    สร้าง WebSocket server รอฟังการเชื่อมต่อจาก Charger
+    โหมด worker: ตู้ไปต่อใหม่ที่ worker อื่น (ผ่าน SO_REUSEPORT) -> ปิด socket เก่าทันที ไม่ต้องรอ ping timeout
+    และทิ้งสถานะ/session ของตู้ที่นี่เลย (worker ใหม่โหลดธุรกรรมจาก tx_store เอง) ไม่ให้ /api/v1/active ซ้ำ
+    old=None: ตู้หลุดจากที่นี่ก่อนแล้ว (สถานะรอใน grace) ก็ทิ้งเหมือนกัน
+    """
+    if old is not None:
+        close_replaced_connection(cp_id, old, "connected to another worker")
+    charger_states.evict(cp_id, old)
+
+
+connected_cps.on_evict = _connection_moved
+
+
+async def ocpp_handler(websocket, path=None):
+    """
+    รับ WebSocket จาก Charger 1 ตัว
     (Charger connect ด้วย ws://<host>:9000/ocpp/<ChargePointID>)
-    พร้อมกันกับ HTTP API บน :8080
     """
-    async def handler(websocket, path=None):
-        if path is None:
-            try:
-                path = websocket.request.path
-            except AttributeError:
-                path = websocket.path if hasattr(websocket, "path") else ""
-        cp_id = path.rsplit('/', 1)[-1] if path else "UNKNOWN"
-        logging.info(f"[Central] New connection for Charge Point ID: {cp_id}")
-
-        central = CentralSystem(cp_id, websocket)
-        connected_cps[cp_id] = central
+    if path is None:
         try:
-            await central.start()
-        finally:
-            connected_cps.pop(cp_id, None)
-            logging.info(f"[Central] Disconnected: {cp_id}")
+            path = websocket.request.path
+        except AttributeError:
+            path = websocket.path if hasattr(websocket, "path") else ""
+    cp_id = path.rsplit('/', 1)[-1] if path else "UNKNOWN"
+    log.info("[Central] New connection for Charge Point ID: %s", cp_id, extra={"cpid": cp_id, "action": "connect"})
+
+    previous = connected_cps.get(cp_id)
+    central = CentralSystem(cp_id, websocket, charger_states)
+    if central.resumed:
+        # หลุดไม่เกิน grace: active_tx / status / pending ยังอยู่ใน memory ครบ
+        log.info("[Central] Resumed state of %s: %s", cp_id, central.active_tx, extra={"cpid": cp_id, "action": "connect"})
+    else:
+        # ธุรกรรมที่ยังเปิดค้างไว้ (เช่นก่อน CSMS restart หรือหลังสถานะหมด grace)
+        central.active_tx = await tx_store.load_cp(cp_id)
+        if central.active_tx:
+            log.info("[Central] Restored open transactions for %s: %s", cp_id, central.active_tx, extra={"cpid": cp_id})
+        for c_id, info in central.active_tx.items():
+            session_index.add(cp_id, c_id, info)
+    connected_cps[cp_id] = central
+    if previous is not None:
+        # ตู้ต่อใหม่ก่อนที่ socket เดิมจะถูกตรวจว่าตาย: การเชื่อมต่อใหม่ชนะ, สถานะย้ายมาแล้วใน attach
+        close_replaced_connection(cp_id, previous, "replaced by a new connection")
+    if OCPP_PING_INTERVAL_SEC > 0:
+        central.probe = liveness.watch(websocket, cp_id, central.state.ping_interval)
+    try:
+        await central.start()
+    finally:
+        if central.probe is not None:
+            central.probe.stop()
+        central.commands.close()
+        for c_id in list(central.no_session_timers):
+            central.cancel_no_session_watchdog(c_id)
+        # การเชื่อมต่อเก่าที่ถูกแทนที่ต้องไม่ลบตัวใหม่ออกจาก registry
+        connected_cps.discard(cp_id, central)
+        # สถานะ (และ session ใน session_index) อยู่ต่ออีก CHARGER_STATE_GRACE_SEC เผื่อตู้ต่อกลับมา
+        charger_states.detach(cp_id, central)
+        log.info("[Central] Disconnected: %s", cp_id, extra={"cpid": cp_id, "action": "disconnect"})
+
+
+async def main(reuse_port: bool = False):
+    """
+    สร้าง WebSocket server รอฟังการเชื่อมต่อจาก Charger
+    พร้อมกันกับ HTTP API บน :8080
+
+    reuse_port=True ใช้ในโหมด worker: หลาย process listen พอร์ตเดียวกัน
+    และไม่เปิด console (stdin มีได้ที่ process เดียว)
+    """
 
     # คอนโซลคำสั่งแบบง่าย ๆ ใน thread แยก (ใช้ควบคู่กับ REST ก็ได้)
     def console_thread(loop: asyncio.AbstractEventLoop):
@@ -644,11 +1658,8 @@ async def main():
                     txid = session.get("transaction_id", num)
                     asyncio.run_coroutine_threadsafe(cp.remote_stop(txid), loop)
                     continue
-                tx_match = None
-                for info in cp.active_tx.values():
-                    if info.get("transaction_id") == num:
-                        tx_match = num
-                        break
+                hit = session_index.get_tx(num)
+                tx_match = num if hit and hit["cpid"] == cpid else None
                 if tx_match is not None:
                     asyncio.run_coroutine_threadsafe(cp.remote_stop(tx_match), loop)
                 else:
@@ -657,19 +1668,117 @@ async def main():
             print("Unknown command. Examples: start CP_123 1 TESTTAG | stop CP_123 42 | ls | map CP_123")
 
     loop = asyncio.get_running_loop()
-    threading.Thread(target=console_thread, args=(loop,), daemon=True).start()
+    if not reuse_port:
+        threading.Thread(target=console_thread, args=(loop,), daemon=True).start()
 
     # สตาร์ท HTTP API ควบคู่กัน
-    api_task = asyncio.create_task(run_http_api())
+    http_server = build_http_server()
+    api_task = asyncio.create_task(run_http_api(http_server, reuse_port))
+
+    await tx_store.open()
+    await capability_cache.open()
+    await authorizer.backend.open()
+    meter_path = METER_DB_PATH
+    if connected_cps.shared:
+        # แยกไฟล์ต่อ worker เพื่อไม่ให้แย่ง write lock กัน
+        meter_path = f"{METER_DB_PATH}.w{connected_cps.worker_id}"
+    await meter_ingestor.start(build_meter_sink(METER_SINK, meter_path))
+
+    # SIGTERM (docker stop, terminate() ของ run_workers) = ปิดแบบเรียบร้อยเหมือน Ctrl+C
+    stop = loop.create_future()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: stop.done() or stop.set_result(None))
+    except (NotImplementedError, AttributeError):
+        pass  # Windows: ไม่มี signal handler ใน event loop
+
+    rpc_server = None
+    try:
+        if connected_cps.shared:
+            rpc_server = await connected_cps.serve_rpc(dispatch_forwarded)
+
+        async with serve(
+            ocpp_handler,
+            host=OCPP_HOST,
+            port=OCPP_PORT,
+            subprotocols=['ocpp1.6'],
+            reuse_port=reuse_port,
+            # liveness ทำเองบน timer wheel (ต่อตู้); 0 = ใช้ keepalive ของ websockets ตามเดิม
+            ping_interval=None if OCPP_PING_INTERVAL_SEC > 0 else 20,
+        ):
+            logging.info(
+                "⚡ Central listening on ws://%s:%s/ocpp/<ChargePointID> | HTTP :%s%s",
+                OCPP_HOST, OCPP_PORT, HTTP_PORT,
+                f" | worker {connected_cps.worker_id}/{connected_cps.workers}" if connected_cps.shared else "",
+            )
+            await stop  # keep running
+    finally:
+        # ปิด HTTP API ให้เสร็จก่อนปิดฐานข้อมูลที่ API ใช้
+        http_server.should_exit = True
+        await asyncio.wait([api_task], timeout=5)
+        # meter ที่ยังค้างใน buffer ลง sink ให้หมด แล้วปิดฐานข้อมูลทั้งหมด
+        if rpc_server is not None:
+            rpc_server.close()
+        await meter_ingestor.stop()
+        await tx_store.close()
+        await capability_cache.close()
+        await authorizer.backend.close()
+        logging.info("[Central] Stopped")
+
+
+def _worker_entry(worker_id: int, workers: int, owners) -> None:
+    global tx_store
+    connected_cps.share(
+        worker_id,
+        workers,
+        owners,
+        WORKER_RPC_HOST,
+        WORKER_RPC_BASE_PORT,
+        WORKER_RPC_TIMEOUT_SEC,
+    )
+    # BOOT_RATE_PER_SEC / BOOT_BURST เป็นค่ารวมทั้ง fleet: แต่ละ worker รับส่วนของตัวเอง
+    boot_admission.share(workers)
+    # thread เขียน log ของ parent ไม่ตามมาหลัง fork: สร้างใหม่ใน worker
+    configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE, LOG_QUEUE, LOG_QUEUE_MAX)
+    # ทุก worker ใช้ไฟล์ธุรกรรมเดียวกัน แต่ออกเลข transactionId คนละชุด
+    tx_store = build_tx_store(TX_STORE, TX_DB_PATH, workers, worker_id)
+    try:
+        asyncio.run(main(reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(workers: int) -> None:
+    """
+    fork worker N ตัว แต่ละตัวเป็น CSMS เต็มรูป (WebSocket + HTTP API) บนพอร์ตเดียวกัน
+    ตาราง cpid -> worker อยู่ใน multiprocessing.Manager เพื่อให้ /api/v1/start|stop
+    ส่งต่อคำสั่งไปยัง worker ที่ตู้ต่ออยู่ได้
+    """
+    if not hasattr(socket, "SO_REUSEPORT") or "fork" not in multiprocessing.get_all_start_methods():
+        logging.warning("SO_REUSEPORT/fork not available on this platform; running a single process")
+        asyncio.run(main())
+        return
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Manager() as manager:
+        owners = manager.dict()
+        procs = [
+            ctx.Process(target=_worker_entry, args=(i, workers, owners), name=f"csms-worker-{i}")
+            for i in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        logging.info("Started %s CSMS workers: %s", workers, [p.pid for p in procs])
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.join()
 
-    async with serve(
-        handler,
-        host='0.0.0.0',
-        port=9000,
-        subprotocols=['ocpp1.6']
-    ):
-        logging.info("⚡ Central listening on ws://0.0.0.0:9000/ocpp/<ChargePointID> | HTTP :8080")
-        await asyncio.Future()  # keep running
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if CSMS_WORKERS > 1:
+        run_workers(CSMS_WORKERS)
+    else:
+        asyncio.run(main())
\ No newline at end of file
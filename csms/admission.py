@@ -0,0 +1,108 @@
+import heapq
+import math
+import random
+import time
+from typing import Callable, List, Tuple
+
+
+class BootAdmission:
+    """
+    Admission control for BootNotification.
+
+    Boots are accepted from a token bucket (``rate`` per second, up to
+    ``burst`` at once). Over budget the charger gets ``Pending`` with a retry
+    interval sized to the chargers already told to come back (the backlog)
+    plus random jitter, so a fleet reconnecting after an outage is spread out
+    instead of retrying in lock-step.
+
+    Accepted chargers get a heartbeat interval that keeps the fleet's total
+    heartbeat rate near ``heartbeat_target_per_sec``, clamped to
+    [``heartbeat_min``, ``heartbeat_max``]; ``connected`` is the fleet-wide
+    count of chargers, not one worker's.
+    """
+
+    def __init__(
+        self,
+        rate: float = 20.0,
+        burst: int = 50,
+        pending_min: float = 10.0,
+        pending_max: float = 300.0,
+        jitter: float = 0.5,
+        heartbeat_min: int = 300,
+        heartbeat_max: int = 3600,
+        heartbeat_target_per_sec: float = 50.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        # rate <= 0: ไม่จำกัด (ตอบ Accepted เสมอ แบบเดิม)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.pending_min = pending_min
+        self.pending_max = pending_max
+        self.jitter = jitter
+        self.heartbeat_min = heartbeat_min
+        self.heartbeat_max = heartbeat_max
+        self.heartbeat_target_per_sec = heartbeat_target_per_sec
+        self._clock = clock
+        self._rng = rng
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        # retry times handed out with Pending (min-heap), for the backlog estimate
+        self._retries: List[float] = []
+        self.accepted = 0
+        self.pending = 0
+
+    def share(self, workers: int) -> None:
+        """
+        Worker mode: each of ``workers`` processes admits its share, so the
+        fleet-wide boot rate and burst stay as configured.
+        """
+        if workers > 1:
+            self.rate = self.rate / workers
+            self.burst = max(1, math.ceil(self.burst / workers))
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def backlog(self, now: float = None) -> int:
+        """Chargers told Pending whose retry time has not come yet."""
+        now = self._clock() if now is None else now
+        retries = self._retries
+        while retries and retries[0] <= now:
+            heapq.heappop(retries)
+        return len(retries)
+
+    def heartbeat_interval(self, connected: int) -> int:
+        if self.heartbeat_target_per_sec <= 0:
+            return self.heartbeat_min
+        interval = math.ceil(connected / self.heartbeat_target_per_sec)
+        return int(min(max(interval, self.heartbeat_min), self.heartbeat_max))
+
+    def decide(self, connected: int) -> Tuple[bool, int]:
+        """(accepted?, interval): the heartbeat interval, or the retry delay when Pending."""
+        if self.rate <= 0:
+            self.accepted += 1
+            return True, self.heartbeat_interval(connected)
+        now = self._clock()
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.accepted += 1
+            return True, self.heartbeat_interval(connected)
+        # รอจนกว่า bucket จะปล่อยให้ทุกตู้ที่อยู่ในคิวก่อนหน้า + ตู้นี้ได้เข้า
+        wait = (self.backlog(now) + 1 - self._tokens) / self.rate
+        interval = wait * (1 + self.jitter * self._rng())
+        interval = int(round(min(max(interval, self.pending_min), self.pending_max)))
+        heapq.heappush(self._retries, now + interval)
+        self.pending += 1
+        return False, interval
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "pending": self.pending,
+            "backlog": self.backlog(),
+            "tokens": round(self._tokens, 2),
+        }
@@ -0,0 +1,361 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# id_tag_info ของ Authorize.conf / StartTransaction.conf (snake_case แบบที่ ocpp ใช้)
+IdTagInfo = Dict[str, Any]
+# (updateType, listVersion, localAuthorizationList) ของ SendLocalList
+LocalListUpdate = Tuple[str, int, List[Dict[str, Any]]]
+
+ACCEPTED: IdTagInfo = {"status": "Accepted"}
+INVALID: IdTagInfo = {"status": "Invalid"}
+
+log = logging.getLogger("csms.auth")
+
+
+def _expired(info: IdTagInfo) -> bool:
+    expiry = info.get("expiry_date")
+    if not expiry:
+        return False
+    try:
+        when = datetime.fromisoformat(expiry.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when <= datetime.now(timezone.utc)
+
+
+class AuthBackend:
+    """
+    Source of truth for idTags. ``lookup`` returns the tag's id_tag_info or
+    None for an unknown tag. Every change gets a new list version, so a
+    charger's local list can be brought up to date with only the changes
+    since the version it has. ``put``/``delete`` are only available when
+    ``read_only`` is False.
+    """
+
+    read_only = True
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def lookup(self, id_tag: str) -> Optional[IdTagInfo]:
+        raise NotImplementedError
+
+    async def version(self) -> int:
+        """Current list version; 0 = no list to send to chargers."""
+        return 0
+
+    async def changes_since(self, version: int, limit: int) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        """(current version, entries changed after ``version``); None when more than ``limit`` changed."""
+        return None
+
+    async def full_list(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """(current version, at most ``limit`` entries, most recently changed first)."""
+        return 0, []
+
+    async def put(
+        self, id_tag: str, status: str, expiry_date: Optional[str] = None, parent_id_tag: Optional[str] = None
+    ) -> int:
+        raise NotImplementedError(f"{type(self).__name__} is read-only")
+
+    async def delete(self, id_tag: str) -> int:
+        raise NotImplementedError(f"{type(self).__name__} is read-only")
+
+
+class AcceptAllBackend(AuthBackend):
+    """Every idTag is Accepted (the behaviour before authorization existed)."""
+
+    async def lookup(self, id_tag: str) -> Optional[IdTagInfo]:
+        return ACCEPTED
+
+
+class SQLiteAuthBackend(AuthBackend):
+    """
+    idTags in a SQLite table (a stand-in for the customer database). A
+    deleted tag stays as a row without status so differential local list
+    updates can tell chargers to remove it. The file may be shared by
+    workers; versions are allocated inside the write transaction.
+    """
+
+    read_only = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        # one sqlite connection: run its statements one at a time
+        self._db_lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS id_tags (
+                id_tag TEXT PRIMARY KEY,
+                status TEXT,
+                expiry_date TEXT,
+                parent_id_tag TEXT,
+                version INTEGER NOT NULL,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS id_tags_version ON id_tags (version);
+            """
+        )
+        return db
+
+    async def open(self) -> None:
+        self._db = await asyncio.to_thread(self._connect)
+        logging.info("Auth backend %s: list version %s", self.path, await self.version())
+
+    async def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _run(self, fn, *args):
+        async with self._db_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    @staticmethod
+    def _info(status: str, expiry_date: Optional[str], parent_id_tag: Optional[str]) -> IdTagInfo:
+        info: IdTagInfo = {"status": status}
+        if expiry_date:
+            info["expiry_date"] = expiry_date
+        if parent_id_tag:
+            info["parent_id_tag"] = parent_id_tag
+        return info
+
+    def _entry(self, row: tuple) -> Dict[str, Any]:
+        id_tag, status, expiry_date, parent_id_tag = row
+        if status is None:
+            return {"id_tag": id_tag}  # ไม่มี id_tag_info = ลบออกจาก local list
+        return {"id_tag": id_tag, "id_tag_info": self._info(status, expiry_date, parent_id_tag)}
+
+    def _version(self) -> int:
+        return self._db.execute("SELECT COALESCE(MAX(version), 0) FROM id_tags").fetchone()[0]
+
+    async def lookup(self, id_tag: str) -> Optional[IdTagInfo]:
+        row = await self._run(
+            lambda: self._db.execute(
+                "SELECT status, expiry_date, parent_id_tag FROM id_tags WHERE id_tag = ?", (id_tag,)
+            ).fetchone()
+        )
+        if row is None or row[0] is None:
+            return None
+        return self._info(*row)
+
+    async def version(self) -> int:
+        return await self._run(self._version)
+
+    async def changes_since(self, version: int, limit: int) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+        def query():
+            self._db.execute("BEGIN")
+            try:
+                rows = self._db.execute(
+                    "SELECT id_tag, status, expiry_date, parent_id_tag FROM id_tags"
+                    " WHERE version > ? ORDER BY version LIMIT ?",
+                    (version, limit + 1),
+                ).fetchall()
+                return self._version(), rows
+            finally:
+                self._db.execute("COMMIT")
+
+        current, rows = await self._run(query)
+        if len(rows) > limit:
+            return None
+        return current, [self._entry(row) for row in rows]
+
+    async def full_list(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        def query():
+            self._db.execute("BEGIN")
+            try:
+                rows = self._db.execute(
+                    "SELECT id_tag, status, expiry_date, parent_id_tag FROM id_tags"
+                    " WHERE status IS NOT NULL ORDER BY version DESC LIMIT ?",
+                    (limit,),
+                ).fetchall()
+                return self._version(), rows
+            finally:
+                self._db.execute("COMMIT")
+
+        current, rows = await self._run(query)
+        return current, [self._entry(row) for row in rows]
+
+    async def _write(self, id_tag: str, status: Optional[str], expiry_date: Optional[str], parent_id_tag: Optional[str]):
+        def run():
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._version() + 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO id_tags VALUES (?, ?, ?, ?, ?, ?)",
+                    (id_tag, status, expiry_date, parent_id_tag, version, time.time()),
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return version
+
+        return await self._run(run)
+
+    async def put(
+        self, id_tag: str, status: str, expiry_date: Optional[str] = None, parent_id_tag: Optional[str] = None
+    ) -> int:
+        return await self._write(id_tag, status, expiry_date, parent_id_tag)
+
+    async def delete(self, id_tag: str) -> int:
+        return await self._write(id_tag, None, None, None)
+
+
+def build_auth_backend(kind: str, path: str) -> AuthBackend:
+    if kind == "sqlite":
+        return SQLiteAuthBackend(path)
+    if kind == "none":
+        return AcceptAllBackend()
+    raise ValueError(f"unknown AUTH_BACKEND '{kind}' (expected sqlite or none)")
+
+
+class Authorizer:
+    """
+    Authorize/StartTransaction decisions without a database round trip per
+    message: results are kept in an LRU of ``cache_size`` tags for ``ttl``
+    seconds, unknown and non-Accepted tags for ``negative_ttl`` (so a tag
+    that is added or unblocked works again soon). Concurrent lookups of the
+    same tag share one backend query. When the backend fails the answer is
+    Accepted with ``fail_open`` (charging goes on during an outage),
+    otherwise Invalid; neither is cached.
+    """
+
+    def __init__(
+        self,
+        backend: AuthBackend,
+        cache_size: int = 10000,
+        ttl: float = 300.0,
+        negative_ttl: float = 60.0,
+        fail_open: bool = True,
+        clock=time.monotonic,
+    ):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.fail_open = fail_open
+        self._clock = clock
+        # id_tag -> (expires_at, id_tag_info or None = unknown)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[IdTagInfo]]]" = OrderedDict()
+        # id_tag -> future of the backend lookup in flight
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def authorize(self, id_tag: str) -> IdTagInfo:
+        """id_tag_info for this idTag (Expired is worked out at every call, not cached)."""
+        entry = self._cache.get(id_tag)
+        if entry is not None and entry[0] > self._clock():
+            self._cache.move_to_end(id_tag)
+            self.hits += 1
+            info = entry[1]
+        else:
+            info = await self._fetch(id_tag)
+        if info is None:
+            return INVALID
+        if info["status"] == "Accepted" and _expired(info):
+            return dict(info, status="Expired")
+        return info
+
+    async def _fetch(self, id_tag: str) -> Optional[IdTagInfo]:
+        leader = self._inflight.get(id_tag)
+        if leader is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                # handler ของ leader ถูกยกเลิก (เช่นตู้หลุด): ถามเอง
+                return await self._fetch(id_tag)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[id_tag] = fut
+        try:
+            info = await self.backend.lookup(id_tag)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            log.warning("Auth backend lookup of %s failed: %s", id_tag, e)
+            info = ACCEPTED if self.fail_open else INVALID
+        else:
+            self._store(id_tag, info)
+        finally:
+            if self._inflight.get(id_tag) is fut:
+                del self._inflight[id_tag]
+        fut.set_result(info)
+        return info
+
+    def _store(self, id_tag: str, info: Optional[IdTagInfo]) -> None:
+        ttl = self.ttl if info is not None and info["status"] == "Accepted" else self.negative_ttl
+        if ttl <= 0 or self.cache_size <= 0:
+            return
+        self._cache[id_tag] = (self._clock() + ttl, info)
+        self._cache.move_to_end(id_tag)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, id_tag: Optional[str] = None) -> None:
+        """Forget one tag (it was changed) or, without ``id_tag``, all of them."""
+        if id_tag is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(id_tag, None)
+
+    async def local_list_update(self, charger_version: int, max_length: int, full: bool = False) -> Optional[LocalListUpdate]:
+        """
+        SendLocalList that brings a charger holding list ``charger_version``
+        up to date: a Differential update with the changes since then when
+        possible, else a Full list of at most ``max_length`` tags. None when
+        the charger is current, has no local list (-1) or there is no list.
+        """
+        if charger_version < 0:
+            return None
+        if not full and charger_version > 0:
+            changes = await self.backend.changes_since(charger_version, max_length)
+            if changes is not None:
+                version, entries = changes
+                if version == charger_version:
+                    return None
+                if version > charger_version:
+                    return "Differential", version, entries
+        version, entries = await self.backend.full_list(max_length)
+        if version == 0 or (version == charger_version and not full):
+            return None
+        return "Full", version, entries
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+ModelKey = Tuple[str, str, str]  # (vendor, model, firmware)
+
+# key ที่ CSMS ใช้ค่าปรับการทำงานต่อตู้ (ตั้งต่างกันได้แม้รุ่น/firmware เดียวกัน): จำค่าไว้ต่อ cpid
+CHARGER_SETTINGS = (
+    "WebSocketPingInterval", "LocalAuthListEnabled", "LocalAuthListMaxLength", "SendLocalListMaxLength",
+)
+
+
+def _configuration_items(conf_resp: Any) -> List[Tuple[Optional[str], Optional[str]]]:
+    items: Any = []
+    if hasattr(conf_resp, "configuration_key"):
+        items = getattr(conf_resp, "configuration_key")
+    elif hasattr(conf_resp, "configurationKey"):
+        items = getattr(conf_resp, "configurationKey")
+    elif isinstance(conf_resp, dict):
+        items = conf_resp.get("configuration_key") or conf_resp.get("configurationKey") or []
+    out = []
+    for entry in items or []:
+        if isinstance(entry, dict):
+            out.append((entry.get("key"), entry.get("value")))
+        else:
+            out.append((getattr(entry, "key", None), getattr(entry, "value", None)))
+    return out
+
+
+def parse_configuration_keys(conf_resp: Any) -> List[str]:
+    """Key names of a GetConfiguration.conf (dataclass or dict, camel/snake case)."""
+    return [key for key, _ in _configuration_items(conf_resp) if key]
+
+
+def parse_configuration_values(conf_resp: Any, names: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Values of ``names`` in a GetConfiguration.conf; a name the charger did not report maps to None."""
+    values = {key: value for key, value in _configuration_items(conf_resp) if key}
+    return {name: values.get(name) for name in names}
+
+
+class CapabilityCache:
+    """
+    Supported configuration keys learned from GetConfiguration, remembered
+    per (vendor, model, firmware) and per cpid so a charger that boots again
+    (or another unit of the same model/firmware) needs no round trip.
+
+    A cpid entry is dropped as soon as the charger boots with a different
+    firmware; model entries are keyed by firmware so they never go stale.
+    The values of ``CHARGER_SETTINGS`` (which each unit may set
+    differently) are kept per cpid next to its keys.
+    With a ``path`` the cache is kept in SQLite and survives restarts (and
+    is shared by workers: a miss is looked up in the file before asking
+    the charger).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or None
+        self.by_model: Dict[ModelKey, List[str]] = {}
+        # cpid -> (model key, keys)
+        self.by_cp: Dict[str, Tuple[ModelKey, List[str]]] = {}
+        # cpid -> {key: value or None (ตู้ไม่มีค่านี้)} ของ CHARGER_SETTINGS
+        self.settings_by_cp: Dict[str, Dict[str, Optional[str]]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        # model key -> future of the GetConfiguration in flight
+        self._inflight: Dict[ModelKey, asyncio.Future] = {}
+        # one sqlite connection: run its statements one at a time
+        self._db_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def model_key(vendor: Optional[str], model: Optional[str], firmware: Optional[str]) -> ModelKey:
+        return (vendor or "", model or "", firmware or "")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS model_capabilities (
+                vendor TEXT NOT NULL,
+                model TEXT NOT NULL,
+                firmware TEXT NOT NULL,
+                keys TEXT NOT NULL,
+                updated_at REAL,
+                PRIMARY KEY (vendor, model, firmware)
+            );
+            CREATE TABLE IF NOT EXISTS cp_capabilities (
+                cpid TEXT PRIMARY KEY,
+                vendor TEXT NOT NULL,
+                model TEXT NOT NULL,
+                firmware TEXT NOT NULL,
+                keys TEXT NOT NULL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS cp_settings (
+                cpid TEXT PRIMARY KEY,
+                settings TEXT NOT NULL,
+                updated_at REAL
+            );
+            """
+        )
+        db.commit()
+        return db
+
+    def _load(self) -> None:
+        for vendor, model, firmware, keys in self._db.execute(
+            "SELECT vendor, model, firmware, keys FROM model_capabilities"
+        ):
+            self.by_model[(vendor, model, firmware)] = json.loads(keys)
+        for cpid, vendor, model, firmware, keys in self._db.execute(
+            "SELECT cpid, vendor, model, firmware, keys FROM cp_capabilities"
+        ):
+            self.by_cp[cpid] = ((vendor, model, firmware), json.loads(keys))
+        for cpid, settings in self._db.execute("SELECT cpid, settings FROM cp_settings"):
+            self.settings_by_cp[cpid] = json.loads(settings)
+
+    async def open(self) -> None:
+        if not self.path:
+            return
+        self._db = await asyncio.to_thread(self._connect)
+        await asyncio.to_thread(self._load)
+        logging.info(
+            "Capability cache %s: %s models, %s chargers", self.path, len(self.by_model), len(self.by_cp)
+        )
+
+    async def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def lookup(
+        self, cpid: str, vendor: Optional[str], model: Optional[str], firmware: Optional[str]
+    ) -> Optional[List[str]]:
+        """Known keys for this charger/firmware, or None when GetConfiguration is needed."""
+        key = self.model_key(vendor, model, firmware)
+        entry = self.by_cp.get(cpid)
+        if entry is not None:
+            if entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            # เปลี่ยน firmware (หรือรุ่น): ค่าเดิมของตู้นี้ใช้ไม่ได้แล้ว
+            self.invalidations += 1
+            del self.by_cp[cpid]
+            self.settings_by_cp.pop(cpid, None)
+            await self._write(
+                "DELETE FROM cp_capabilities WHERE cpid = ?", (cpid,),
+                "DELETE FROM cp_settings WHERE cpid = ?", (cpid,),
+            )
+        keys = self.by_model.get(key)
+        if keys is None and self._db is not None:
+            # worker อื่นอาจเพิ่งเรียนรู้รุ่นนี้
+            async with self._db_lock:
+                row = await asyncio.to_thread(
+                    lambda: self._db.execute(
+                        "SELECT keys FROM model_capabilities WHERE vendor = ? AND model = ? AND firmware = ?", key
+                    ).fetchone()
+                )
+            if row is not None:
+                keys = self.by_model[key] = json.loads(row[0])
+        if keys is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.by_cp[cpid] = (key, keys)
+        await self._write(
+            "INSERT OR REPLACE INTO cp_capabilities VALUES (?, ?, ?, ?, ?, ?)",
+            (cpid, *key, json.dumps(keys), time.time()),
+        )
+        return keys
+
+    async def store(
+        self, cpid: str, vendor: Optional[str], model: Optional[str], firmware: Optional[str], keys: List[str]
+    ) -> None:
+        key = self.model_key(vendor, model, firmware)
+        self.by_model[key] = list(keys)
+        self.by_cp[cpid] = (key, self.by_model[key])
+        now = time.time()
+        await self._write(
+            "INSERT OR REPLACE INTO model_capabilities VALUES (?, ?, ?, ?, ?)",
+            (*key, json.dumps(keys), now),
+            "INSERT OR REPLACE INTO cp_capabilities VALUES (?, ?, ?, ?, ?, ?)",
+            (cpid, *key, json.dumps(keys), now),
+        )
+
+    def settings(self, cpid: str) -> Dict[str, Optional[str]]:
+        """Known CHARGER_SETTINGS values of the charger (a missing name has not been read yet)."""
+        return self.settings_by_cp.get(cpid) or {}
+
+    async def store_settings(self, cpid: str, values: Dict[str, Optional[str]]) -> None:
+        settings = self.settings_by_cp[cpid] = {**self.settings(cpid), **values}
+        await self._write(
+            "INSERT OR REPLACE INTO cp_settings VALUES (?, ?, ?)", (cpid, json.dumps(settings), time.time())
+        )
+
+    async def forget_settings(self, cpid: str) -> None:
+        """ค่าที่จำไว้ใช้ไม่ได้แล้ว (เช่น CSMS เพิ่งเปลี่ยนด้วย ChangeConfiguration): อ่านใหม่ตอน boot ถัดไป"""
+        if self.settings_by_cp.pop(cpid, None) is not None:
+            await self._write("DELETE FROM cp_settings WHERE cpid = ?", (cpid,))
+
+    async def resolve(
+        self,
+        cpid: str,
+        vendor: Optional[str],
+        model: Optional[str],
+        firmware: Optional[str],
+        fetch: Callable[[], Awaitable[Optional[List[str]]]],
+    ) -> Optional[List[str]]:
+        """
+        Cached keys, or ``fetch()`` them (GetConfiguration) and remember the
+        result. Concurrent misses for the same model/firmware (e.g. a site
+        coming back after a power cut) wait for the first charger's answer
+        instead of each sending its own GetConfiguration.
+        """
+        keys = await self.lookup(cpid, vendor, model, firmware)
+        if keys is not None:
+            return keys
+        key = self.model_key(vendor, model, firmware)
+        leader = self._inflight.get(key)
+        if leader is not None:
+            keys = await asyncio.shield(leader)
+            if keys is not None:
+                self.coalesced += 1
+                return await self.lookup(cpid, vendor, model, firmware)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            keys = await fetch()
+            if keys is not None:
+                await self.store(cpid, vendor, model, firmware, keys)
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            if not fut.done():
+                fut.set_result(keys)
+        return keys
+
+    async def _write(self, *statements: Any) -> None:
+        if self._db is None:
+            return
+
+        def run():
+            with self._db:
+                for sql, params in zip(statements[::2], statements[1::2]):
+                    self._db.execute(sql, params)
+
+        try:
+            async with self._db_lock:
+                await asyncio.to_thread(run)
+        except sqlite3.Error as e:
+            # เป็นแค่ cache: เขียนไม่ได้ก็ยังทำงานต่อได้
+            logging.warning("Capability cache write failed: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "models": len(self.by_model),
+            "chargers": len(self.by_cp),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,128 @@
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from csms.pending import PendingStarts
+from csms.timers import Timer, TimerWheel
+
+
+class ChargerState:
+    """
+    What the CSMS knows about one charger beyond a single WebSocket:
+    open transactions, last status per connector, pending remote starts
+    and the ping interval tuned for it. ``owner`` is the connection
+    (CentralSystem) using it, None while the charger is away.
+    """
+
+    __slots__ = (
+        "cpid", "active_tx", "connector_status", "pending_starts", "ping_interval", "local_list_max",
+        "owner", "detached_at", "gc_timer",
+    )
+
+    def __init__(self, cpid: str, pending_starts: PendingStarts):
+        self.cpid = cpid
+        # key: connector_id (int) -> value: {"transaction_id": int, "id_tag": str, ...}
+        self.active_tx: Dict[int, Dict[str, Any]] = {}
+        self.connector_status: Dict[int, str] = {}
+        self.pending_starts = pending_starts
+        # ping interval ที่ปรับตาม WebSocketPingInterval ของตู้ (None = ค่า default ของ CSMS)
+        self.ping_interval: Optional[float] = None
+        # จำนวน idTag สูงสุดที่ส่งให้ local authorization list ของตู้ได้ (0 = ตู้ไม่ใช้ local list)
+        self.local_list_max = 0
+        self.owner: Optional[Any] = None
+        self.detached_at: Optional[float] = None
+        self.gc_timer: Optional[Timer] = None
+
+
+class ChargerStates:
+    """
+    ChargerState per cpid, independent of connections. A charger that
+    reconnects within ``grace_sec`` gets its state back (one dict lookup)
+    and its sessions stay known meanwhile; after that the state is dropped
+    by a timer on the shared wheel and ``on_expire(state)`` cleans up.
+    ``grace_sec`` 0 = drop at disconnect.
+    """
+
+    def __init__(
+        self,
+        timers: TimerWheel,
+        grace_sec: float,
+        new_pending: Callable[[], PendingStarts],
+        on_expire: Optional[Callable[[ChargerState], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._timers = timers
+        self.grace_sec = grace_sec
+        self._new_pending = new_pending
+        self._on_expire = on_expire
+        self._clock = clock
+        self._states: Dict[str, ChargerState] = {}
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, cpid: str) -> bool:
+        return cpid in self._states
+
+    def get(self, cpid: str) -> Optional[ChargerState]:
+        return self._states.get(cpid)
+
+    @property
+    def detached(self) -> int:
+        return sum(1 for s in self._states.values() if s.owner is None)
+
+    def attach(self, cpid: str, owner: Any) -> Tuple[ChargerState, bool]:
+        """State for a new connection of ``cpid`` -> (state, resumed)."""
+        state = self._states.get(cpid)
+        resumed = state is not None
+        if state is None:
+            state = self._states[cpid] = ChargerState(cpid, self._new_pending())
+            self.created += 1
+        else:
+            self.resumed += 1
+            if state.gc_timer is not None:
+                state.gc_timer.cancel()
+                state.gc_timer = None
+        state.owner = owner
+        state.detached_at = None
+        return state, resumed
+
+    def detach(self, cpid: str, owner: Any) -> None:
+        """Connection ``owner`` closed; a newer connection that already took the state over is left alone."""
+        state = self._states.get(cpid)
+        if state is None or state.owner is not owner:
+            return
+        state.owner = None
+        state.detached_at = self._clock()
+        if self.grace_sec > 0:
+            state.gc_timer = self._timers.schedule(self.grace_sec, self._expire, state)
+        else:
+            self._expire(state)
+
+    def evict(self, cpid: str, owner: Any) -> None:
+        """
+        The charger now belongs to another worker (which reloads its open
+        transactions): drop the state of connection ``owner`` at once
+        instead of keeping it for the grace period. ``owner`` None drops a
+        state that is already detached (the charger left before it moved).
+        """
+        state = self._states.get(cpid)
+        if state is None or state.owner is not owner:
+            return
+        if state.gc_timer is not None:
+            state.gc_timer.cancel()
+        if owner is not None:
+            state.owner = None
+            state.detached_at = self._clock()
+        self._expire(state)
+
+    def _expire(self, state: ChargerState) -> None:
+        if self._states.get(state.cpid) is not state or state.owner is not None:
+            return
+        del self._states[state.cpid]
+        state.gc_timer = None
+        self.expired += 1
+        if self._on_expire is not None:
+            self._on_expire(state)
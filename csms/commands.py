@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# ลำดับความสำคัญของคำสั่งในคิวของตู้ (น้อย = ส่งก่อน)
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class CommandError(Exception):
+    """
+    An outbound command that got no answer from the charger. ``reason`` is
+    one of queue_full, expired (deadline passed while queued), timeout (sent,
+    no answer in time) or disconnected.
+    """
+
+    def __init__(self, reason: str, detail: str):
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+
+
+def _action(payload: Any) -> str:
+    # ชื่อ action แบบเดียวกับที่ ocpp ใช้ (RemoteStartTransactionPayload -> RemoteStartTransaction)
+    return payload.__class__.__name__[:-7]
+
+
+class CommandQueue:
+    """
+    Outbound CALLs to one charger. OCPP allows a single outstanding CALL per
+    direction, so commands are sent one at a time in (priority, arrival)
+    order; each has a deadline covering both the wait in the queue and the
+    charger's answer. The drain task only exists while there is work, so
+    idle chargers cost nothing. ``on_expired(action)`` is called for every
+    command dropped at its deadline (process-wide accounting).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any], Awaitable[Any]],
+        max_pending: int = 100,
+        default_timeout: float = 30.0,
+        on_expired: Optional[Callable[[str], None]] = None,
+    ):
+        self._send = send
+        self.max_pending = max_pending
+        self.default_timeout = default_timeout
+        self._on_expired = on_expired
+        # (priority, seq, deadline, payload, future)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._worker: Optional[asyncio.Task] = None
+        self.closed = False
+        self.inflight: Optional[str] = None
+        self.sent = 0
+        self.expired = 0
+        self.timed_out = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def submit(self, payload: Any, priority: str = "normal", timeout: Optional[float] = None) -> asyncio.Future:
+        """Queue ``payload``; the returned future resolves to the charger's response."""
+        if self.closed:
+            raise CommandError("disconnected", f"{_action(payload)}: charger disconnected")
+        if len(self._heap) >= self.max_pending:
+            raise CommandError("queue_full", f"{_action(payload)}: {len(self._heap)} commands already queued")
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        deadline = loop.time() + (timeout or self.default_timeout)
+        heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), deadline, payload, fut))
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._drain())
+        return fut
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            _, _, deadline, payload, fut = heapq.heappop(self._heap)
+            if fut.done():
+                # ผู้สั่งยกเลิกไปแล้ว
+                continue
+            action = _action(payload)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.expired += 1
+                if self._on_expired is not None:
+                    self._on_expired(action)
+                fut.set_exception(CommandError("expired", f"{action}: deadline passed while queued"))
+                continue
+            self.inflight = action
+            try:
+                result = await asyncio.wait_for(self._send(payload), remaining)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                if not fut.done():
+                    fut.set_exception(CommandError("timeout", f"{action}: no answer within the deadline"))
+            except asyncio.CancelledError:
+                if not fut.done():
+                    fut.set_exception(CommandError("disconnected", f"{action}: charger disconnected"))
+                raise
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                self.sent += 1
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self.inflight = None
+
+    def close(self) -> None:
+        """Charger gone: fail everything queued and stop the drain task."""
+        self.closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+        while self._heap:
+            _, _, _, payload, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_exception(CommandError("disconnected", f"{_action(payload)}: charger disconnected"))
+                # ไม่มีใครรอแล้วก็ไม่ต้องเตือน "exception was never retrieved"
+                fut.exception()
+
+
+def outcome_of(response: Any) -> str:
+    """Short result of a command: its ``status`` (Accepted, Rejected, ...), ``ok``, or ``call_error``."""
+    if response is None:
+        # ตู้ตอบ CallError (ocpp suppress แล้วคืน None)
+        return "call_error"
+    status = getattr(response, "status", None)
+    if status is None:
+        return "ok"
+    return getattr(status, "value", status)
+
+
+async def fan_out(
+    targets: Iterable[str],
+    run: Callable[[str], Awaitable[Any]],
+    concurrency: int,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    ``run(target)`` for every target with at most ``concurrency`` in flight;
+    {target: {"outcome": ..., "detail"?: ...}}. A fixed pool of workers pulls
+    from one iterator, so thousands of targets do not mean thousands of tasks.
+    """
+    targets = list(targets)
+    results: Dict[str, Dict[str, Any]] = {}
+    it = iter(targets)
+
+    async def worker():
+        for target in it:
+            try:
+                results[target] = {"outcome": outcome_of(await run(target))}
+            except CommandError as e:
+                results[target] = {"outcome": e.reason, "detail": e.detail}
+            except Exception as e:
+                results[target] = {"outcome": "error", "detail": str(e)}
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(targets))))))
+    return results
+
+
+def summarize(results: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Count of targets per outcome."""
+    return dict(Counter(r["outcome"] for r in results.values()))
@@ -0,0 +1,98 @@
+import os
+
+# พอร์ต/โฮสต์ของ CSMS (ค่าเดิม: WebSocket :9000, HTTP API :8080)
+OCPP_HOST = os.getenv("OCPP_HOST", "0.0.0.0")
+OCPP_PORT = int(os.getenv("OCPP_PORT", "9000"))
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("HTTP_PORT", "8080"))
+
+# จำนวน worker process ที่รับ WebSocket/HTTP บนพอร์ตเดียวกันด้วย SO_REUSEPORT
+# 1 = รันแบบ process เดียวเหมือนเดิม (มี console ให้พิมพ์คำสั่ง)
+CSMS_WORKERS = int(os.getenv("CSMS_WORKERS", "1"))
+# worker i เปิดพอร์ตภายใน (127.0.0.1) = WORKER_RPC_BASE_PORT + i ไว้รับคำสั่งที่ส่งต่อมาจาก worker อื่น
+WORKER_RPC_HOST = os.getenv("WORKER_RPC_HOST", "127.0.0.1")
+WORKER_RPC_BASE_PORT = int(os.getenv("WORKER_RPC_BASE_PORT", "9100"))
+WORKER_RPC_TIMEOUT_SEC = float(os.getenv("WORKER_RPC_TIMEOUT_SEC", "35"))
+
+# MeterValues ingestion: handler ใส่ sample ลง buffer แล้ว background task เขียนเป็น batch
+METER_SINK = os.getenv("METER_SINK", "sqlite")  # sqlite | jsonl | none
+METER_DB_PATH = os.getenv("METER_DB_PATH", "data/meter_values.db")
+METER_QUEUE_MAX = int(os.getenv("METER_QUEUE_MAX", "100000"))
+METER_BATCH_SIZE = int(os.getenv("METER_BATCH_SIZE", "5000"))
+METER_FLUSH_SEC = float(os.getenv("METER_FLUSH_SEC", "1.0"))
+# ประวัติ meter ในหน่วยความจำ: ring buffer ต่อ (cpid, connector, measurand), 16 * capacity bytes ต่อ series
+# (ค่าเริ่มต้นใช้ได้ไม่เกิน ~400 MB); series ของตู้ถูกลบเมื่อ state ของตู้หมดอายุ
+METER_SERIES_CAPACITY = int(os.getenv("METER_SERIES_CAPACITY", "512"))
+METER_MAX_SERIES = int(os.getenv("METER_MAX_SERIES", "50000"))
+
+# ที่เก็บธุรกรรม (เลข transactionId ต่อเนื่องข้ามการ restart และกู้ธุรกรรมที่ยังเปิดอยู่)
+TX_STORE = os.getenv("TX_STORE", "sqlite")  # sqlite | memory
+TX_DB_PATH = os.getenv("TX_DB_PATH", "data/transactions.db")
+
+# /api/v1/events (SSE): buffer ต่อ subscriber (เต็มแล้วตัดการเชื่อมต่อ) และคาบ keepalive
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "1000"))
+EVENTS_KEEPALIVE_SEC = float(os.getenv("EVENTS_KEEPALIVE_SEC", "15"))
+
+# logging: text | json, สุ่มเก็บบาง action (เช่น "Heartbeat=100,MeterValues=20/s")
+# และเขียนผ่าน queue ใน thread แยก (record ที่ล้น queue จะถูกทิ้ง)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1") not in ("0", "false", "no")
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "100000"))
+# ocpp library logs every raw frame at INFO; e.g. LOG_OCPP_LEVEL=WARNING for large fleets
+LOG_OCPP_LEVEL = os.getenv("LOG_OCPP_LEVEL", "")  # ว่าง = ตาม LOG_LEVEL
+
+# cache ของ configuration keys ต่อ (vendor, model, firmware) และต่อ cpid ("" = ไม่บันทึกลงไฟล์)
+CAPABILITY_DB_PATH = os.getenv("CAPABILITY_DB_PATH", "data/capabilities.db")
+
+# admission control ของ BootNotification: รับได้ BOOT_RATE_PER_SEC ตู้/วินาที (burst BOOT_BURST, 0 = ไม่จำกัด)
+# เกินนั้นตอบ Pending พร้อม interval (สุ่ม jitter) ให้ตู้กลับมาใหม่
+BOOT_RATE_PER_SEC = float(os.getenv("BOOT_RATE_PER_SEC", "20"))
+BOOT_BURST = int(os.getenv("BOOT_BURST", "50"))
+BOOT_PENDING_MIN_SEC = float(os.getenv("BOOT_PENDING_MIN_SEC", "10"))
+BOOT_PENDING_MAX_SEC = float(os.getenv("BOOT_PENDING_MAX_SEC", "300"))
+BOOT_PENDING_JITTER = float(os.getenv("BOOT_PENDING_JITTER", "0.5"))
+# heartbeat interval ตามขนาด fleet: ให้ heartbeat รวมไม่เกิน HEARTBEAT_TARGET_PER_SEC ข้อความ/วินาที
+HEARTBEAT_MIN_SEC = int(os.getenv("HEARTBEAT_MIN_SEC", "300"))
+HEARTBEAT_MAX_SEC = int(os.getenv("HEARTBEAT_MAX_SEC", "3600"))
+HEARTBEAT_TARGET_PER_SEC = float(os.getenv("HEARTBEAT_TARGET_PER_SEC", "50"))
+
+# คิวคำสั่งขาออกต่อตู้ (RemoteStart/Stop, Unlock, bulk ...): deadline เริ่มต้นและจำนวนที่รอได้
+COMMAND_TIMEOUT_SEC = float(os.getenv("COMMAND_TIMEOUT_SEC", "30"))
+COMMAND_QUEUE_MAX = int(os.getenv("COMMAND_QUEUE_MAX", "100"))
+# /api/v1/bulk: จำนวนคำสั่งที่ส่งพร้อมกันสูงสุด (รวมทุก worker)
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "200"))
+
+# timer wheel ของ process (watchdog ของ connector ที่เสียบสายแต่ไม่เริ่มชาร์จ ฯลฯ): ความละเอียด TIMER_TICK_SEC
+TIMER_TICK_SEC = float(os.getenv("TIMER_TICK_SEC", "1"))
+NO_SESSION_TIMEOUT_SEC = float(os.getenv("NO_SESSION_TIMEOUT_SEC", "90"))
+# remote start ที่ตู้รับแล้วแต่ไม่ส่ง StartTransaction: ลืม idTag ที่รออยู่หลัง PENDING_START_TTL_SEC (สูงสุด PENDING_START_MAX ต่อตู้)
+PENDING_START_TTL_SEC = float(os.getenv("PENDING_START_TTL_SEC", "180"))
+PENDING_START_MAX = int(os.getenv("PENDING_START_MAX", "64"))
+# สถานะต่อ cpid (active_tx, status, pending) อยู่ต่อหลังตู้หลุดอีก CHARGER_STATE_GRACE_SEC ให้ต่อกลับมาใช้ต่อได้ (0 = ทิ้งทันที)
+CHARGER_STATE_GRACE_SEC = float(os.getenv("CHARGER_STATE_GRACE_SEC", "600"))
+# ping/pong ของ CSMS ต่อการเชื่อมต่อ (แทน keepalive ของ websockets): ไม่ได้ pong ภายใน timeout = ปิด socket ที่ค้างครึ่งทาง
+# ตู้ที่รายงาน WebSocketPingInterval สั้นกว่าจะถูก ping ถี่ตามนั้น (ไม่ต่ำกว่า OCPP_PING_MIN_SEC); 0 = ปิด
+OCPP_PING_INTERVAL_SEC = float(os.getenv("OCPP_PING_INTERVAL_SEC", "20"))
+OCPP_PING_TIMEOUT_SEC = float(os.getenv("OCPP_PING_TIMEOUT_SEC", "10"))
+OCPP_PING_MIN_SEC = float(os.getenv("OCPP_PING_MIN_SEC", "5"))
+
+# OCPP frame codec: auto (orjson ถ้ามี) | orjson | json
+OCPP_CODEC = os.getenv("OCPP_CODEC", "auto")
+# action ที่ไม่ตรวจ JSON schema (เช่น "Heartbeat,MeterValues") เฉพาะตู้ที่ id ตรงกับ OCPP_TRUSTED_CPIDS (fnmatch, คั่นด้วย ,)
+OCPP_SKIP_VALIDATION = os.getenv("OCPP_SKIP_VALIDATION", "")
+OCPP_TRUSTED_CPIDS = os.getenv("OCPP_TRUSTED_CPIDS", "*")
+
+# การตรวจ idTag (Authorize / StartTransaction): none = รับทุก idTag เหมือนเดิม, sqlite = ตาราง id_tags ใน AUTH_DB_PATH
+# ผลถูก cache (LRU) AUTH_CACHE_TTL_SEC, idTag ที่ไม่รู้จัก/ไม่ Accepted เก็บ AUTH_NEGATIVE_TTL_SEC
+# ฐานข้อมูลล่ม: AUTH_FAIL_OPEN=1 ตอบ Accepted (ชาร์จต่อได้), 0 ตอบ Invalid
+AUTH_BACKEND = os.getenv("AUTH_BACKEND", "none")  # none | sqlite
+AUTH_DB_PATH = os.getenv("AUTH_DB_PATH", "data/auth.db")
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SEC = float(os.getenv("AUTH_CACHE_TTL_SEC", "300"))
+AUTH_NEGATIVE_TTL_SEC = float(os.getenv("AUTH_NEGATIVE_TTL_SEC", "60"))
+AUTH_FAIL_OPEN = os.getenv("AUTH_FAIL_OPEN", "1") not in ("0", "false", "no")
+# local authorization list ของตู้ที่มี LocalAuthListEnabled=true: ส่งแบบ Full ได้ไม่เกินนี้
+# (และไม่เกิน LocalAuthListMaxLength / SendLocalListMaxLength ของตู้; Differential เมื่อทำได้)
+AUTH_LOCAL_LIST_MAX = int(os.getenv("AUTH_LOCAL_LIST_MAX", "1000"))
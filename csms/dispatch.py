@@ -0,0 +1,201 @@
+import asyncio
+import dataclasses
+import inspect
+import logging
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import ocpp.charge_point
+from ocpp.charge_point import _raise_key_error, camel_to_snake_case, snake_to_camel_case
+
+from ocpp_common import codec
+
+LOGGER = logging.getLogger("ocpp")
+
+# key ที่แปลงแล้ว (camelCase <-> snake_case): key ใน OCPP มีจำนวนจำกัด แต่ payload ที่ไม่ผ่าน
+# schema อาจมี key อะไรก็ได้ จึงจำกัดขนาด cache ไว้
+_KEY_CACHE_MAX = 4096
+_snake_keys: Dict[str, str] = {}
+_camel_keys: Dict[str, str] = {}
+# dataclass type -> ((field name, camelCase name), ...)
+_fields: Dict[type, Tuple[Tuple[str, str], ...]] = {}
+# id(instance) -> instance ของคำตอบคงที่ที่ลงทะเบียนด้วย constant_result()
+_pooled: Dict[int, Any] = {}
+
+
+def _snake_key(key: str) -> str:
+    try:
+        return _snake_keys[key]
+    except KeyError:
+        pass
+    snake = next(iter(camel_to_snake_case({key: None})))
+    if len(_snake_keys) < _KEY_CACHE_MAX:
+        _snake_keys[key] = snake
+    return snake
+
+
+def _camel_key(key: str) -> str:
+    try:
+        return _camel_keys[key]
+    except KeyError:
+        pass
+    camel = next(iter(snake_to_camel_case({key: None})))
+    if len(_camel_keys) < _KEY_CACHE_MAX:
+        _camel_keys[key] = camel
+    return camel
+
+
+def snake_case(data: Any) -> Any:
+    """ocpp's camel_to_snake_case with the key conversion memoized (no regex per key)."""
+    if isinstance(data, dict):
+        return {_snake_key(k): snake_case(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [snake_case(v) for v in data]
+    return data
+
+
+def _fields_of(cls: type) -> Tuple[Tuple[str, str], ...]:
+    try:
+        return _fields[cls]
+    except KeyError:
+        pass
+    names = tuple((f.name, _camel_key(f.name)) for f in dataclasses.fields(cls))
+    _fields[cls] = names
+    return names
+
+
+def camel_case(data: Any) -> Any:
+    """
+    ``snake_to_camel_case(remove_nones(asdict(data)))`` in one pass: no deep
+    copy of the dataclass, and field names are converted once per type.
+    """
+    if dataclasses.is_dataclass(data) and not isinstance(data, type):
+        out = {}
+        for name, camel in _fields_of(type(data)):
+            value = getattr(data, name)
+            if value is not None:
+                out[camel] = camel_case(value)
+        return out
+    if isinstance(data, dict):
+        return {_camel_key(k): camel_case(v) for k, v in data.items() if v is not None}
+    if isinstance(data, list):
+        return [camel_case(v) for v in data if v is not None]
+    return data
+
+
+def constant_result(payload: Any) -> Any:
+    """
+    Register a reply payload that a handler returns as is, every time (e.g.
+    ``DataTransferPayload(status=Accepted)``). The instance is shared, so it
+    must never be modified; its JSON is built and validated once and then
+    reused for every reply. Payload types without fields
+    (StatusNotification, MeterValues, ...) are constant without registering.
+    """
+    _pooled[id(payload)] = payload
+    return payload
+
+
+def _constant_key(response: Any) -> Optional[Any]:
+    if id(response) in _pooled:
+        return id(response)
+    if not _fields_of(type(response)):
+        return type(response)
+    return None
+
+
+class Route(NamedTuple):
+    on: Callable[..., Any]
+    after: Optional[Callable[..., Any]]
+    # handler ประกาศ call_unique_id ไว้ใน signature หรือไม่ (ocpp ตรวจด้วย inspect ทุกข้อความ)
+    on_unique_id: bool
+    after_unique_id: bool
+
+
+def build_dispatch(cls: type) -> Dict[str, Route]:
+    """Action -> Route for the @on/@after methods of ``cls`` (what ocpp's create_route_map finds)."""
+    on: Dict[str, Callable[..., Any]] = {}
+    after: Dict[str, Callable[..., Any]] = {}
+    for name in dir(cls):
+        attr = getattr(cls, name, None)
+        if hasattr(attr, "_on_action"):
+            on[attr._on_action] = attr
+        if hasattr(attr, "_after_action"):
+            after[attr._after_action] = attr
+    table = {}
+    for action, handler in on.items():
+        hook = after.get(action)
+        table[action] = Route(
+            on=handler,
+            after=hook,
+            on_unique_id="call_unique_id" in inspect.signature(handler).parameters,
+            after_unique_id=hook is not None and "call_unique_id" in inspect.signature(hook).parameters,
+        )
+    return table
+
+
+class PrecompiledDispatch:
+    """
+    Mixin for ocpp ChargePoint classes that replaces the per-message work of
+    ``ChargePoint._handle_call`` with tables built once per class: the
+    handlers and their signatures, memoized camelCase/snake_case keys, and
+    the serialized JSON of constant replies (validated once, then reused).
+    Behaviour is the same as ocpp's: schema validation (honouring the
+    per-route skip flag), CallError when a handler raises, @after hooks
+    scheduled after the reply was sent.
+    """
+
+    _dispatch: Dict[str, Route] = {}
+    # (action, ocpp version, skip validation, constant key) -> JSON ของ payload
+    _constant_bodies: Dict[Tuple[str, str, bool, Any], str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = build_dispatch(cls)
+        cls._constant_bodies = {}
+
+    async def _handle_call(self, msg):
+        route = self._dispatch.get(msg.action)
+        if route is None:
+            _raise_key_error(msg.action, self._ocpp_version)
+            return
+        # ValidationBypass ตั้ง flag นี้ต่อ instance ใน route_map
+        skip = self.route_map[msg.action].get("_skip_schema_validation", False)
+        # validate_payload อ่านจาก ocpp.charge_point ทุกครั้ง (codec.install() เปลี่ยนตัวนี้)
+        if not skip:
+            ocpp.charge_point.validate_payload(msg, self._ocpp_version)
+        payload = snake_case(msg.payload) if msg.payload else {}
+
+        try:
+            if route.on_unique_id:
+                response = route.on(self, **payload, call_unique_id=msg.unique_id)
+            else:
+                response = route.on(self, **payload)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as e:
+            LOGGER.exception("Error while handling request '%s'", msg)
+            await self._send(msg.create_call_error(e).to_json())
+            return
+
+        key = _constant_key(response)
+        cache_key = (msg.action, self._ocpp_version, skip, key)
+        body = self._constant_bodies.get(cache_key) if key is not None else None
+        if body is not None:
+            await self._send("[3," + codec.dumps(msg.unique_id) + "," + body + "]")
+        else:
+            result = msg.create_call_result(camel_case(response))
+            if not skip:
+                ocpp.charge_point.validate_payload(result, self._ocpp_version)
+            if key is not None:
+                self._constant_bodies[cache_key] = codec.dumps(result.payload)
+            await self._send(result.to_json())
+            response = result
+
+        if route.after is not None:
+            if route.after_unique_id:
+                response = route.after(self, **payload, call_unique_id=msg.unique_id)
+            else:
+                response = route.after(self, **payload)
+            # เหมือน ocpp: after hook เป็น task แยก จะได้เรียก call() ข้างในได้โดยไม่ block
+            if inspect.isawaitable(response):
+                asyncio.ensure_future(response)
+        return response
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# ประเภท event ที่ CSMS publish
+EVENT_TYPES = ("status", "session.start", "session.stop", "meter")
+
+
+class Subscription:
+    """
+    One consumer of the bus with its own filters and a bounded buffer.
+
+    Publishing never waits for a consumer: when the buffer is full the
+    subscription is closed with ``reason="overflow"`` and removed from the bus,
+    so one slow client cannot hold memory or slow the handlers down.
+    """
+
+    def __init__(
+        self,
+        bus: "EventBus",
+        cpids: Optional[Set[str]] = None,
+        types: Optional[Set[str]] = None,
+        maxsize: int = 1000,
+    ):
+        self._bus = bus
+        self.cpids = cpids or None
+        self.types = types or None
+        self.maxsize = maxsize
+        self._items: deque = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.reason: Optional[str] = None
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.types is not None and event["type"] not in self.types:
+            return False
+        if self.cpids is not None and event["cpid"] not in self.cpids:
+            return False
+        return True
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        if len(self._items) >= self.maxsize:
+            self.close("overflow")
+            return
+        self._items.append(event)
+        self._ready.set()
+
+    def close(self, reason: str = "closed") -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.reason = reason
+        self._bus.unsubscribe(self)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event; None on timeout or once the subscription is closed and drained."""
+        while not self._items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._items.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class EventBus:
+    """In-process pub/sub for charger/session events (synchronous publish)."""
+
+    def __init__(self, buffer_size: int = 1000):
+        self.buffer_size = buffer_size
+        self.subscribers: List[Subscription] = []
+        self._seq = 0
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(
+        self,
+        cpids: Optional[Iterable[str]] = None,
+        types: Optional[Iterable[str]] = None,
+        maxsize: Optional[int] = None,
+    ) -> Subscription:
+        sub = Subscription(
+            self,
+            set(cpids) if cpids else None,
+            set(types) if types else None,
+            maxsize or self.buffer_size,
+        )
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        try:
+            self.subscribers.remove(sub)
+        except ValueError:
+            return
+        if sub.reason == "overflow":
+            self.overflows += 1
+
+    def publish(self, type: str, cpid: str, data: Dict[str, Any]) -> None:
+        if not self.subscribers:
+            return
+        self._seq += 1
+        self.published += 1
+        event = {"id": self._seq, "type": type, "cpid": cpid, "ts": time.time(), "data": data}
+        for sub in list(self.subscribers):
+            if sub.matches(event):
+                sub.deliver(event)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from csms.timers import Timer, TimerWheel
+
+log = logging.getLogger("csms.liveness")
+
+
+class Probe:
+    """Ping/pong of one connection; see ``Liveness``."""
+
+    __slots__ = ("ws", "cpid", "interval", "_liveness", "_timer", "_sent_at", "closed", "rtt")
+
+    def __init__(self, liveness: "Liveness", ws: Any, cpid: str, interval: float):
+        self.ws = ws
+        self.cpid = cpid
+        self.interval = interval
+        self._liveness = liveness
+        self._timer: Optional[Timer] = None
+        self._sent_at = 0.0
+        self.closed = False
+        self.rtt: Optional[float] = None  # วินาที, ของ pong ล่าสุด
+
+    def set_interval(self, interval: float) -> None:
+        """Per-charger interval (e.g. the charger's WebSocketPingInterval); applies from the next ping."""
+        if interval > 0 and interval != self.interval:
+            self.interval = interval
+            if self._timer is not None and self._timer.cancel():
+                self._arm()
+
+    def stop(self) -> None:
+        self.closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self) -> None:
+        if not self.closed and self.interval > 0:
+            self._timer = self._liveness.timers.schedule(self.interval, self._due)
+
+    def _due(self) -> None:
+        self._timer = None
+        if not self.closed:
+            asyncio.ensure_future(self._ping())
+
+    async def _ping(self) -> None:
+        try:
+            self._sent_at = time.monotonic()
+            waiter = await self.ws.ping()
+        except Exception:
+            return  # กำลังปิดอยู่แล้ว
+        self._liveness.pings += 1
+        deadline = self._liveness.timers.schedule(self._liveness.timeout, self._timeout)
+        waiter.add_done_callback(lambda f: self._pong(f, deadline))
+
+    def _pong(self, waiter: "asyncio.Future[Any]", deadline: Timer) -> None:
+        deadline.cancel()
+        if waiter.cancelled() or waiter.exception() is not None or self.closed:
+            return
+        self.rtt = time.monotonic() - self._sent_at
+        self._arm()
+
+    def _timeout(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._liveness.timeouts += 1
+        log.warning(
+            "No pong from %s within %ss: closing half-open connection", self.cpid, self._liveness.timeout,
+            extra={"cpid": self.cpid, "action": "ping"},
+        )
+        # เหมือน keepalive ของ websockets: ไม่รอ closing handshake กับ socket ที่ไม่ตอบ
+        self.ws.fail_connection(1011, "ping timeout")
+
+
+class Liveness:
+    """
+    Server-side WebSocket ping/pong for every connection, driven by the
+    shared timer wheel instead of websockets' keepalive task per connection.
+    Each connection is pinged every ``interval`` seconds (tunable per
+    charger, e.g. to its ``WebSocketPingInterval``); a pong that does not
+    arrive within ``timeout`` fails the connection, so half-open sockets are
+    reaped after at most ``interval + timeout``.
+    """
+
+    def __init__(self, timers: TimerWheel, interval: float = 20.0, timeout: float = 10.0):
+        self.timers = timers
+        self.interval = interval
+        self.timeout = timeout
+        self.pings = 0
+        self.timeouts = 0
+
+    def watch(self, ws: Any, cpid: str, interval: Optional[float] = None) -> Probe:
+        probe = Probe(self, ws, cpid, interval or self.interval)
+        probe._arm()
+        return probe
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# column order of one parsed sample
+COLUMNS = ("ts", "cpid", "connector_id", "transaction_id", "measurand", "phase", "unit", "value")
+Sample = Tuple[float, str, int, Optional[int], str, Optional[str], str, float]
+
+# ค่า default ตาม OCPP 1.6 เมื่อ sampledValue ไม่ระบุ measurand/unit
+DEFAULT_MEASURAND = "Energy.Active.Import.Register"
+DEFAULT_UNIT = "Wh"
+
+
+def parse_timestamp(ts: Any) -> float:
+    """ISO-8601 timestamp (with or without 'Z') -> epoch seconds."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if not ts:
+        return time.time()
+    s = str(ts)
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(s).timestamp()
+    except ValueError:
+        return time.time()
+
+
+def parse_meter_values(
+    cpid: str,
+    connector_id: int,
+    meter_value: Sequence[Dict[str, Any]],
+    transaction_id: Optional[int] = None,
+) -> List[Sample]:
+    """
+    Flatten the (snake_case) ``meter_value`` list of a MeterValues /
+    StopTransaction payload into sample tuples. Values that are not numeric
+    (e.g. signed data) are skipped.
+    """
+    samples: List[Sample] = []
+    c_id = int(connector_id)
+    tx_id = int(transaction_id) if transaction_id is not None else None
+    for mv in meter_value or ():
+        ts = parse_timestamp(mv.get("timestamp"))
+        for sv in mv.get("sampled_value") or ():
+            try:
+                value = float(sv["value"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            samples.append(
+                (
+                    ts,
+                    cpid,
+                    c_id,
+                    tx_id,
+                    sv.get("measurand") or DEFAULT_MEASURAND,
+                    sv.get("phase"),
+                    sv.get("unit") or DEFAULT_UNIT,
+                    value,
+                )
+            )
+    return samples
+
+
+class SQLiteMeterSink:
+    """Append batches into a local SQLite table (WAL, one transaction per batch)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # ถูกเรียกจาก thread ของ asyncio.to_thread ทีละ batch เท่านั้น
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meter_samples ("
+            "ts REAL NOT NULL, cpid TEXT NOT NULL, connector_id INTEGER NOT NULL, "
+            "transaction_id INTEGER, measurand TEXT NOT NULL, phase TEXT, unit TEXT, value REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS meter_samples_series "
+            "ON meter_samples (cpid, connector_id, measurand, ts)"
+        )
+        self._db.commit()
+
+    def write(self, columns: Dict[str, list]) -> None:
+        rows = zip(*(columns[c] for c in COLUMNS))
+        with self._db:
+            self._db.executemany(
+                f"INSERT INTO meter_samples ({','.join(COLUMNS)}) VALUES ({','.join('?' * len(COLUMNS))})",
+                rows,
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class JsonlMeterSink:
+    """Append-only file, one JSON object of columns per batch."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def write(self, columns: Dict[str, list]) -> None:
+        self._fh.write(json.dumps(columns, separators=(",", ":")) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def build_meter_sink(kind: str, path: str):
+    """kind: sqlite | jsonl | none"""
+    if kind == "sqlite":
+        return SQLiteMeterSink(path)
+    if kind == "jsonl":
+        return JsonlMeterSink(path)
+    return None
+
+
+class MeterIngestor:
+    """
+    Bounded buffer between the MeterValues handler and storage.
+
+    ``offer()`` is synchronous and O(samples): the handler never waits for
+    I/O. When the buffer is full new samples are rejected and counted in
+    ``dropped`` (explicit backpressure instead of unbounded memory growth).
+    A background task drains the buffer when ``batch_size`` samples are
+    waiting or every ``flush_interval`` seconds, transposes the batch into
+    columns and writes it from a worker thread. ``stop()`` lets the task
+    finish the batch it is writing and drain the rest before the sink is
+    closed.
+    """
+
+    def __init__(self, max_queue: int = 100_000, batch_size: int = 5_000, flush_interval: float = 1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sink = None
+        self._buf: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # counters
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+
+    def offer(self, samples: Sequence[Sample]) -> int:
+        """Queue samples; returns how many were accepted."""
+        room = self.max_queue - len(self._buf)
+        if room <= 0:
+            self.dropped += len(samples)
+            return 0
+        if len(samples) > room:
+            self.dropped += len(samples) - room
+            samples = samples[:room]
+        self._buf.extend(samples)
+        self.accepted += len(samples)
+        if self._wakeup is not None and len(self._buf) >= self.batch_size:
+            self._wakeup.set()
+        return len(samples)
+
+    async def start(self, sink) -> None:
+        self.sink = sink
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # ไม่ cancel: batch ที่กำลังเขียนใน thread ต้องเขียนจบก่อน แล้ว task เขียนที่เหลือจนหมดเอง
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._buf:
+            await self.flush()
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buf:
+                await self.flush()
+                if len(self._buf) < self.batch_size and not self._stopping:
+                    break
+
+    def _take_batch(self) -> Dict[str, list]:
+        n = min(len(self._buf), self.batch_size)
+        popleft = self._buf.popleft
+        batch = [popleft() for _ in range(n)]
+        return {name: list(col) for name, col in zip(COLUMNS, zip(*batch))}
+
+    async def flush(self) -> int:
+        if not self._buf:
+            return 0
+        columns = self._take_batch()
+        n = len(columns["ts"])
+        if self.sink is None:
+            self.written += n
+            return n
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.sink.write, columns)
+        except Exception:
+            self.write_errors += n
+            logging.exception("Failed to write %s meter samples", n)
+            return 0
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000
+        self.written += n
+        self.batches += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._buf),
+            "maxQueue": self.max_queue,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "writeErrors": self.write_errors,
+            "batches": self.batches,
+            "lastFlushMs": round(self.last_flush_ms, 3),
+        }
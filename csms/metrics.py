@@ -0,0 +1,231 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition format 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds: 0.5 ms .. 30 s (handler ส่วนใหญ่ < 10 ms, outbound call รอได้ถึง 30 s)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class _Metric:
+    """
+    Base of the metric families. Children are created once per label-value
+    tuple and cached, so the hot path is a dict lookup plus a plain ``+=``:
+    all updates happen on the event-loop thread, no locks needed.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any):
+        try:
+            # fast path: label values ที่เป็น str และเคยเห็นแล้ว
+            return self._children[values]
+        except KeyError:
+            pass
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _Scalar(_Metric):
+    """
+    Counter/gauge: one number per child, set on the hot path or computed at
+    scrape time by ``set_function``.
+    """
+
+    suffix = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._fn: Optional[Callable[[], Any]] = None
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def set_function(self, fn: Callable[[], Any]) -> None:
+        """
+        ``fn()`` returns a number, or a dict {label-values tuple: number} for a
+        labelled metric. Nothing is tracked on the hot path.
+        """
+        self._fn = fn
+
+    def samples(self) -> List[Sample]:
+        if self._fn is not None:
+            value = self._fn()
+            if isinstance(value, dict):
+                return [(self.suffix, self._label_dict(tuple(str(v) for v in k)), float(v)) for k, v in value.items()]
+            return [(self.suffix, {}, float(value))]
+        return [(self.suffix, self._label_dict(k), c.value) for k, c in self._children.items()]
+
+
+class Counter(_Scalar):
+    """Counter; with ``set_function`` the function must never go down (e.g. a ``+= 1`` attribute)."""
+
+    type = "counter"
+    suffix = "_total"
+
+
+class Gauge(_Scalar):
+    """Gauge set directly or computed at scrape time by ``set_function``."""
+
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # counts[i] = observations in (bounds[i-1], bounds[i]]; last = +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        for key, child in self._children.items():
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets, child.counts):
+                cumulative += n
+                out.append(("_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            cumulative += child.counts[-1]
+            out.append(("_bucket", dict(labels, le="+Inf"), cumulative))
+            out.append(("_sum", labels, child.sum))
+            out.append(("_count", labels, cumulative))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """JSON-serialisable snapshot (also what workers exchange)."""
+        return [
+            {"name": m.name, "type": m.type, "help": m.help, "samples": m.samples()}
+            for m in self._metrics.values()
+        ]
+
+
+def merge_families(snapshots: Dict[str, List[Dict[str, Any]]], label: str = "worker") -> List[Dict[str, Any]]:
+    """
+    Merge ``collect()`` snapshots of several processes into one family list,
+    tagging every sample with ``label`` = the snapshot's key.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for source, families in snapshots.items():
+        for fam in families:
+            into = merged.setdefault(fam["name"], {**fam, "samples": []})
+            into["samples"].extend((s, dict(l, **{label: source}), v) for s, l, v in fam["samples"])
+    return list(merged.values())
+
+
+def render(families: List[Dict[str, Any]]) -> str:
+    lines: List[str] = []
+    for fam in families:
+        lines.append(f"# HELP {fam['name']} {_escape_help(fam['help'])}")
+        lines.append(f"# TYPE {fam['name']} {fam['type']}")
+        for suffix, labels, value in fam["samples"]:
+            if labels:
+                lbl = ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in labels.items())
+                lines.append(f"{fam['name']}{suffix}{{{lbl}}} {_format_value(value)}")
+            else:
+                lines.append(f"{fam['name']}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape_help(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
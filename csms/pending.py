@@ -0,0 +1,105 @@
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from csms.timers import Timer, TimerWheel
+
+# ผลของ remote start แต่ละครั้ง (label ของ counter ocpp_remote_starts)
+OUTCOMES = ("completed", "expired", "mismatch", "rejected", "released", "replaced", "evicted", "disconnected")
+
+
+class PendingStart:
+    __slots__ = ("connector_id", "id_tag", "vid", "accepted", "created", "timer")
+
+    def __init__(self, connector_id: int, id_tag: str, vid: Optional[str], created: float):
+        self.connector_id = connector_id
+        self.id_tag = id_tag
+        self.vid = vid
+        self.accepted = False  # RemoteStartTransaction ได้ Accepted แล้ว: StartTransaction ต้องใช้ idTag นี้
+        self.created = created
+        self.timer: Optional[Timer] = None
+
+
+class PendingStarts:
+    """
+    Remote starts of one charger waiting for its StartTransaction, per
+    connector. Every entry expires ``ttl`` seconds after the RemoteStart
+    (a timer on the shared wheel), so a charger that accepts and then never
+    starts does not keep an idTag expectation that would reject the next,
+    legitimate session. At most ``max_entries`` are kept; the oldest goes
+    first. Each entry ends with one outcome from ``OUTCOMES``, reported to
+    ``on_outcome`` (the metrics counter).
+    """
+
+    def __init__(
+        self,
+        timers: TimerWheel,
+        ttl: float,
+        max_entries: int = 64,
+        on_outcome: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._timers = timers
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._on_outcome = on_outcome
+        self._clock = clock
+        self._entries: Dict[int, PendingStart] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, connector_id: int) -> bool:
+        return connector_id in self._entries
+
+    def __iter__(self) -> Iterator[PendingStart]:
+        return iter(list(self._entries.values()))
+
+    def get(self, connector_id: int) -> Optional[PendingStart]:
+        return self._entries.get(connector_id)
+
+    def expect(self, connector_id: int, id_tag: str, vid: Optional[str] = None) -> PendingStart:
+        """A RemoteStart is about to be sent: remember idTag/vid until StartTransaction (or expiry)."""
+        if connector_id in self._entries:
+            self.finish(connector_id, "replaced")
+        while len(self._entries) >= self.max_entries:
+            self.finish(next(iter(self._entries)), "evicted")
+        entry = PendingStart(connector_id, id_tag, vid, self._clock())
+        entry.timer = self._timers.schedule(self.ttl, self._expire, entry)
+        self._entries[connector_id] = entry
+        return entry
+
+    def accept(self, connector_id: int, id_tag: str) -> PendingStart:
+        """The charger accepted RemoteStartTransaction; the TTL restarts from now."""
+        entry = self._entries.get(connector_id)
+        if entry is None or entry.id_tag != id_tag:
+            entry = self.expect(connector_id, id_tag)
+        else:
+            entry.timer.cancel()
+            entry.timer = self._timers.schedule(self.ttl, self._expire, entry)
+        entry.accepted = True
+        return entry
+
+    def expected_id_tag(self, connector_id: int) -> Optional[str]:
+        """idTag a StartTransaction on this connector must carry, or None when anything goes."""
+        entry = self._entries.get(connector_id)
+        return entry.id_tag if entry is not None and entry.accepted else None
+
+    def finish(self, connector_id: int, outcome: str) -> Optional[PendingStart]:
+        """Remove the connector's entry (if any) and count ``outcome``."""
+        entry = self._entries.pop(connector_id, None)
+        if entry is None:
+            return None
+        if entry.timer is not None:
+            entry.timer.cancel()
+        if self._on_outcome is not None:
+            self._on_outcome(outcome)
+        return entry
+
+    def clear(self, outcome: str) -> None:
+        for connector_id in list(self._entries):
+            self.finish(connector_id, outcome)
+
+    def _expire(self, entry: PendingStart) -> None:
+        if self._entries.get(entry.connector_id) is entry:
+            entry.timer = None
+            self.finish(entry.connector_id, "expired")
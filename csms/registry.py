@@ -0,0 +1,312 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, MutableMapping, Optional, Set
+
+# dispatch(op, body) -> JSON-serialisable result (or an async iterator of them
+# for streaming ops); may raise an exception that carries
+# ``status_code``/``detail`` (e.g. fastapi.HTTPException)
+Dispatch = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class RemoteCallError(Exception):
+    """Error returned by the worker that owns a charge point."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SessionRegistry(dict):
+    """
+    Registry of connected charge points: cpid -> CentralSystem.
+
+    Behaves like the old module-global ``connected_cps`` dict. In worker mode
+    (see ``share()``) every worker keeps only its own connections locally and
+    records ownership in a map shared by all workers, so a request that lands
+    on one worker can be forwarded to the worker holding the WebSocket.
+    Lookups use a local copy of the other workers' entries that is kept up
+    to date over the worker RPC channel, so only connect/disconnect touch the
+    shared map, and they do it off the event loop.
+
+    A charger that reconnects to another worker is taken over: the new
+    worker sends ``evict`` to the worker the map named (``claim`` to the
+    rest), and every worker hands the charger to ``on_evict(cpid, cp)``,
+    where ``cp`` is its stale connection or None when it was no longer
+    connected there, so state kept for a reconnect can be dropped too.
+    """
+
+    # ops ที่ registry ตอบเอง (ไม่ส่งต่อให้ dispatch)
+    OWNER_OPS = ("claim", "evict", "release")
+
+    def __init__(self):
+        super().__init__()
+        self.worker_id = 0
+        self.workers = 1
+        self._owners: Optional[MutableMapping[str, int]] = None
+        self._rpc_host = "127.0.0.1"
+        self._rpc_base_port = 0
+        self._rpc_timeout = 35.0
+        # cpid -> worker ของตู้ที่ต่อกับ worker อื่น (สำเนาของ owners)
+        self._remote: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # cpid -> เวลาที่ตู้ต่อเข้ามาที่ worker นี้ (claim ที่เก่ากว่าไม่ไล่การเชื่อมต่อนี้ออก)
+        self._since: Dict[str, float] = {}
+        # เรียกเมื่อตู้ที่ต่ออยู่ที่นี่ไปต่อใหม่ที่ worker อื่น: ปิดการเชื่อมต่อเก่า
+        self.on_evict: Optional[Callable[[str, Any], None]] = None
+
+    # ----- worker mode -----
+    def share(
+        self,
+        worker_id: int,
+        workers: int,
+        owners: MutableMapping[str, int],
+        rpc_host: str,
+        rpc_base_port: int,
+        rpc_timeout: float = 35.0,
+    ) -> None:
+        """
+        Switch to worker mode. ``owners`` is a mapping shared between
+        processes (e.g. ``multiprocessing.Manager().dict()``); its accesses
+        are blocking IPC, so it is only written on connect/disconnect, in the
+        default executor, and read once by ``serve_rpc`` to seed the cache.
+        """
+        self.worker_id = worker_id
+        self.workers = workers
+        self._owners = owners
+        self._rpc_host = rpc_host
+        self._rpc_base_port = rpc_base_port
+        self._rpc_timeout = rpc_timeout
+
+    @property
+    def shared(self) -> bool:
+        return self._owners is not None
+
+    def rpc_port(self, worker_id: int) -> int:
+        return self._rpc_base_port + worker_id
+
+    def __setitem__(self, cpid: str, cp: Any) -> None:
+        super().__setitem__(cpid, cp)
+        if self._owners is not None:
+            self._remote.pop(cpid, None)
+            self._since[cpid] = time.time()
+            self._update_owner(self._claim_owner, cpid, "claim")
+
+    def pop(self, cpid: str, *default: Any) -> Any:
+        cp = super().pop(cpid, *default)
+        if self._owners is not None:
+            self._since.pop(cpid, None)
+            self._update_owner(self._release_owner, cpid, "release")
+        return cp
+
+    # ----- shared owners map (blocking IPC: run in the executor) -----
+    def _claim_owner(self, cpid: str) -> Optional[int]:
+        """Take ``cpid``; returns the worker that had it."""
+        previous = self._owners.get(cpid)
+        self._owners[cpid] = self.worker_id
+        return previous
+
+    def _release_owner(self, cpid: str) -> bool:
+        try:
+            # ตู้อาจต่อใหม่ไปที่ worker อื่นแล้ว: ลบเฉพาะเมื่อยังเป็นของ worker นี้
+            if self._owners.get(cpid) == self.worker_id:
+                del self._owners[cpid]
+                return True
+        except KeyError:
+            pass
+        return False
+
+    def _update_owner(self, write: Callable[[str], Any], cpid: str, op: str) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            write(cpid)  # ไม่มี event loop (console/ทดสอบ): เขียนตรง ๆ
+            return
+        task = loop.create_task(self._publish_owner(write, cpid, op))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish_owner(self, write: Callable[[str], Any], cpid: str, op: str) -> None:
+        body = {"cpid": cpid, "worker": self.worker_id, "at": self._since.get(cpid)}
+        result = await asyncio.get_running_loop().run_in_executor(None, write, cpid)
+        if result is False:
+            return  # release ของตู้ที่ไม่ใช่ของ worker นี้แล้ว
+        others = [w for w in range(self.workers) if w != self.worker_id]
+        # claim: worker ที่เคยถือตู้นี้ต้องปิดการเชื่อมต่อเก่า
+        ops = ["evict" if op == "claim" and w == result else op for w in others]
+        results = await asyncio.gather(*(self._rpc(w, o, body) for w, o in zip(others, ops)), return_exceptions=True)
+        for w, o, res in zip(others, ops, results):
+            if isinstance(res, Exception):
+                logging.warning("Worker %s did not take '%s' of %s: %s", w, o, cpid, res)
+
+    def _owner_changed(self, op: str, body: Dict[str, Any]) -> Any:
+        """Another worker took (``claim``/``evict``) or let go of (``release``) a charger."""
+        cpid, worker = body["cpid"], body["worker"]
+        if op == "release":
+            if self._remote.get(cpid) == worker:
+                del self._remote[cpid]
+            return None
+        cp = self.get(cpid)
+        if cp is not None and self._since.get(cpid, 0.0) > (body.get("at") or 0.0):
+            # ตู้ต่อกลับมาที่นี่หลัง claim นั้นแล้ว: การเชื่อมต่อนี้ใหม่กว่า
+            return {"evicted": False}
+        self._remote[cpid] = worker
+        if cp is not None:
+            # ไม่แตะ owners: ตอนนี้เป็นของ worker ที่ claim แล้ว
+            super().pop(cpid, None)
+            self._since.pop(cpid, None)
+        # ไม่มีการเชื่อมต่อที่นี่แล้วก็ยังต้องแจ้ง: อาจมีสถานะที่รอตู้กลับมา (grace) ค้างอยู่
+        if self.on_evict is not None:
+            self.on_evict(cpid, cp)
+        return {"evicted": cp is not None}
+
+    async def wait_owner_updates(self) -> None:
+        """Wait until connects/disconnects so far are in the shared map and known to the other workers."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def discard(self, cpid: str, cp: Any) -> bool:
+        """Remove ``cpid`` only while it still maps to ``cp`` (a newer connection may have replaced it)."""
+        if self.get(cpid) is not cp:
+            return False
+        self.pop(cpid, None)
+        return True
+
+    def owner(self, cpid: str) -> Optional[int]:
+        if cpid in self:
+            return self.worker_id
+        return self._remote.get(cpid)
+
+    def is_remote(self, cpid: str) -> bool:
+        """True when the charger is connected to another worker."""
+        return cpid not in self and cpid in self._remote
+
+    def fleet_size(self) -> int:
+        """Chargers connected to any worker."""
+        return len(self) + len(self._remote)
+
+    def all_cpids(self) -> List[str]:
+        return list(self.keys()) + [c for c in self._remote if c not in self]
+
+    # ----- cross-worker RPC (one JSON line per request/response) -----
+    async def serve_rpc(self, dispatch: Dispatch) -> asyncio.AbstractServer:
+        async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                line = await reader.readline()
+                if not line:
+                    return
+                req = json.loads(line)
+                try:
+                    if req["op"] in self.OWNER_OPS:
+                        result = self._owner_changed(req["op"], req.get("body") or {})
+                    else:
+                        result = await dispatch(req["op"], req.get("body") or {})
+                    reply = {"ok": True, "result": result}
+                except Exception as e:
+                    result = None
+                    reply = {
+                        "ok": False,
+                        "status": getattr(e, "status_code", 500),
+                        "detail": str(getattr(e, "detail", e)),
+                    }
+                if hasattr(result, "__aiter__"):
+                    # streaming op: header line แล้วตามด้วย 1 บรรทัดต่อ item จนกว่าอีกฝั่งจะปิด
+                    writer.write(json.dumps({"ok": True, "stream": True}).encode() + b"\n")
+                    await writer.drain()
+                    try:
+                        async for item in result:
+                            writer.write(json.dumps(item).encode() + b"\n")
+                            await writer.drain()
+                    finally:
+                        await result.aclose()
+                    return
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass
+            except Exception:
+                logging.exception("Worker RPC request failed")
+            finally:
+                writer.close()
+
+        if self._owners is not None:
+            # ตู้ที่ต่อกับ worker อื่นอยู่ก่อนแล้ว (เช่น worker นี้เพิ่ง restart): อ่าน owners ครั้งเดียว
+            snapshot = await asyncio.get_running_loop().run_in_executor(None, self._owners.copy)
+            for cpid, worker in snapshot.items():
+                if worker != self.worker_id and cpid not in self:
+                    self._remote.setdefault(cpid, worker)
+        port = self.rpc_port(self.worker_id)
+        server = await asyncio.start_server(on_client, self._rpc_host, port)
+        logging.info("Worker %s RPC listening on %s:%s", self.worker_id, self._rpc_host, port)
+        return server
+
+    async def _rpc(self, worker_id: int, op: str, body: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        async def roundtrip():
+            reader, writer = await asyncio.open_connection(self._rpc_host, self.rpc_port(worker_id))
+            try:
+                writer.write(json.dumps({"op": op, "body": body}).encode() + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+            finally:
+                writer.close()
+            if not line:
+                raise RemoteCallError(502, f"worker {worker_id} closed the connection")
+            return json.loads(line)
+
+        try:
+            reply = await asyncio.wait_for(roundtrip(), timeout or self._rpc_timeout)
+        except asyncio.TimeoutError:
+            raise RemoteCallError(504, f"worker {worker_id} did not answer '{op}'")
+        except OSError as e:
+            raise RemoteCallError(502, f"worker {worker_id} unreachable: {e}")
+        if not reply.get("ok"):
+            raise RemoteCallError(reply.get("status", 500), reply.get("detail", ""))
+        return reply.get("result")
+
+    async def stream(self, worker_id: int, op: str, body: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Items of a streaming ``op`` on another worker, until either side closes."""
+        try:
+            reader, writer = await asyncio.open_connection(self._rpc_host, self.rpc_port(worker_id))
+        except OSError as e:
+            raise RemoteCallError(502, f"worker {worker_id} unreachable: {e}")
+        try:
+            writer.write(json.dumps({"op": op, "body": body}).encode() + b"\n")
+            await writer.drain()
+            head = json.loads(await reader.readline() or b"{}")
+            if not head.get("ok"):
+                raise RemoteCallError(head.get("status", 502), head.get("detail", ""))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                yield json.loads(line)
+        finally:
+            writer.close()
+
+    async def forward(self, cpid: str, op: str, body: Dict[str, Any]) -> Any:
+        """Run ``op`` on the worker that owns ``cpid``."""
+        owner = self.owner(cpid)
+        if owner is None or owner == self.worker_id:
+            raise RemoteCallError(404, f"ChargePoint '{cpid}' not connected")
+        return await self._rpc(owner, op, body)
+
+    async def gather(self, op: str, body: Dict[str, Any], timeout: Optional[float] = None) -> List[Any]:
+        """
+        Run ``op`` on every other worker and return the successful results
+        (``timeout`` overrides the RPC timeout for long-running ops).
+        """
+        if self._owners is None:
+            return []
+        others = [w for w in range(self.workers) if w != self.worker_id]
+        results = await asyncio.gather(
+            *(self._rpc(w, op, body, timeout) for w in others), return_exceptions=True
+        )
+        out = []
+        for w, res in zip(others, results):
+            if isinstance(res, Exception):
+                logging.warning("Worker %s failed '%s': %s", w, op, res)
+                continue
+            out.append(res)
+        return out
@@ -0,0 +1,149 @@
+from bisect import bisect_right, insort
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SessionIndex:
+    """
+    Fleet-wide indexes of open sessions, maintained on
+    StartTransaction/StopTransaction and on charger connect/disconnect.
+
+    Each session is kept as the dict served by ``/api/v1/active``
+    (``cpid``/``connectorId``/``idTag``/``transactionId``), built once when the
+    session opens, so lookups and listings never rebuild it.
+
+    ``version`` grows by one on every change and the last ``change_log``
+    changes are kept, so pollers can ask for what happened since the
+    version they last saw instead of re-reading the whole list.
+    """
+
+    def __init__(self, change_log: int = 10_000):
+        # transactionId -> session
+        self.by_tx: Dict[int, Dict[str, Any]] = {}
+        # idTag -> {transactionId: session}
+        self.by_tag: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        # cpid -> {connectorId: session}
+        self.by_cp: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        # transactionIds in ascending order, for cursor paging
+        self._order: List[int] = []
+        self.version = 0
+        # (version, opened?, session)
+        self._changes: deque = deque(maxlen=change_log)
+
+    def _record(self, opened: bool, session: Dict[str, Any]) -> None:
+        self.version += 1
+        self._changes.append((self.version, opened, session))
+
+    def __len__(self) -> int:
+        return len(self.by_tx)
+
+    def add(self, cpid: str, connector_id: int, info: Dict[str, Any]) -> Dict[str, Any]:
+        tx_id = int(info.get("transaction_id", 0))
+        connector_id = int(connector_id)
+        previous = self.by_cp.get(cpid, {}).get(connector_id)
+        if previous is not None:
+            self.remove(previous["transactionId"])
+        elif tx_id in self.by_tx:
+            self.remove(tx_id)
+        session = {
+            "cpid": cpid,
+            "connectorId": connector_id,
+            "idTag": info.get("id_tag") or "",
+            "transactionId": tx_id,
+        }
+        self.by_tx[tx_id] = session
+        self.by_tag.setdefault(session["idTag"], {})[tx_id] = session
+        self.by_cp.setdefault(cpid, {})[connector_id] = session
+        if not self._order or tx_id > self._order[-1]:
+            self._order.append(tx_id)
+        else:
+            insort(self._order, tx_id)
+        self._record(True, session)
+        return session
+
+    def remove(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        session = self.by_tx.pop(int(transaction_id), None)
+        if session is None:
+            return None
+        tx_id = session["transactionId"]
+        tagged = self.by_tag.get(session["idTag"])
+        if tagged is not None:
+            tagged.pop(tx_id, None)
+            if not tagged:
+                del self.by_tag[session["idTag"]]
+        by_conn = self.by_cp.get(session["cpid"])
+        if by_conn is not None and by_conn.get(session["connectorId"]) is session:
+            del by_conn[session["connectorId"]]
+            if not by_conn:
+                del self.by_cp[session["cpid"]]
+        i = bisect_right(self._order, tx_id) - 1
+        if i >= 0 and self._order[i] == tx_id:
+            del self._order[i]
+        self._record(False, session)
+        return session
+
+    def drop_cp(self, cpid: str) -> List[Dict[str, Any]]:
+        """Forget every session of a charger (e.g. when it disconnects)."""
+        sessions = list(self.by_cp.get(cpid, {}).values())
+        for session in sessions:
+            self.remove(session["transactionId"])
+        return sessions
+
+    def get_tx(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_tx.get(int(transaction_id))
+
+    def for_tag(self, id_tag: str, cpid: Optional[str] = None) -> List[Dict[str, Any]]:
+        sessions = self.by_tag.get(id_tag)
+        if not sessions:
+            return []
+        if cpid is None:
+            return list(sessions.values())
+        return [s for s in sessions.values() if s["cpid"] == cpid]
+
+    def for_cp(self, cpid: str) -> List[Dict[str, Any]]:
+        return list(self.by_cp.get(cpid, {}).values())
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        by_tx = self.by_tx
+        return [by_tx[tx_id] for tx_id in self._order]
+
+    def page(self, cursor: Optional[int] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Sessions with transactionId > ``cursor`` in ascending order, at most
+        ``limit`` of them, plus the cursor of the next page (None at the end).
+        """
+        start = bisect_right(self._order, cursor) if cursor is not None else 0
+        end = len(self._order) if limit is None else min(len(self._order), start + max(0, limit))
+        by_tx = self.by_tx
+        page = [by_tx[tx_id] for tx_id in self._order[start:end]]
+        next_cursor = self._order[end - 1] if end < len(self._order) and end > start else None
+        return page, next_cursor
+
+    def changes_since(self, version: int) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        (opened, closed) sessions after ``version``; a session opened and
+        closed within the window is left out of both. Returns None when
+        ``version`` is older than the retained change log (full resync needed)
+        or from the future (e.g. the server restarted).
+        """
+        if version > self.version:
+            return None
+        if version < self.version and (not self._changes or self._changes[0][0] > version + 1):
+            return None
+        events = []
+        for v, is_open, session in reversed(self._changes):
+            if v <= version:
+                break
+            events.append((is_open, session))
+        # tx -> [มีอยู่ก่อน version?, ยังเปิดอยู่ตอนนี้?, session ล่าสุด]
+        state: Dict[int, list] = {}
+        for is_open, session in reversed(events):
+            st = state.get(session["transactionId"])
+            if st is None:
+                state[session["transactionId"]] = [not is_open, is_open, session]
+            else:
+                st[1] = is_open
+                st[2] = session
+        opened = [s for _, now, s in state.values() if now]
+        closed = [s for before, now, s in state.values() if before and not now]
+        return opened, closed
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("csms.timers")
+
+
+class Timer:
+    """Handle returned by ``TimerWheel.schedule``; ``cancel()`` is O(1) and idempotent."""
+
+    __slots__ = ("due", "callback", "args", "_wheel")
+
+    def __init__(self, due: int, callback: Callable[..., Any], args: tuple, wheel: "TimerWheel"):
+        self.due = due  # tick number at which it fires
+        self.callback = callback
+        self.args = args
+        self._wheel: Optional[TimerWheel] = wheel
+
+    @property
+    def active(self) -> bool:
+        return self._wheel is not None
+
+    def cancel(self) -> bool:
+        """False when the timer already fired or was cancelled."""
+        wheel, self._wheel = self._wheel, None
+        if wheel is None:
+            return False
+        wheel._remove(self)
+        wheel.cancelled += 1
+        return True
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel shared by every connection of a process: timers go
+    into ``slots`` buckets by the tick they are due on, so arming and
+    cancelling are a dict insert/delete, and one driver task wakes once per
+    ``tick`` seconds (only while timers are armed) instead of one sleeping
+    task per timer. Timers further away than one revolution stay in their
+    bucket until their round comes. Resolution is ``tick``: a timer fires
+    at most one tick late, never early.
+
+    Callbacks run on the event loop and must not block; async work is
+    started from the callback with ``asyncio.create_task``.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self._clock = clock
+        self._origin = clock()
+        self._slots: List[Dict[Timer, None]] = [{} for _ in range(slots)]
+        self._now = int((clock() - self._origin) / tick)  # last tick processed
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._armed: Optional[asyncio.Event] = None
+        self.fired = 0
+        self.cancelled = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """Run ``callback(*args)`` once, ``delay`` seconds from now."""
+        due = max(self._now + 1, math.ceil((self._clock() + delay - self._origin) / self.tick))
+        timer = Timer(due, callback, args, self)
+        self._slots[due % len(self._slots)][timer] = None
+        self._count += 1
+        self._ensure_running()
+        return timer
+
+    def _remove(self, timer: Timer) -> None:
+        self._slots[timer.due % len(self._slots)].pop(timer, None)
+        self._count -= 1
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Fire every timer due up to ``now``; returns how many fired. Called by the driver task."""
+        target = int(((self._clock() if now is None else now) - self._origin) / self.tick)
+        if target <= self._now:
+            return 0
+        n = len(self._slots)
+        # loop ค้างนานกว่าหนึ่งรอบ: ดูทุก bucket ครั้งเดียวพอ
+        ticks = range(self._now + 1, target + 1) if target - self._now < n else range(target - n + 1, target + 1)
+        self._now = target
+        fired = 0
+        for t in ticks:
+            bucket = self._slots[t % n]
+            if not bucket:
+                continue
+            due = [timer for timer in bucket if timer.due <= target]
+            for timer in due:
+                if timer._wheel is None:
+                    continue  # ถูก cancel โดย callback ก่อนหน้าในรอบนี้
+                timer._wheel = None
+                self._remove(timer)
+                fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    log.exception("timer callback %r failed", timer.callback)
+        self.fired += fired
+        return fired
+
+    def _ensure_running(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # ยังไม่มี loop: driver เริ่มเมื่อ schedule ครั้งถัดไปใน loop
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._armed = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._armed.set()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._count:
+                self._armed.clear()
+                await self._armed.wait()
+            # ตื่นตรงขอบ tick ถัดไป (นับจาก origin ไม่สะสม drift)
+            next_at = self._origin + (self._now + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_at - self._clock()))
+            self.advance()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,213 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:  # NumPy is optional: used for vectorised downsampling when installed
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+SeriesKey = Tuple[str, int, str]
+
+
+class RingSeries:
+    """
+    Fixed-capacity ring buffer of (timestamp, value) pairs stored in two
+    typed ``array('d')`` columns: ``16 * capacity`` bytes per series no
+    matter how long the charger stays connected. The columns are always in
+    timestamp order, which ``range`` relies on: a sample older than the
+    newest one (e.g. replayed from a charger's offline queue) is inserted
+    in place, or ignored when the buffer is full and it is older than
+    everything kept.
+    """
+
+    __slots__ = ("capacity", "unit", "_ts", "_val", "_head", "_count")
+
+    def __init__(self, capacity: int, unit: str = ""):
+        self.capacity = capacity
+        self.unit = unit
+        self._ts = array("d", bytes(8 * capacity))
+        self._val = array("d", bytes(8 * capacity))
+        self._head = 0  # next slot to write
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, ts: float, value: float) -> None:
+        if self._count and ts < self._ts[self._head - 1]:
+            self._insert(ts, value)
+            return
+        h = self._head
+        self._ts[h] = ts
+        self._val[h] = value
+        h += 1
+        self._head = 0 if h == self.capacity else h
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _insert(self, ts: float, value: float) -> None:
+        """Late sample: rewrite the columns oldest-first with it in place (O(capacity), rare)."""
+        ts_col, val_col = self._ordered()
+        i = bisect_right(ts_col, ts)
+        if self._count == self.capacity:
+            if i == 0:
+                return  # older than the whole window: it would be evicted at once
+            del ts_col[0], val_col[0]
+            i -= 1
+        ts_col.insert(i, ts)
+        val_col.insert(i, value)
+        n = len(ts_col)
+        self._ts[:n] = ts_col
+        self._val[:n] = val_col
+        self._count = n
+        self._head = 0 if n == self.capacity else n
+
+    def _ordered(self) -> Tuple[array, array]:
+        """Columns in chronological order (oldest first)."""
+        if self._count < self.capacity:
+            return self._ts[: self._count], self._val[: self._count]
+        h = self._head
+        return self._ts[h:] + self._ts[:h], self._val[h:] + self._val[:h]
+
+    def last(self) -> Optional[Tuple[float, float]]:
+        if not self._count:
+            return None
+        i = self._head - 1
+        return self._ts[i], self._val[i]
+
+    def range(self, since: Optional[float] = None, until: Optional[float] = None) -> Tuple[List[float], List[float]]:
+        ts, val = self._ordered()
+        lo = bisect_left(ts, since) if since is not None else 0
+        hi = bisect_right(ts, until) if until is not None else len(ts)
+        return ts[lo:hi].tolist(), val[lo:hi].tolist()
+
+    def downsample(
+        self, step: float, since: Optional[float] = None, until: Optional[float] = None
+    ) -> Tuple[List[float], List[float]]:
+        """Average values into ``step``-second buckets (bucket start timestamps)."""
+        ts, val = self.range(since, until)
+        if not ts or step <= 0:
+            return ts, val
+        if np is not None:
+            t = np.asarray(ts)
+            v = np.asarray(val)
+            buckets = np.floor(t / step)
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            sums = np.add.reduceat(v, starts)
+            counts = np.diff(np.r_[starts, len(v)])
+            return (buckets[starts] * step).tolist(), (sums / counts).tolist()
+        out_ts: List[float] = []
+        out_val: List[float] = []
+        cur = None
+        acc = 0.0
+        n = 0
+        for t, v in zip(ts, val):
+            b = math.floor(t / step)
+            if b != cur:
+                if n:
+                    out_ts.append(cur * step)
+                    out_val.append(acc / n)
+                cur, acc, n = b, 0.0, 0
+            acc += v
+            n += 1
+        if n:
+            out_ts.append(cur * step)
+            out_val.append(acc / n)
+        return out_ts, out_val
+
+
+class MeterSeriesStore:
+    """
+    In-memory meter history keyed by (cpid, connectorId, measurand).
+
+    Phase-specific samples are kept in their own series
+    (``"Current.Import:L1"``) so that L1/L2/L3 readings are not mixed.
+    A charger's series stay until ``drop`` (its state expired); at most
+    ``max_series`` exist at once, samples for new series beyond that are
+    rejected.
+    """
+
+    def __init__(self, capacity: int = 512, max_series: int = 50_000):
+        self.capacity = capacity
+        self.max_series = max_series
+        self._series: Dict[SeriesKey, RingSeries] = {}
+        # (cpid, connectorId) -> measurands ที่มีข้อมูล
+        self._by_connector: Dict[Tuple[str, int], List[str]] = {}
+        # cpid -> connectorIds ที่มีข้อมูล
+        self._connectors: Dict[str, List[int]] = {}
+        self.rejected_series = 0
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def _get_or_create(self, cpid: str, connector_id: int, measurand: str, unit: str) -> Optional[RingSeries]:
+        key = (cpid, connector_id, measurand)
+        series = self._series.get(key)
+        if series is None:
+            if len(self._series) >= self.max_series:
+                self.rejected_series += 1
+                return None
+            series = self._series[key] = RingSeries(self.capacity, unit)
+            measurands = self._by_connector.get((cpid, connector_id))
+            if measurands is None:
+                measurands = self._by_connector[(cpid, connector_id)] = []
+                self._connectors.setdefault(cpid, []).append(connector_id)
+            measurands.append(measurand)
+        return series
+
+    def drop(self, cpid: str) -> int:
+        """Forget every series of a charger; returns how many were dropped."""
+        dropped = 0
+        for connector_id in self._connectors.pop(cpid, ()):
+            for measurand in self._by_connector.pop((cpid, connector_id), ()):
+                del self._series[(cpid, connector_id, measurand)]
+                dropped += 1
+        return dropped
+
+    def append(self, cpid: str, connector_id: int, measurand: str, ts: float, value: float, unit: str = "") -> None:
+        series = self._get_or_create(cpid, connector_id, measurand, unit)
+        if series is not None:
+            series.append(ts, value)
+
+    def extend(self, samples: Iterable[tuple]) -> None:
+        """Add samples produced by ``meter_ingest.parse_meter_values``."""
+        series_map = self._series
+        for ts, cpid, connector_id, _tx, measurand, phase, unit, value in samples:
+            if phase:
+                measurand = f"{measurand}:{phase}"
+            series = series_map.get((cpid, connector_id, measurand))
+            if series is None:
+                series = self._get_or_create(cpid, connector_id, measurand, unit)
+                if series is None:
+                    continue
+            series.append(ts, value)
+
+    def measurands(self, cpid: str, connector_id: int) -> List[str]:
+        return list(self._by_connector.get((cpid, connector_id), ()))
+
+    def get(self, cpid: str, connector_id: int, measurand: str) -> Optional[RingSeries]:
+        return self._series.get((cpid, connector_id, measurand))
+
+    def query(
+        self,
+        cpid: str,
+        connector_id: int,
+        measurand: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        step: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        names = [measurand] if measurand else self.measurands(cpid, connector_id)
+        out = []
+        for name in names:
+            series = self.get(cpid, connector_id, name)
+            if series is None:
+                continue
+            if step:
+                ts, val = series.downsample(step, since, until)
+            else:
+                ts, val = series.range(since, until)
+            out.append({"measurand": name, "unit": series.unit, "ts": ts, "value": val})
+        return out
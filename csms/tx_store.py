@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+# one open transaction as kept in CentralSystem.active_tx
+TxInfo = Dict[str, Any]
+
+_OPEN_COLUMNS = ("transaction_id", "cpid", "connector_id", "id_tag", "vid", "meter_start", "started_at")
+
+
+class TransactionStore:
+    """
+    Transaction id allocation and open/closed transaction bookkeeping.
+
+    The in-memory view (``open_by_cp``) is updated synchronously so handlers
+    can read their own writes immediately; persistent backends make the
+    ``start_transaction``/``stop_transaction`` coroutines resolve once the
+    change is durable.
+    """
+
+    def __init__(self, id_stride: int = 1, id_offset: int = 0):
+        # worker i ออกเลข transactionId ที่ (id - 1) % stride == offset เพื่อไม่ให้ชนกัน
+        self.id_stride = max(1, id_stride)
+        self.id_offset = id_offset
+        self._next_id = 1 + id_offset
+        # cpid -> connector_id -> record
+        self.open_by_cp: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        # transaction_id -> record
+        self._by_tx: Dict[int, Dict[str, Any]] = {}
+
+    def _seed_ids(self, max_used: int) -> None:
+        n = max_used + 1
+        while (n - 1) % self.id_stride != self.id_offset:
+            n += 1
+        self._next_id = n
+
+    def next_transaction_id(self) -> int:
+        tx_id = self._next_id
+        self._next_id += self.id_stride
+        return tx_id
+
+    def _remember(self, record: Dict[str, Any]) -> None:
+        self.open_by_cp.setdefault(record["cpid"], {})[record["connector_id"]] = record
+        self._by_tx[record["transaction_id"]] = record
+
+    def _forget(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        record = self._by_tx.pop(transaction_id, None)
+        if record is None:
+            return None
+        by_conn = self.open_by_cp.get(record["cpid"])
+        if by_conn is not None and by_conn.get(record["connector_id"]) is record:
+            del by_conn[record["connector_id"]]
+            if not by_conn:
+                del self.open_by_cp[record["cpid"]]
+        return record
+
+    @staticmethod
+    def to_active(record: Dict[str, Any]) -> TxInfo:
+        info: TxInfo = {"transaction_id": record["transaction_id"], "id_tag": record["id_tag"]}
+        if record.get("vid"):
+            info["vid"] = record["vid"]
+        return info
+
+    async def open(self) -> None:
+        """Recover state (open transactions and the id counter)."""
+
+    async def close(self) -> None:
+        pass
+
+    async def load_cp(self, cpid: str) -> Dict[int, TxInfo]:
+        """Open transactions of one charger, as ``active_tx`` entries."""
+        return {c_id: self.to_active(rec) for c_id, rec in self.open_by_cp.get(cpid, {}).items()}
+
+    async def start_transaction(
+        self,
+        cpid: str,
+        connector_id: int,
+        info: TxInfo,
+        meter_start: int,
+        started_at: str,
+    ) -> None:
+        record = {
+            "transaction_id": info["transaction_id"],
+            "cpid": cpid,
+            "connector_id": int(connector_id),
+            "id_tag": info.get("id_tag"),
+            "vid": info.get("vid"),
+            "meter_start": meter_start,
+            "started_at": started_at,
+        }
+        self._remember(record)
+        try:
+            await self._persist_start(record)
+        except Exception:
+            self._forget(record["transaction_id"])
+            raise
+
+    async def stop_transaction(
+        self,
+        transaction_id: int,
+        meter_stop: int,
+        stopped_at: str,
+        reason: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Close a transaction; returns its record or None if it was not open."""
+        record = self._forget(int(transaction_id))
+        await self._persist_stop(int(transaction_id), record, meter_stop, stopped_at, reason)
+        return record
+
+    async def _persist_start(self, record: Dict[str, Any]) -> None:
+        pass
+
+    async def _persist_stop(self, transaction_id, record, meter_stop, stopped_at, reason) -> None:
+        pass
+
+
+class MemoryTransactionStore(TransactionStore):
+    """Non-persistent store: the old behaviour (state is lost on restart)."""
+
+
+class SQLiteTransactionStore(TransactionStore):
+    """
+    Embedded SQLite store (WAL, synchronous=FULL).
+
+    Open transactions live in their own small table, separate from the
+    history, so recovery reads only the open rows plus the highest id via
+    the primary-key index. Writes are group-committed: every change queued
+    while the previous commit is in flight (or within ``commit_delay``) is
+    written in one transaction, i.e. one fsync per batch instead of one per
+    StartTransaction/StopTransaction. ``close()`` lets the writer commit
+    what is in flight and queued before the connection is closed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        commit_delay: float = 0.002,
+        max_batch: int = 1000,
+        shared: bool = False,
+        id_stride: int = 1,
+        id_offset: int = 0,
+    ):
+        super().__init__(id_stride, id_offset)
+        self.path = path
+        self.commit_delay = commit_delay
+        self.max_batch = max_batch
+        # True when other processes write the same file (worker mode)
+        self.shared = shared
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._kick: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closing = False
+        self.commits = 0
+        self.committed_ops = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS open_transactions (
+                transaction_id INTEGER PRIMARY KEY,
+                cpid TEXT NOT NULL,
+                connector_id INTEGER NOT NULL,
+                id_tag TEXT,
+                vid TEXT,
+                meter_start INTEGER,
+                started_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS open_transactions_cpid ON open_transactions (cpid);
+            CREATE TABLE IF NOT EXISTS transactions (
+                transaction_id INTEGER PRIMARY KEY,
+                cpid TEXT NOT NULL,
+                connector_id INTEGER NOT NULL,
+                id_tag TEXT,
+                vid TEXT,
+                meter_start INTEGER,
+                started_at TEXT,
+                meter_stop INTEGER,
+                stopped_at TEXT,
+                stop_reason TEXT
+            );
+            """
+        )
+        db.commit()
+        return db
+
+    def _recover(self) -> Tuple[List[tuple], int]:
+        rows = self._db.execute(f"SELECT {','.join(_OPEN_COLUMNS)} FROM open_transactions").fetchall()
+        max_open = self._db.execute("SELECT MAX(transaction_id) FROM open_transactions").fetchone()[0] or 0
+        max_closed = self._db.execute("SELECT MAX(transaction_id) FROM transactions").fetchone()[0] or 0
+        return rows, max(max_open, max_closed)
+
+    async def open(self) -> None:
+        self._db = await asyncio.to_thread(self._connect)
+        rows, max_used = await asyncio.to_thread(self._recover)
+        for row in rows:
+            self._remember(dict(zip(_OPEN_COLUMNS, row)))
+        self._seed_ids(max_used)
+        self._kick = asyncio.Event()
+        self._closing = False
+        self._writer = asyncio.create_task(self._write_loop())
+        logging.info(
+            "Transaction store %s: recovered %s open transactions, next id %s",
+            self.path, len(rows), self._next_id,
+        )
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            # ไม่ cancel: batch ที่อยู่ใน thread ต้อง commit จบ (และ future ได้ผล) ก่อนปิด connection
+            self._closing = True
+            self._kick.set()
+            await self._writer
+            self._writer = None
+        if self._pending:
+            await self._commit_batch()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def load_cp(self, cpid: str) -> Dict[int, TxInfo]:
+        if self.shared and self._db is not None:
+            # worker อื่นอาจเปิดธุรกรรมของตู้นี้ไว้ก่อนตู้ย้ายมาต่อที่ worker นี้
+            rows = await asyncio.to_thread(
+                lambda: self._db.execute(
+                    f"SELECT {','.join(_OPEN_COLUMNS)} FROM open_transactions WHERE cpid = ?", (cpid,)
+                ).fetchall()
+            )
+            for rec in self.open_by_cp.pop(cpid, {}).values():
+                self._by_tx.pop(rec["transaction_id"], None)
+            for row in rows:
+                self._remember(dict(zip(_OPEN_COLUMNS, row)))
+        return await super().load_cp(cpid)
+
+    async def _persist_start(self, record: Dict[str, Any]) -> None:
+        await self._submit(("start", record))
+
+    async def _persist_stop(self, transaction_id, record, meter_stop, stopped_at, reason) -> None:
+        await self._submit(("stop", transaction_id, meter_stop, stopped_at, reason))
+
+    async def _submit(self, op: tuple) -> None:
+        if self._db is None:
+            raise RuntimeError("SQLiteTransactionStore.open() was not awaited")
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((op, fut))
+        self._kick.set()
+        await fut
+
+    async def _write_loop(self) -> None:
+        while not self._closing:
+            await self._kick.wait()
+            if self.commit_delay and len(self._pending) < self.max_batch and not self._closing:
+                await asyncio.sleep(self.commit_delay)
+            self._kick.clear()
+            while self._pending:
+                await self._commit_batch()
+
+    async def _commit_batch(self) -> None:
+        batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+        try:
+            await asyncio.to_thread(self._apply, [op for op, _ in batch])
+        except Exception as e:
+            logging.exception("Transaction store commit of %s changes failed", len(batch))
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        self.commits += 1
+        self.committed_ops += len(batch)
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _apply(self, ops: List[tuple]) -> None:
+        with self._db:
+            for op in ops:
+                if op[0] == "start":
+                    rec = op[1]
+                    self._db.execute(
+                        f"INSERT OR REPLACE INTO open_transactions ({','.join(_OPEN_COLUMNS)}) "
+                        f"VALUES ({','.join('?' * len(_OPEN_COLUMNS))})",
+                        tuple(rec[c] for c in _OPEN_COLUMNS),
+                    )
+                else:
+                    _, tx_id, meter_stop, stopped_at, reason = op
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO transactions "
+                        "SELECT transaction_id, cpid, connector_id, id_tag, vid, meter_start, started_at, ?, ?, ? "
+                        "FROM open_transactions WHERE transaction_id = ?",
+                        (meter_stop, stopped_at, reason, tx_id),
+                    )
+                    self._db.execute("DELETE FROM open_transactions WHERE transaction_id = ?", (tx_id,))
+
+
+def build_tx_store(kind: str, path: str, workers: int = 1, worker_id: int = 0) -> TransactionStore:
+    """kind: sqlite | memory"""
+    if kind == "sqlite":
+        return SQLiteTransactionStore(
+            path, shared=workers > 1, id_stride=workers, id_offset=worker_id
+        )
+    return MemoryTransactionStore(id_stride=workers, id_offset=worker_id)
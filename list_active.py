@@ -1,5 +1,3 @@
-import json
-import sys
 from typing import List
 
 import requests
@@ -8,16 +6,29 @@ API_BASE = "http://45.136.236.186:8080"
 API_KEY = "changeme-123"
 
 
+PAGE_SIZE = 500
+
+
 def fetch_active() -> List[dict]:
+    """Read every active session page by page (cursor = last transactionId)."""
     url = f"{API_BASE}/api/v1/active"
+    sessions: List[dict] = []
+    cursor = None
     try:
-        resp = requests.get(url, headers={"X-API-Key": API_KEY}, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("sessions", [])
+        while True:
+            params = {"limit": PAGE_SIZE}
+            if cursor is not None:
+                params["cursor"] = cursor
+            resp = requests.get(url, headers={"X-API-Key": API_KEY}, params=params, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+            sessions.extend(data.get("sessions", []))
+            cursor = data.get("nextCursor")
+            if cursor is None:
+                return sessions
     except Exception as exc:
         print("error:", exc)
-        return []
+        return sessions
 
 
 def main() -> None:
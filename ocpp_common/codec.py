@@ -0,0 +1,301 @@
+import contextvars
+import decimal
+import fnmatch
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import ocpp.charge_point
+import ocpp.messages
+from ocpp.exceptions import FormatViolationError, PropertyConstraintViolationError, ProtocolError
+from ocpp.messages import Call, CallError, CallResult, get_validator
+
+try:
+    import orjson
+except ImportError:  # optional: ไม่มีก็ใช้ json ของ stdlib
+    orjson = None
+
+# ของเดิมของ ocpp (uninstall() คืนค่าเหล่านี้)
+_ORIGINAL = {
+    "unpack": ocpp.charge_point.unpack,
+    "validate_payload": ocpp.charge_point.validate_payload,
+    "Call.to_json": Call.to_json,
+    "CallResult.to_json": CallResult.to_json,
+    "CallError.to_json": CallError.to_json,
+}
+_MESSAGE_TYPES = {cls.message_type_id: cls for cls in (Call, CallResult, CallError)}
+
+# ตั้งระหว่าง ChargePoint.call() ของ action ที่อยู่ใน allowlist (ดู ValidationBypass)
+_skip_validation = contextvars.ContextVar("ocpp_skip_validation", default=False)
+
+codec_name = "json"
+
+
+def _default(obj: Any) -> Any:
+    # เหมือน _DecimalEncoder ของ ocpp: Decimal ปัดเป็นทศนิยม 1 ตำแหน่ง, object ที่มี to_json()
+    # (เช่น Call ใน error details) ใส่เป็น string
+    if isinstance(obj, decimal.Decimal):
+        return float("%.1f" % obj)
+    to_json = getattr(obj, "to_json", None)
+    if to_json is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_json()
+
+
+def _json_dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), default=_default)
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj, default=_default).decode()
+
+
+dumps: Callable[[Any], str] = _json_dumps
+loads: Callable[[Any], Any] = json.loads
+
+
+def unpack(raw: Any):
+    """ocpp.messages.unpack with the active decoder."""
+    try:
+        msg = loads(raw)
+    except ValueError:
+        raise FormatViolationError(details={"cause": "Message is not valid JSON", "ocpp_message": raw})
+    if not isinstance(msg, list):
+        raise ProtocolError(
+            details={"cause": f"OCPP message hasn't the correct format. It should be a list, but got '{type(msg)}' instead"}
+        )
+    if not msg:
+        raise ProtocolError(details={"cause": "Message does not contain MessageTypeId"})
+    cls = _MESSAGE_TYPES.get(msg[0])
+    if cls is None:
+        raise PropertyConstraintViolationError(details={"cause": f"MessageTypeId '{msg[0]}' isn't valid"})
+    try:
+        return cls(*msg[1:])
+    except TypeError:
+        raise ProtocolError(details={"cause": "Message is missing elements."})
+
+
+def _call_to_json(self) -> str:
+    return dumps([self.message_type_id, self.unique_id, self.action, self.payload])
+
+
+def _call_result_to_json(self) -> str:
+    return dumps([self.message_type_id, self.unique_id, self.payload])
+
+
+def _call_error_to_json(self) -> str:
+    return dumps([self.message_type_id, self.unique_id, self.error_code, self.error_description, self.error_details])
+
+
+# ---- precompiled validators ----
+# JSON Schema draft-4 types ตามที่ jsonschema ตีความ (bool ไม่ใช่ integer/number)
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float, decimal.Decimal)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+}
+# keywords that never fail validation (format is not checked by ocpp's Draft4Validator either)
+_ANNOTATIONS = {"$schema", "$id", "id", "title", "description", "format", "definitions"}
+
+
+def compile_schema(schema: Dict[str, Any]) -> Optional[Callable[[Any], bool]]:
+    """
+    Compile the draft-4 subset used by the OCPP 1.6 schemas (type,
+    properties, required, additionalProperties, enum, maxLength, items,
+    minItems) into a plain predicate. Returns None when the schema uses
+    anything else ($ref, multipleOf, ...), which then stays on jsonschema.
+    """
+    checks = []
+    props: Dict[str, Callable[[Any], bool]] = {}
+    for key, value in schema.items():
+        if key in _ANNOTATIONS:
+            continue
+        if key == "type":
+            if value not in _TYPE_CHECKS:
+                return None
+            checks.append(_TYPE_CHECKS[value])
+        elif key == "properties":
+            for name, sub_schema in value.items():
+                sub = compile_schema(sub_schema)
+                if sub is None:
+                    return None
+                props[name] = sub
+        elif key == "required":
+            if not isinstance(value, list):
+                return None
+            names = tuple(value)
+            checks.append(lambda v, names=names: not isinstance(v, dict) or all(n in v for n in names))
+        elif key == "additionalProperties":
+            if value is False:
+                allowed = frozenset(schema.get("properties", ()))
+                checks.append(lambda v, allowed=allowed: not isinstance(v, dict) or all(k in allowed for k in v))
+            elif value is not True:
+                return None
+        elif key == "enum":
+            if not all(isinstance(e, str) for e in value):
+                return None
+            members = frozenset(value)
+            checks.append(lambda v, members=members: isinstance(v, str) and v in members)
+        elif key == "maxLength":
+            checks.append(lambda v, n=value: not isinstance(v, str) or len(v) <= n)
+        elif key == "minItems":
+            checks.append(lambda v, n=value: not isinstance(v, list) or len(v) >= n)
+        elif key == "items":
+            if not isinstance(value, dict):
+                return None
+            item = compile_schema(value)
+            if item is None:
+                return None
+            checks.append(lambda v, item=item: not isinstance(v, list) or all(item(x) for x in v))
+        else:
+            return None
+    if props:
+        items = tuple(props.items())
+        checks.append(
+            lambda v, items=items: not isinstance(v, dict) or all(check(v[k]) for k, check in items if k in v)
+        )
+    checks = tuple(checks)
+    return lambda v: all(check(v) for check in checks)
+
+
+# (message type, action, ocpp version) -> predicate, or None = use jsonschema
+_compiled: Dict[Tuple[int, str, str], Optional[Callable[[Any], bool]]] = {}
+
+
+def _compiled_validator(message_type_id: int, action: str, ocpp_version: str) -> Optional[Callable[[Any], bool]]:
+    key = (message_type_id, action, ocpp_version)
+    try:
+        return _compiled[key]
+    except KeyError:
+        pass
+    try:
+        check = compile_schema(get_validator(message_type_id, action, ocpp_version).schema)
+    except Exception:
+        # ไม่รู้จัก action: ให้ validate_payload เดิมเป็นคน raise error ตามสเปก
+        check = None
+    _compiled[key] = check
+    return check
+
+
+def _validate_payload(message, ocpp_version: str) -> None:
+    """
+    ocpp's validate_payload, but a payload accepted by the precompiled
+    predicate is done; only a rejected (or not compilable) one goes through
+    jsonschema, which raises the exact OCPP error as before.
+    """
+    if _skip_validation.get():
+        return
+    if type(message) in (Call, CallResult) and message.action is not None:
+        check = _compiled_validator(message.message_type_id, message.action, ocpp_version)
+        if check is not None and check(message.payload):
+            return
+    _ORIGINAL["validate_payload"](message, ocpp_version)
+
+
+def warm_validators(ocpp_version: str = "1.6") -> int:
+    """
+    Load and compile every schema of ``ocpp_version`` now, instead of
+    reading it from disk on the first message of each action.
+    """
+    schemas = os.path.join(os.path.dirname(ocpp.messages.__file__), "v" + ocpp_version.replace(".", ""), "schemas")
+    count = 0
+    for name in sorted(os.listdir(schemas)):
+        if not name.endswith(".json"):
+            continue
+        action = name[:-5]
+        if action.endswith("Response"):
+            message_type_id, action = CallResult.message_type_id, action[: -len("Response")]
+        else:
+            message_type_id = Call.message_type_id
+        try:
+            get_validator(message_type_id, action, ocpp_version)
+            _compiled_validator(message_type_id, action, ocpp_version)
+            count += 1
+        except Exception as e:
+            logging.debug("Cannot preload schema %s: %s", name, e)
+    return count
+
+
+def install(name: str = "auto") -> str:
+    """
+    Switch the ocpp library to the ``name`` codec: orjson | json | auto
+    (orjson when installed). Frames keep the exact wire format of ocpp
+    (compact separators, Decimal as float). Schema validation goes through
+    precompiled predicates (see ``compile_schema``), preloaded for 1.6.
+    Returns the codec actually in use.
+    """
+    global dumps, loads, codec_name
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson" and orjson is None:
+        logging.warning("OCPP_CODEC=orjson but orjson is not installed; using json")
+        name = "json"
+    if name == "orjson":
+        dumps, loads = _orjson_dumps, orjson.loads
+    else:
+        dumps, loads = _json_dumps, json.loads
+    codec_name = name
+    ocpp.charge_point.unpack = unpack
+    ocpp.charge_point.validate_payload = _validate_payload
+    Call.to_json = _call_to_json
+    CallResult.to_json = _call_result_to_json
+    CallError.to_json = _call_error_to_json
+    warm_validators()
+    return name
+
+
+def uninstall() -> None:
+    """Back to ocpp's own json + validation (used by the codec benchmark)."""
+    global dumps, loads, codec_name
+    dumps, loads, codec_name = _json_dumps, json.loads, "json"
+    ocpp.charge_point.unpack = _ORIGINAL["unpack"]
+    ocpp.charge_point.validate_payload = _ORIGINAL["validate_payload"]
+    Call.to_json = _ORIGINAL["Call.to_json"]
+    CallResult.to_json = _ORIGINAL["CallResult.to_json"]
+    CallError.to_json = _ORIGINAL["CallError.to_json"]
+
+
+def parse_actions(spec: str) -> FrozenSet[str]:
+    """``"Heartbeat,MeterValues"`` -> frozenset of action names."""
+    return frozenset(a.strip() for a in (spec or "").split(",") if a.strip())
+
+
+class ValidationBypass:
+    """
+    Mixin for ocpp ChargePoint classes: for chargers whose id matches
+    ``trusted_ids`` (fnmatch patterns), the actions in ``skip_validation``
+    are not checked against the JSON schemas, both for CALLs received
+    (ocpp's per-route ``_skip_schema_validation``) and for CALLs sent with
+    ``call()`` and their responses. A malformed payload then fails in the
+    handler (and is answered with a CallError) instead of in the validator.
+    """
+
+    skip_validation: FrozenSet[str] = frozenset()
+    trusted_ids: Tuple[str, ...] = ("*",)
+
+    def __init__(self, id, connection, *args, **kwargs):
+        super().__init__(id, connection, *args, **kwargs)
+        self.validation_bypass = bool(self.skip_validation) and is_trusted(id, self.trusted_ids)
+        if self.validation_bypass:
+            for action in self.skip_validation:
+                route = self.route_map.get(action)
+                if route is not None:
+                    route["_skip_schema_validation"] = True
+
+    async def call(self, payload, suppress=True, unique_id=None):
+        if self.validation_bypass and payload.__class__.__name__[:-7] in self.skip_validation:
+            token = _skip_validation.set(True)
+            try:
+                return await super().call(payload, suppress, unique_id)
+            finally:
+                _skip_validation.reset(token)
+        return await super().call(payload, suppress, unique_id)
+
+
+def is_trusted(cpid: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch.fnmatchcase(cpid, p) for p in patterns)
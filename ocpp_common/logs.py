@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+# LogRecord attributes that are not user fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class Lazy:
+    """
+    Value computed only when a record is actually written (in the writer
+    thread), e.g. ``Lazy(lambda: json.dumps(meter_value))``. Only wrap data
+    that is not mutated after the call.
+    """
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+    def __str__(self) -> str:
+        return str(self.fn())
+
+    def __repr__(self) -> str:
+        return repr(self.fn())
+
+
+class ContextLogger(logging.LoggerAdapter):
+    """LoggerAdapter that merges its context (e.g. cpid) with per-call ``extra``."""
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra")
+        kwargs["extra"] = {**self.extra, **extra} if extra else self.extra
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg and every ``extra`` field."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                out[key] = value() if isinstance(value, Lazy) else value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Per-action sampling / rate limiting for records that carry an ``action``
+    field. Rules: ``{"Heartbeat": (100, None)}`` keeps 1 in 100,
+    ``{"MeterValues": (None, 20.0)}`` keeps at most 20 per second.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rules: Dict[str, Tuple[Optional[int], Optional[float]]]):
+        super().__init__()
+        self.rules = rules
+        self._seen: Dict[str, int] = {}
+        # action -> [window start, count in window]
+        self._windows: Dict[str, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        action = getattr(record, "action", None)
+        rule = self.rules.get(action) if action is not None else None
+        if rule is None or record.levelno >= logging.WARNING:
+            return True
+        every, per_sec = rule
+        if every:
+            n = self._seen.get(action, 0)
+            self._seen[action] = n + 1
+            if n % every:
+                self.suppressed += 1
+                return False
+        if per_sec:
+            now = time.monotonic()
+            window = self._windows.get(action)
+            if window is None or now - window[0] >= 1.0:
+                window = self._windows[action] = [now, 0]
+            if window[1] >= per_sec:
+                self.suppressed += 1
+                return False
+            window[1] += 1
+        return True
+
+
+def parse_sample_rules(spec: str) -> Dict[str, Tuple[Optional[int], Optional[float]]]:
+    """``"Heartbeat=100,MeterValues=20/s"`` -> SamplingFilter rules."""
+    rules: Dict[str, Tuple[Optional[int], Optional[float]]] = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        action, _, value = part.partition("=")
+        value = value.strip()
+        if value.endswith("/s"):
+            rules[action.strip()] = (None, float(value[:-2]))
+        elif value:
+            rules[action.strip()] = (max(1, int(value)), None)
+    return rules
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the caller's thread: the
+    record (msg + args, Lazy fields) is formatted by the QueueListener
+    thread, and records are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_installed: Dict[str, Any] = {}
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    sample: str = "",
+    use_queue: bool = True,
+    queue_size: int = 100_000,
+) -> Optional[logging.handlers.QueueListener]:
+    """
+    Set up the root logger: ``fmt`` text | json, optional per-action
+    sampling, and (``use_queue``) a background writer thread so stream I/O
+    never runs on the event loop. Safe to call again, e.g. in a forked
+    worker where the parent's writer thread no longer exists.
+    """
+    root = logging.getLogger()
+    old_listener = _installed.pop("listener", None)
+    if old_listener is not None:
+        try:
+            old_listener.stop()
+        except Exception:
+            pass
+    for h in _installed.pop("handlers", []):
+        root.removeHandler(h)
+    for h in list(root.handlers):
+        # แทนที่ handler เดิม (เช่นจาก basicConfig)
+        root.removeHandler(h)
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    front: logging.Handler = stream
+    listener = None
+    if use_queue:
+        front = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        listener = logging.handlers.QueueListener(front.queue, stream, respect_handler_level=False)
+        listener.start()
+        _installed["listener"] = listener
+        if "atexit" not in _installed:
+            _installed["atexit"] = True
+            atexit.register(_stop_listener)
+    rules = parse_sample_rules(sample)
+    if rules:
+        front.addFilter(SamplingFilter(rules))
+    root.addHandler(front)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    _installed["handlers"] = [front]
+    return listener
+
+
+def _stop_listener() -> None:
+    listener = _installed.get("listener")
+    if listener is not None:
+        try:
+            listener.stop()
+        except Exception:
+            pass
@@ -19,5 +19,42 @@ ICCID = os.getenv("ICCID", "0")
 METER_START_WH = int(os.getenv("METER_START_WH", "0"))
 METER_RATE_W = int(os.getenv("METER_RATE_W", "7000"))          # 7 kW
 METER_PERIOD_SEC = int(os.getenv("METER_PERIOD_SEC", "10"))     # ส่งทุก 10s
+CLOCK_ALIGNED_SEC = int(os.getenv("CLOCK_ALIGNED_SEC", "1800")) # Sample.Clock ทุก :00/:30, 0 = ปิด
+
+# vehicle plugged in at each session (sim/vehicle.py): capacity / max DC power +-30% per car, start SoC range (%)
+EV_BATTERY_WH = float(os.getenv("EV_BATTERY_WH", "60000"))
+EV_MAX_POWER_W = float(os.getenv("EV_MAX_POWER_W", "150000"))
+EV_SOC_START = tuple(float(v) / 100 for v in os.getenv("EV_SOC_START", "10,40").split(","))
 SEND_HEARTBEAT_SEC = int(os.getenv("SEND_HEARTBEAT_SEC", "60")) # heartbeat
 HTTP_PORT = int(os.getenv("HTTP_PORT", "7071"))
+
+# logging (same settings as the CSMS): text | json, per-action sampling, background writer
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1") not in ("0", "false", "no")
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "100000"))
+# ocpp library logs every raw frame at INFO; e.g. LOG_OCPP_LEVEL=WARNING for large fleets
+LOG_OCPP_LEVEL = os.getenv("LOG_OCPP_LEVEL", "")  # empty = follow LOG_LEVEL
+
+# fleet load generator (python -m sim.fleet)
+FLEET_SIZE = int(os.getenv("FLEET_SIZE", "100"))
+FLEET_CPID_PREFIX = os.getenv("FLEET_CPID_PREFIX", "SIM")
+FLEET_RAMP_PER_SEC = float(os.getenv("FLEET_RAMP_PER_SEC", "50"))     # ตู้ที่เริ่มต่อ/วินาที
+FLEET_PROCESSES = int(os.getenv("FLEET_PROCESSES", "1"))
+FLEET_SESSIONS_PER_HOUR = float(os.getenv("FLEET_SESSIONS_PER_HOUR", "1"))  # ต่อ connector
+FLEET_SESSION_SEC = float(os.getenv("FLEET_SESSION_SEC", "1800"))     # ระยะเวลาชาร์จเฉลี่ย
+FLEET_REPORT_SEC = float(os.getenv("FLEET_REPORT_SEC", "10"))
+
+# OCPP frame codec (auto | orjson | json) and actions sent/received without JSON schema validation
+OCPP_CODEC = os.getenv("OCPP_CODEC", "auto")
+OCPP_SKIP_VALIDATION = os.getenv("OCPP_SKIP_VALIDATION", "")
+
+# outbound queue for MeterValues/StopTransaction while the CSMS is unreachable (sim/outbox.py)
+SIM_OUTBOX_PATH = os.getenv("SIM_OUTBOX_PATH", "data/sim_outbox.db")  # empty = in memory
+SIM_OUTBOX_MAX = int(os.getenv("SIM_OUTBOX_MAX", "10000"))            # ต่อตู้
+SIM_OUTBOX_BATCH = int(os.getenv("SIM_OUTBOX_BATCH", "50"))           # meterValue ต่อ MeterValues ตอน replay
+
+# reconnect backoff (decorrelated jitter): first retry within base..3*base, never longer than max
+SIM_RECONNECT_BASE_SEC = float(os.getenv("SIM_RECONNECT_BASE_SEC", "1"))
+SIM_RECONNECT_MAX_SEC = float(os.getenv("SIM_RECONNECT_MAX_SEC", "60"))
@@ -0,0 +1,83 @@
+import random
+import time
+from typing import Callable, Dict, Optional
+
+
+class LinkState:
+    DISCONNECTED = "Disconnected"  # รอ backoff ก่อนต่อใหม่
+    CONNECTING = "Connecting"
+    BOOTING = "Booting"  # WebSocket เปิดแล้ว, BootNotification ยังไม่ Accepted
+    ONLINE = "Online"
+
+
+class Backoff:
+    """
+    Exponential backoff with decorrelated jitter: each delay is drawn from
+    [base, 3 x previous delay], capped at ``cap``. Simulators that lose the
+    CSMS at the same moment come back spread out instead of in waves.
+    ``reset()`` after a successful connection.
+    """
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0, rng: Callable[[float, float], float] = random.uniform):
+        self.base = base
+        self.cap = max(cap, base)
+        self._rng = rng
+        self._delay = base
+
+    def next(self) -> float:
+        self._delay = min(self.cap, self._rng(self.base, self._delay * 3))
+        return self._delay
+
+    def reset(self) -> None:
+        self._delay = self.base
+
+
+class LinkMonitor:
+    """
+    Connection state of one simulated charger with its counters: connects,
+    reconnects (connections after the first one that reached Online) and
+    time spent disconnected after having been online.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.state = LinkState.DISCONNECTED
+        self._clock = clock
+        self.connects = 0
+        self.reconnects = 0
+        self.outages = 0
+        self._was_online = False
+        self._down_since: Optional[float] = None
+        self._down_total = 0.0
+        self.last_outage_sec = 0.0
+
+    def set(self, state: str) -> None:
+        prev, self.state = self.state, state
+        now = self._clock()
+        if state == LinkState.BOOTING and prev == LinkState.CONNECTING:
+            self.connects += 1
+            if self._was_online:
+                self.reconnects += 1
+        elif state == LinkState.ONLINE:
+            self._was_online = True
+            if self._down_since is not None:
+                self.last_outage_sec = now - self._down_since
+                self._down_total += self.last_outage_sec
+                self._down_since = None
+        elif state == LinkState.DISCONNECTED and prev == LinkState.ONLINE:
+            self.outages += 1
+            self._down_since = now
+
+    def disconnected_sec(self) -> float:
+        """Total time from losing an Online connection until the next Online (current outage included)."""
+        current = self._clock() - self._down_since if self._down_since is not None else 0.0
+        return self._down_total + current
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "outages": self.outages,
+            "disconnectedSec": round(self.disconnected_sec(), 3),
+            "lastOutageSec": round(self.last_outage_sec, 3),
+        }
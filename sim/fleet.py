@@ -0,0 +1,254 @@
+"""
+Fleet load generator: many virtual chargers (SimStation) in one event loop,
+optionally sharded over several processes.
+
+    python -m sim.fleet --count 5000 --ramp 100 --processes 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from ocpp_common.codec import install as install_codec
+from ocpp_common.logs import configure_logging
+
+from .config import *
+from .outbox import Outbox
+from .state_machine import EVSEState
+from .station import SimStation
+
+
+class Fleet:
+    """
+    Runs ``stations`` with a connect ramp and random session churn.
+
+    Each connector starts a session on average ``sessions_per_hour`` times an
+    hour (exponential inter-arrival) and charges for ``session_sec`` on
+    average, so the offered load stays steady instead of arriving in waves.
+    """
+
+    def __init__(
+        self,
+        stations: List[SimStation],
+        ramp_per_sec: float = FLEET_RAMP_PER_SEC,
+        sessions_per_hour: float = FLEET_SESSIONS_PER_HOUR,
+        session_sec: float = FLEET_SESSION_SEC,
+        report_sec: float = FLEET_REPORT_SEC,
+        label: str = "fleet",
+    ):
+        self.stations = stations
+        self.ramp_per_sec = ramp_per_sec
+        self.sessions_per_hour = sessions_per_hour
+        self.session_sec = session_sec
+        self.report_sec = report_sec
+        self.label = label
+        self.sessions_started = 0
+        self.sessions_stopped = 0
+        self.session_errors = 0
+        self._tasks: List[asyncio.Task] = []
+        self._started = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "stations": len(self.stations),
+            "connected": sum(1 for s in self.stations if s.connected),
+            "online": sum(1 for s in self.stations if s.online),
+            "connects": sum(s.connects for s in self.stations),
+            "reconnects": sum(s.link.reconnects for s in self.stations),
+            "disconnectedSec": round(sum(s.link.disconnected_sec() for s in self.stations), 1),
+            "errors": sum(s.errors for s in self.stations),
+            "bootRetries": sum(s.boot_retries for s in self.stations),
+            "buffered": sum(s.buffered for s in self.stations),
+            "replayed": sum(s.replayed for s in self.stations),
+            "sessionsActive": sum(
+                1 for s in self.stations for c in s.model.connectors.values() if c.session_active
+            ),
+            "sessionsStarted": self.sessions_started,
+            "sessionsStopped": self.sessions_stopped,
+            "sessionErrors": self.session_errors,
+        }
+
+    async def run(self, duration: Optional[float] = None) -> Dict[str, float]:
+        """Run until cancelled (or for ``duration`` seconds) and return the final stats."""
+        self._started = time.monotonic()
+        if self.report_sec > 0:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+        self._tasks.append(asyncio.create_task(self._ramp_up()))
+        try:
+            if duration is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            for t in self._tasks:
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+        return self.stats()
+
+    async def _ramp_up(self) -> None:
+        delay = 1.0 / self.ramp_per_sec if self.ramp_per_sec > 0 else 0.0
+        for i, station in enumerate(self.stations):
+            self._tasks.append(asyncio.create_task(station.run()))
+            if self.sessions_per_hour > 0:
+                for cid in station.model.connectors:
+                    self._tasks.append(asyncio.create_task(self._churn(station, cid)))
+            if delay:
+                # นับเวลาจากจุดเริ่ม ไม่สะสม drift ของ sleep แต่ละรอบ
+                wait = self._started + (i + 1) * delay - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+    async def _churn(self, station: SimStation, connector_id: int) -> None:
+        rate = self.sessions_per_hour / 3600.0
+        c = station.model.get(connector_id)
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if not station.online or c.session_active or c.state != EVSEState.AVAILABLE:
+                continue
+            try:
+                c.plugged = True
+                c.state = EVSEState.PREPARING
+                await station.send_status(connector_id)
+                await station.start_local(connector_id, f"{station.cpid}-{connector_id}")
+                self.sessions_started += 1
+                await asyncio.sleep(random.expovariate(1.0 / self.session_sec))
+                if c.tx_id is not None:
+                    await station.stop_local_by_tx(c.tx_id)
+                    self.sessions_stopped += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.session_errors += 1
+                station.log.debug("session churn failed: %s", e, extra={"action": "churn"})
+                if c.tx_id is not None:
+                    station.model.clear_tx(c.tx_id)
+                c.session_active = False
+                c.id_tag = None
+                c.state = EVSEState.AVAILABLE
+            finally:
+                c.plugged = False
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_sec)
+            s = self.stats()
+            logging.warning(
+                "[%s] connected=%s/%s online=%s connects=%s reconnects=%s disconnectedSec=%s errors=%s "
+                "bootRetries=%s buffered=%s replayed=%s active=%s started=%s stopped=%s",
+                self.label, s["connected"], s["stations"], s["online"], s["connects"], s["reconnects"],
+                s["disconnectedSec"], s["errors"], s["bootRetries"], s["buffered"], s["replayed"],
+                s["sessionsActive"], s["sessionsStarted"], s["sessionsStopped"],
+            )
+
+
+def build_stations(
+    count: int,
+    prefix: str = FLEET_CPID_PREFIX,
+    csms_url: str = CSMS_URL,
+    connectors: int = CONNECTORS,
+    heartbeat_sec: float = SEND_HEARTBEAT_SEC,
+    meter_period_sec: float = METER_PERIOD_SEC,
+    shard: int = 0,
+    shards: int = 1,
+    outbox: Optional[Outbox] = None,
+) -> List[SimStation]:
+    """Stations ``prefix00001``.. of one shard (index % shards == shard)."""
+    width = max(5, len(str(count)))
+    return [
+        SimStation(
+            f"{prefix}{i:0{width}d}",
+            csms_url,
+            connectors=connectors,
+            heartbeat_sec=heartbeat_sec,
+            meter_period_sec=meter_period_sec,
+            outbox=outbox,
+        )
+        for i in range(1 + shard, count + 1, shards)
+    ]
+
+
+def _raise_fd_limit() -> None:
+    # 1 socket ต่อตู้: ขยาย soft limit ของ file descriptor ให้เท่า hard limit
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _run_shard(args: argparse.Namespace, shard: int) -> None:
+    configure_logging(args.log_level, LOG_FORMAT, LOG_SAMPLE, LOG_QUEUE, LOG_QUEUE_MAX)
+    install_codec(OCPP_CODEC)
+    _raise_fd_limit()
+    path = args.outbox
+    if path and args.processes > 1:
+        # ไฟล์ละ shard: process ไม่ต้องแย่ง lock ของ SQLite กัน
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{shard}{ext}"
+    outbox = Outbox(path, SIM_OUTBOX_MAX)
+    stations = build_stations(
+        args.count, args.prefix, args.url, args.connectors,
+        args.heartbeat, args.meter_period, shard, args.processes, outbox,
+    )
+    fleet = Fleet(
+        stations,
+        ramp_per_sec=args.ramp / args.processes,
+        sessions_per_hour=args.sessions_per_hour,
+        session_sec=args.session_sec,
+        report_sec=args.report,
+        label=f"shard {shard}" if args.processes > 1 else "fleet",
+    )
+    try:
+        stats = asyncio.run(fleet.run(args.duration))
+    except KeyboardInterrupt:
+        return
+    finally:
+        outbox.close()
+    logging.warning("[%s] final: %s", fleet.label, stats)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Run a fleet of simulated OCPP 1.6 chargers")
+    p.add_argument("--count", type=int, default=FLEET_SIZE, help="number of chargers")
+    p.add_argument("--url", default=CSMS_URL, help="CSMS base URL (cpid is appended)")
+    p.add_argument("--prefix", default=FLEET_CPID_PREFIX, help="cpid prefix")
+    p.add_argument("--connectors", type=int, default=CONNECTORS)
+    p.add_argument("--ramp", type=float, default=FLEET_RAMP_PER_SEC, help="new connections per second (0 = all at once)")
+    p.add_argument("--heartbeat", type=float, default=SEND_HEARTBEAT_SEC, help="heartbeat period (s) until the CSMS sets one in BootNotification.conf")
+    p.add_argument("--meter-period", type=float, default=METER_PERIOD_SEC, help="MeterValues period (s)")
+    p.add_argument("--sessions-per-hour", type=float, default=FLEET_SESSIONS_PER_HOUR, help="per connector (0 = no sessions)")
+    p.add_argument("--session-sec", type=float, default=FLEET_SESSION_SEC, help="mean session length (s)")
+    p.add_argument("--processes", type=int, default=FLEET_PROCESSES, help="shard the fleet over N processes")
+    p.add_argument("--duration", type=float, default=None, help="stop after N seconds")
+    p.add_argument("--report", type=float, default=FLEET_REPORT_SEC, help="stats period (s, 0 = off)")
+    p.add_argument("--outbox", default=SIM_OUTBOX_PATH, help="SQLite file for messages queued while offline (empty = in memory)")
+    p.add_argument("--log-level", default="WARNING")
+    args = p.parse_args(argv)
+    args.processes = max(1, min(args.processes, args.count))
+
+    if args.processes == 1:
+        _run_shard(args, 0)
+        return
+    procs = [
+        multiprocessing.Process(target=_run_shard, args=(args, shard), name=f"fleet-{shard}")
+        for shard in range(args.processes)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join()
+
+
+if __name__ == "__main__":
+    main()
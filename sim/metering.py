@@ -0,0 +1,279 @@
+import array
+import asyncio
+import logging
+import math
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: ไม่มี numpy ก็สร้าง noise ทีละก้อนด้วย array ของ stdlib
+    np = None
+
+from ocpp.v16 import call
+
+from .state_machine import ConnectorSim, EVSEState
+
+# (unit, location, format string) ของ measurand ที่ตู้จำลองวัดได้
+MEASURANDS: Dict[str, Tuple[str, str, str]] = {
+    "Energy.Active.Import.Register": ("kWh", "Body", "{:.3f}"),
+    "Current.Import": ("A", "Body", "{:.2f}"),
+    "Voltage": ("V", "Body", "{:.1f}"),
+    "Power.Active.Import": ("kW", "Body", "{:.1f}"),
+    "SoC": ("Percent", "EV", "{:.0f}"),
+    "Temperature": ("Celsius", "Outlet", "{:.1f}"),
+    "Power.Offered": ("kW", "Body", "{:.1f}"),
+}
+
+# ไม่นับพลังงานช่วงที่รถหรือตู้พักการชาร์จ
+_NOT_CHARGING = (EVSEState.SUSPENDED_EV, EVSEState.SUSPENDED_EVSE)
+
+
+class NoisePool:
+    """
+    Uniform noise in [-1, 1) generated ``size`` values at a time (one numpy
+    call, or one ``randbytes`` + ``array('H')`` without numpy) instead of a
+    ``random.uniform`` call per measurand and sample. One pool is shared by
+    every connector of a process.
+    """
+
+    def __init__(self, size: int = 65536, seed: Optional[int] = None):
+        self.size = size
+        self._rng = random.Random(seed)
+        self._np = np.random.default_rng(seed) if np is not None else None
+        self._block: List[float] = []
+        self._pos = 0
+
+    def _refill(self) -> None:
+        if self._np is not None:
+            self._block = self._np.uniform(-1.0, 1.0, self.size).tolist()
+        else:
+            raw = array.array("H", self._rng.randbytes(2 * self.size))
+            scale = 2.0 / 65536
+            self._block = [v * scale - 1.0 for v in raw]
+        self._pos = 0
+
+    def take(self, n: int) -> List[float]:
+        if self._pos + n > len(self._block):
+            self._refill()
+        pos, self._pos = self._pos, self._pos + n
+        return self._block[pos:pos + n]
+
+
+noise = NoisePool()
+
+
+def measurands(value: str) -> List[str]:
+    """``MeterValuesSampledData`` / ``MeterValuesAlignedData`` -> measurands this simulator knows."""
+    return [m for m in (part.strip() for part in value.split(",")) if m in MEASURANDS]
+
+
+def interval(value: Any) -> float:
+    """Configuration interval in seconds; missing/invalid = 0 (disabled)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Metering:
+    """
+    MeterValues of one station. Every connector has its own tasks, so a slow
+    CSMS answer for one connector never delays another:
+
+    - ``Sample.Periodic`` every ``MeterValueSampleInterval`` seconds while a
+      transaction runs, counted from the start of the transaction;
+    - ``Sample.Clock`` at wall-clock multiples of ``ClockAlignedDataInterval``
+      (e.g. :00, :15, ... for 900), whether charging or not.
+
+    Deadlines are ``anchor + k * interval``: time spent sending is not added
+    to the next sleep, and ticks missed while a send was stuck are skipped
+    instead of sent in a burst. Energy is integrated from elapsed time, so
+    the register does not depend on the interval. With a ``Vehicle`` on the
+    connector the power follows its SoC curve, capped by ``offered_w(c)``
+    (charger rating and charging profile), and ``on_full(c)`` is called
+    once the battery is full. ``configuration`` is the
+    station's configuration (shared with ``ChangeConfiguration``); call
+    ``reconfigure()`` after a change.
+    """
+
+    def __init__(
+        self,
+        model,
+        send: Callable[[Any], Awaitable[Any]],
+        configuration: Dict[str, str],
+        offered_w: Callable[[ConnectorSim], float],
+        log: Optional[logging.LoggerAdapter] = None,
+        noise_pool: Optional[NoisePool] = None,
+        wall_clock: Callable[[], float] = time.time,
+        on_full: Optional[Callable[[ConnectorSim], None]] = None,
+    ):
+        self.model = model
+        self.send = send
+        self.configuration = configuration
+        self.offered_w = offered_w
+        self.on_full = on_full
+        self.log = log or logging.getLogger("sim")
+        self.noise = noise_pool or noise
+        self._wall_clock = wall_clock
+        self._sampled: Dict[int, asyncio.Task] = {}
+        self._aligned: Dict[int, asyncio.Task] = {}
+        self._last: Dict[int, float] = {}  # loop.time() ที่นับพลังงานล่าสุด
+        self._residual_wh: Dict[int, float] = {}  # เศษ Wh ที่ยังไม่ถึง 1 Wh
+        self.sent = 0
+        self.skipped = 0  # tick ที่ข้ามเพราะการส่งก่อนหน้าช้ากว่า interval
+
+    @property
+    def sample_interval(self) -> float:
+        return interval(self.configuration.get("MeterValueSampleInterval"))
+
+    @property
+    def aligned_interval(self) -> float:
+        return interval(self.configuration.get("ClockAlignedDataInterval"))
+
+    # -------- tasks --------
+    def start(self) -> None:
+        """Start the clock-aligned tasks and the sampled tasks of running transactions."""
+        for cid, c in self.model.connectors.items():
+            if self.aligned_interval and cid not in self._aligned:
+                self._aligned[cid] = asyncio.create_task(self._aligned_loop(c))
+            if c.session_active:
+                self.transaction_started(cid)
+
+    def transaction_started(self, connector_id: int) -> None:
+        """Energy counts from now; the sampled task (re)starts anchored at now."""
+        c = self.model.get(connector_id)
+        self._last[connector_id] = asyncio.get_running_loop().time()
+        self._residual_wh[connector_id] = 0.0
+        task = self._sampled.pop(connector_id, None)
+        if task is not None:
+            task.cancel()
+        if self.sample_interval:
+            self._sampled[connector_id] = asyncio.create_task(self._sampled_loop(c))
+
+    def reconfigure(self) -> None:
+        """Interval changed: restart every task with the new values (anchors restart now)."""
+        for task in (*self._sampled.values(), *self._aligned.values()):
+            task.cancel()
+        self._sampled.clear()
+        self._aligned.clear()
+        self.start()
+
+    async def close(self) -> None:
+        tasks = [*self._sampled.values(), *self._aligned.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sampled.clear()
+        self._aligned.clear()
+
+    async def _sampled_loop(self, c: ConnectorSim) -> None:
+        loop = asyncio.get_running_loop()
+        every = self.sample_interval
+        anchor = loop.time()
+        tick = 1
+        while c.session_active:
+            delay = anchor + tick * every - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not c.session_active:
+                break
+            await self.send_sample(c, "Sample.Periodic", "MeterValuesSampledData")
+            # นัดถัดไปนับจาก anchor: ถ้าส่งช้าเกินหนึ่งรอบ ข้ามรอบที่เลยมาแล้ว
+            due = int((loop.time() - anchor) / every) + 1
+            self.skipped += max(0, due - tick - 1)
+            tick = max(tick + 1, due)
+        self._last.pop(c.id, None)
+        self._residual_wh.pop(c.id, None)
+
+    async def _aligned_loop(self, c: ConnectorSim) -> None:
+        every = self.aligned_interval
+        while True:
+            now = self._wall_clock()
+            at = (math.floor(now / every) + 1) * every
+            await asyncio.sleep(at - now)
+            await self.send_sample(c, "Sample.Clock", "MeterValuesAlignedData", timestamp=at)
+
+    # -------- values --------
+    def advance(self, c: ConnectorSim) -> None:
+        """Add the energy charged since the last call to ``c.meter_wh``."""
+        if not c.session_active:
+            return
+        now = asyncio.get_running_loop().time()
+        last = self._last.get(c.id, now)
+        self._last[c.id] = now
+        if c.state in _NOT_CHARGING:
+            return
+        if c.vehicle is not None:
+            wh = c.vehicle.charge(self.offered_w(c), now - last)
+            if c.vehicle.full and self.on_full is not None:
+                self.on_full(c)
+        else:
+            wh = self.offered_w(c) * (now - last) / 3600
+        wh += self._residual_wh.get(c.id, 0.0)
+        whole = int(wh)
+        c.meter_wh += whole
+        self._residual_wh[c.id] = wh - whole
+
+    def sample(self, c: ConnectorSim, context: str, names: List[str]) -> List[Dict[str, str]]:
+        """One ``sampledValue`` list for ``c``; four noise values per sample from the shared pool."""
+        self.advance(c)
+        offered_w = self.offered_w(c)
+        charging = c.session_active and c.state not in _NOT_CHARGING
+        ev = c.vehicle
+        di, dv, dp, dt = self.noise.take(4)
+        if ev is not None:
+            # DC: แรงดันของแบตเตอรี่, กำลังตามที่รถรับได้จริง
+            voltage_v = ev.voltage_v + dv
+            power_w = max(0.0, ev.power_w * (1.0 + 0.005 * dp)) if charging else 0.0
+            soc, temp_c = ev.soc * 100, ev.temperature_c + 0.5 * dt
+        else:
+            voltage_v = 230.0 + dv
+            power_w = max(0.0, offered_w + 100.0 * dp) if charging else 0.0
+            soc, temp_c = 0.0, 28.0 + 0.5 * dt
+        values = {
+            "Energy.Active.Import.Register": c.meter_wh / 1000,
+            "Current.Import": max(0.0, power_w / voltage_v + di) if power_w else 0.0,
+            "Voltage": voltage_v,
+            "Power.Active.Import": power_w / 1000,
+            "SoC": soc,
+            "Temperature": temp_c,
+            "Power.Offered": offered_w / 1000,
+        }
+        out = []
+        for name in names:
+            unit, location, fmt = MEASURANDS[name]
+            out.append({
+                "value": fmt.format(values[name]),
+                "context": context,
+                "format": "Raw",
+                "measurand": name,
+                "location": location,
+                "unit": unit,
+            })
+        return out
+
+    async def send_sample(self, c: ConnectorSim, context: str, key: str, timestamp: Optional[float] = None) -> None:
+        names = measurands(self.configuration.get(key, ""))
+        if not names:
+            return
+        ts = datetime.fromtimestamp(timestamp if timestamp is not None else self._wall_clock(), timezone.utc)
+        sampled = self.sample(c, context, names)
+        req = call.MeterValuesPayload(
+            connector_id=c.id,
+            meter_value=[{"timestamp": ts.isoformat(), "sampledValue": sampled}],
+            transaction_id=c.tx_id if c.session_active else None,
+        )
+        try:
+            await self.send(req)
+        except Exception as e:
+            # ไม่มี outbox และต่อ CSMS ไม่ได้: ค่านี้หายไป แต่มิเตอร์เดินต่อ
+            self.log.debug("MeterValues not sent: %s", e, extra={"action": "MeterValues"})
+            return
+        self.sent += 1
+        self.log.info(
+            "MeterValues: cid=%s, context=%s, energy(kWh)=%.3f", c.id, context, c.meter_wh / 1000,
+            extra={"action": "MeterValues"},
+        )
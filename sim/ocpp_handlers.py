@@ -5,19 +5,95 @@ from ocpp.routing import on
 from ocpp.v16 import call_result, ChargePoint as CP
 from ocpp.v16.enums import (
     AuthorizationStatus,
+    ChargingProfileStatus,
+    ClearChargingProfileStatus,
+    ConfigurationStatus,
     RegistrationStatus,
     Action,
     RemoteStartStopStatus,
     DataTransferStatus,
+    UpdateStatus,
+    UpdateType,
 )
 
-class EVSEChargePoint(CP):
-    def __init__(self, id, connection, model, send_status_cb, start_cb, stop_cb):
+from ocpp_common.codec import ValidationBypass, parse_actions
+
+from .config import OCPP_SKIP_VALIDATION
+from .vehicle import ChargingLimit
+
+# ค่า configuration ที่ตู้ (Gresgying) รายงานใน GetConfiguration; ค่าที่ถูกเปลี่ยนด้วย
+# ChangeConfiguration เก็บใน SimStation.configuration ทับค่าเหล่านี้
+DEFAULT_CONFIGURATION = [
+    {"key": "AuthorizeRemoteTxRequests", "readonly": False, "value": "false"},
+    {"key": "AuthorizationCacheEnabled", "readonly": False, "value": "false"},
+    {"key": "LocalAuthListEnabled", "readonly": False, "value": "true"},
+    {"key": "LocalAuthListMaxLength", "readonly": True, "value": "100"},
+    {"key": "ClockAlignedDataInterval", "readonly": False, "value": "1800"},
+    {"key": "ConnectionTimeOut", "readonly": False, "value": "60"},
+    {"key": "GetConfigurationMaxKeys", "readonly": True, "value": "100"},
+    {"key": "HeartbeatInterval", "readonly": False, "value": "300"},
+    {"key": "LocalAuthorizeOffline", "readonly": False, "value": "false"},
+    {"key": "LocalPreAuthorize", "readonly": False, "value": "false"},
+    {"key": "MeterValuesAlignedData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
+    {"key": "MeterValuesAlignedDataMaxLength", "readonly": True, "value": "6"},
+    {"key": "MeterValuesSampledData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature,Power.Offered"},
+    {"key": "MeterValuesSampledDataMaxLength", "readonly": True, "value": "7"},
+    {"key": "MeterValueSampleInterval", "readonly": False, "value": "60"},
+    {"key": "NumberOfConnectors", "readonly": True, "value": "2"},
+    {"key": "ReserveConnectorZeroSupported", "readonly": True, "value": "false"},
+    {"key": "ResetRetries", "readonly": False, "value": "120"},
+    {"key": "ConnectorPhaseRotation", "readonly": False, "value": "NotApplicable"},
+    {"key": "ConnectorPhaseRotationMaxLength", "readonly": True, "value": "1"},
+    {"key": "StopTransactionOnEVSideDisconnect", "readonly": True, "value": "true"},
+    {"key": "AllowOfflineTxForUnknownId", "readonly": False, "value": "false"},
+    {"key": "StopTransactionOnInvalidId", "readonly": False, "value": "false"},
+    {"key": "StopTxnAlignedData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
+    {"key": "StopTxnAlignedDataMaxLength", "readonly": True, "value": "6"},
+    {"key": "StopTxnSampledData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
+    {"key": "StopTxnSampledDataMaxLength", "readonly": True, "value": "6"},
+    {"key": "SupportedFeatureProfiles", "readonly": True, "value": "Core,FirmwareManagement,LocalAuthListManagement,Reservation,SmartCharging,RemoteTrigger"},
+    {"key": "SupportedFeatureProfilesMaxLength", "readonly": True, "value": "6"},
+    {"key": "TransactionMessageAttempts", "readonly": False, "value": "3"},
+    {"key": "TransactionMessageRetryInterval", "readonly": False, "value": "60"},
+    {"key": "UnlockConnectorOnEVSideDisconnect", "readonly": False, "value": "true"},
+    {"key": "MaxEnergyOnInvalidId", "readonly": False, "value": "10"},
+    {"key": "VendorInfo", "readonly": True, "value": "Gresgying"},
+    {"key": "WebSocketPingInterval", "readonly": False, "value": "10"},
+    {"key": "ChargeProfileMaxStackLevel", "readonly": True, "value": "20"},
+    {"key": "ChargingScheduleAllowedChargingRateUnit", "readonly": True, "value": "Current,Power"},
+    {"key": "ChargingScheduleMaxPeriods", "readonly": True, "value": "24"},
+    {"key": "MaxChargingProfilesInstalled", "readonly": True, "value": "1"},
+    {"key": "OcppUrl", "readonly": False, "value": "ws://45.136.236.186:9000/ocpp/Gresgying02"},
+    {"key": "Rate", "readonly": False, "value": "0"},
+    {"key": "Monetaryunit", "readonly": False, "value": "€"},
+    {"key": "AutoCharge", "readonly": False, "value": "true"},
+    {"key": "QRcodeConnectorID1", "readonly": False, "value": ""},
+    {"key": "QRcodeConnectorID2", "readonly": False, "value": ""},
+]
+_CONFIGURATION_BY_KEY = {item["key"]: item for item in DEFAULT_CONFIGURATION}
+
+
+def default_configuration(key: str) -> str:
+    return _CONFIGURATION_BY_KEY[key]["value"]
+
+
+class EVSEChargePoint(ValidationBypass, CP):
+    # ไม่ตรวจ schema ของ action ที่ส่งบ่อย (Heartbeat, MeterValues) เมื่อกำหนด OCPP_SKIP_VALIDATION
+    skip_validation = parse_actions(OCPP_SKIP_VALIDATION)
+
+    def __init__(
+        self, id, connection, model, send_status_cb, start_cb, stop_cb, configuration=None, config_cb=None, local_list=None
+    ):
         super().__init__(id, connection)
         self.model = model
         self.send_status = send_status_cb
         self.on_start_local = start_cb
         self.on_stop_local = stop_cb
+        # ค่าที่เปลี่ยนแล้ว (ของตู้ ไม่ใช่ของการเชื่อมต่อ จึงส่งมาจาก SimStation)
+        self.configuration = configuration if configuration is not None else {}
+        self.on_config_changed = config_cb
+        # local authorization list ของตู้: {"version": int, "tags": {idTag: idTagInfo}}
+        self.local_list = local_list if local_list is not None else {"version": 0, "tags": {}}
 
     # ====== CSMS -> EVSE ======
 
@@ -85,51 +161,7 @@ class EVSEChargePoint(CP):
     @on(Action.GetConfiguration)
     async def on_get_configuration(self, key: list | None = None, **kwargs):
         config = [
-            {"key": "AuthorizeRemoteTxRequests", "readonly": False, "value": "false"},
-            {"key": "AuthorizationCacheEnabled", "readonly": False, "value": "false"},
-            {"key": "LocalAuthListEnabled", "readonly": False, "value": "true"},
-            {"key": "LocalAuthListMaxLength", "readonly": True, "value": "100"},
-            {"key": "ClockAlignedDataInterval", "readonly": False, "value": "1800"},
-            {"key": "ConnectionTimeOut", "readonly": False, "value": "60"},
-            {"key": "GetConfigurationMaxKeys", "readonly": True, "value": "100"},
-            {"key": "HeartbeatInterval", "readonly": False, "value": "300"},
-            {"key": "LocalAuthorizeOffline", "readonly": False, "value": "false"},
-            {"key": "LocalPreAuthorize", "readonly": False, "value": "false"},
-            {"key": "MeterValuesAlignedData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
-            {"key": "MeterValuesAlignedDataMaxLength", "readonly": True, "value": "6"},
-            {"key": "MeterValuesSampledData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature,Power.Offered"},
-            {"key": "MeterValuesSampledDataMaxLength", "readonly": True, "value": "7"},
-            {"key": "MeterValueSampleInterval", "readonly": False, "value": "60"},
-            {"key": "NumberOfConnectors", "readonly": True, "value": "2"},
-            {"key": "ReserveConnectorZeroSupported", "readonly": True, "value": "false"},
-            {"key": "ResetRetries", "readonly": False, "value": "120"},
-            {"key": "ConnectorPhaseRotation", "readonly": False, "value": "NotApplicable"},
-            {"key": "ConnectorPhaseRotationMaxLength", "readonly": True, "value": "1"},
-            {"key": "StopTransactionOnEVSideDisconnect", "readonly": True, "value": "true"},
-            {"key": "AllowOfflineTxForUnknownId", "readonly": False, "value": "false"},
-            {"key": "StopTransactionOnInvalidId", "readonly": False, "value": "false"},
-            {"key": "StopTxnAlignedData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
-            {"key": "StopTxnAlignedDataMaxLength", "readonly": True, "value": "6"},
-            {"key": "StopTxnSampledData", "readonly": False, "value": "Energy.Active.Import.Register,Current.Import,Voltage,Power.Active.Import,SoC,Temperature"},
-            {"key": "StopTxnSampledDataMaxLength", "readonly": True, "value": "6"},
-            {"key": "SupportedFeatureProfiles", "readonly": True, "value": "Core,FirmwareManagement,LocalAuthListManagement,Reservation,SmartCharging,RemoteTrigger"},
-            {"key": "SupportedFeatureProfilesMaxLength", "readonly": True, "value": "6"},
-            {"key": "TransactionMessageAttempts", "readonly": False, "value": "3"},
-            {"key": "TransactionMessageRetryInterval", "readonly": False, "value": "60"},
-            {"key": "UnlockConnectorOnEVSideDisconnect", "readonly": False, "value": "true"},
-            {"key": "MaxEnergyOnInvalidId", "readonly": False, "value": "10"},
-            {"key": "VendorInfo", "readonly": True, "value": "Gresgying"},
-            {"key": "WebSocketPingInterval", "readonly": False, "value": "10"},
-            {"key": "ChargeProfileMaxStackLevel", "readonly": True, "value": "20"},
-            {"key": "ChargingScheduleAllowedChargingRateUnit", "readonly": True, "value": "Current,Power"},
-            {"key": "ChargingScheduleMaxPeriods", "readonly": True, "value": "24"},
-            {"key": "MaxChargingProfilesInstalled", "readonly": True, "value": "1"},
-            {"key": "OcppUrl", "readonly": False, "value": "ws://45.136.236.186:9000/ocpp/Gresgying02"},
-            {"key": "Rate", "readonly": False, "value": "0"},
-            {"key": "Monetaryunit", "readonly": False, "value": "€"},
-            {"key": "AutoCharge", "readonly": False, "value": "true"},
-            {"key": "QRcodeConnectorID1", "readonly": False, "value": ""},
-            {"key": "QRcodeConnectorID2", "readonly": False, "value": ""},
+            dict(item, value=self.configuration.get(item["key"], item["value"])) for item in DEFAULT_CONFIGURATION
         ]
         if key:
             requested = set(key if isinstance(key, list) else [key])
@@ -141,6 +173,66 @@ class EVSEChargePoint(CP):
             )
         return call_result.GetConfigurationPayload(configuration_key=config)
 
+    @on(Action.ChangeConfiguration)
+    async def on_change_configuration(self, key, value, **kwargs):
+        item = _CONFIGURATION_BY_KEY.get(key)
+        if item is None:
+            return call_result.ChangeConfigurationPayload(status=ConfigurationStatus.not_supported)
+        # ค่า *Interval ต้องเป็นจำนวนเต็มวินาที >= 0
+        if item["readonly"] or (key.endswith("Interval") and not value.isdigit()):
+            return call_result.ChangeConfigurationPayload(status=ConfigurationStatus.rejected)
+        self.configuration[key] = value
+        if self.on_config_changed is not None:
+            self.on_config_changed(key)
+        return call_result.ChangeConfigurationPayload(status=ConfigurationStatus.accepted)
+
+    @on(Action.GetLocalListVersion)
+    async def on_get_local_list_version(self, **kwargs):
+        return call_result.GetLocalListVersionPayload(list_version=self.local_list["version"])
+
+    @on(Action.SendLocalList)
+    async def on_send_local_list(self, list_version, update_type, local_authorization_list=None, **kwargs):
+        if update_type == UpdateType.differential and list_version <= self.local_list["version"]:
+            return call_result.SendLocalListPayload(status=UpdateStatus.version_mismatch)
+        tags = {} if update_type == UpdateType.full else dict(self.local_list["tags"])
+        for entry in local_authorization_list or []:
+            if entry.get("id_tag_info"):
+                tags[entry["id_tag"]] = entry["id_tag_info"]
+            else:
+                tags.pop(entry["id_tag"], None)  # Differential: ไม่มี idTagInfo = ลบ
+        if len(tags) > int(default_configuration("LocalAuthListMaxLength")):
+            return call_result.SendLocalListPayload(status=UpdateStatus.failed)
+        self.local_list.update(version=list_version, tags=tags)
+        return call_result.SendLocalListPayload(status=UpdateStatus.accepted)
+
+    @on(Action.SetChargingProfile)
+    async def on_set_charging_profile(self, connector_id, cs_charging_profiles, **kwargs):
+        # MaxChargingProfilesInstalled = 1: โปรไฟล์ใหม่แทนของเดิม; connector 0 = ทุก connector
+        if connector_id != 0 and connector_id not in self.model.connectors:
+            return call_result.SetChargingProfilePayload(status=ChargingProfileStatus.rejected)
+        if cs_charging_profiles["charging_profile_purpose"] == "TxProfile" and (
+            connector_id == 0 or not self.model.get(connector_id).session_active
+        ):
+            return call_result.SetChargingProfilePayload(status=ChargingProfileStatus.rejected)
+        limit = ChargingLimit.from_profile(cs_charging_profiles)
+        targets = self.model.connectors.values() if connector_id == 0 else [self.model.get(connector_id)]
+        for c in targets:
+            c.charging_limit = limit
+        return call_result.SetChargingProfilePayload(status=ChargingProfileStatus.accepted)
+
+    @on(Action.ClearChargingProfile)
+    async def on_clear_charging_profile(self, connector_id=None, charging_profile_purpose=None, **kwargs):
+        cleared = False
+        for cid, c in self.model.connectors.items():
+            if c.charging_limit is None or connector_id not in (None, 0, cid):
+                continue
+            if charging_profile_purpose not in (None, c.charging_limit.purpose):
+                continue
+            c.charging_limit = None
+            cleared = True
+        status = ClearChargingProfileStatus.accepted if cleared else ClearChargingProfileStatus.unknown
+        return call_result.ClearChargingProfilePayload(status=status)
+
     @on(Action.DataTransfer)
     async def on_data_transfer(self, vendor_id, **kwargs):
         return call_result.DataTransferPayload(status=DataTransferStatus.unknown_vendor_id)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ocpp.charge_point import remove_nones
+from ocpp.v16 import call
+
+# action ที่ตู้จริงเก็บไว้ส่งใหม่เมื่อต่อ CSMS ไม่ได้ (TransactionMessageAttempts)
+BUFFERED_ACTIONS = ("MeterValues", "StopTransaction")
+
+Row = Tuple[int, str, Dict[str, Any]]  # (seq, action, snake_case kwargs of the payload)
+
+
+def _action(payload: Any) -> str:
+    return payload.__class__.__name__[:-7]
+
+
+def batches(rows: List[Row], max_meter_values: int) -> List[Tuple[List[int], Any]]:
+    """
+    Rows -> [(seqs, call payload)], in order. Consecutive MeterValues of the
+    same connector and transaction are merged into one MeterValues with up
+    to ``max_meter_values`` entries, so a long outage drains in a few CALLs.
+    """
+    out: List[Tuple[List[int], Any]] = []
+    merged: Optional[Tuple[List[int], Dict[str, Any]]] = None
+    for seq, action, kwargs in rows:
+        if action == "MeterValues":
+            key = (kwargs.get("connector_id"), kwargs.get("transaction_id"))
+            if (
+                merged is not None
+                and (merged[1].get("connector_id"), merged[1].get("transaction_id")) == key
+                and len(merged[1]["meter_value"]) + len(kwargs["meter_value"]) <= max_meter_values
+            ):
+                merged[0].append(seq)
+                merged[1]["meter_value"] = merged[1]["meter_value"] + kwargs["meter_value"]
+                continue
+            if merged is not None:
+                out.append((merged[0], call.MeterValuesPayload(**merged[1])))
+            merged = ([seq], dict(kwargs))
+            continue
+        if merged is not None:
+            out.append((merged[0], call.MeterValuesPayload(**merged[1])))
+            merged = None
+        out.append(([seq], getattr(call, action + "Payload")(**kwargs)))
+    if merged is not None:
+        out.append((merged[0], call.MeterValuesPayload(**merged[1])))
+    return out
+
+
+class Outbox:
+    """
+    Transaction messages a simulated charger could not deliver, kept in
+    SQLite (one table for all stations of a process, rows per cpid) and
+    replayed in order after the next BootNotification. Bounded per charger:
+    when full, the oldest MeterValues is dropped first, a StopTransaction
+    only when nothing else is left. ``path`` empty = in memory (survives
+    reconnects, not a restart).
+
+    ``put`` does not touch SQLite: rows are written in the background, many
+    puts per transaction, in a worker thread (``flush``); ``peek``/``ack``
+    also run off the event loop. WAL with ``synchronous=NORMAL``: no fsync
+    per commit, a crash of the process loses nothing (a power cut may lose
+    the last commits).
+    """
+
+    def __init__(self, path: Optional[str] = None, max_per_cp: int = 10000):
+        self.path = path or ":memory:"
+        self.max_per_cp = max_per_cp
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                cpid TEXT NOT NULL,
+                action TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                queued_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_cpid ON outbox (cpid, seq);
+            """
+        )
+        # จำนวนที่ค้างต่อ cpid เก็บไว้ใน memory: ทางปกติ (ไม่มีอะไรค้าง) ไม่ต้อง query
+        self._pending: Dict[str, int] = dict(
+            self._db.execute("SELECT cpid, COUNT(*) FROM outbox GROUP BY cpid").fetchall()
+        )
+        # put ที่ยังไม่ได้เขียนลง SQLite และจำนวนที่ต้องทิ้งต่อ cpid (คิวเต็ม)
+        self._buffer: List[tuple] = []
+        self._drops: Dict[str, int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        # connection เดียว: ใช้ทีละคำสั่ง
+        self._db_lock = asyncio.Lock()
+        self.queued = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return sum(self._pending.values())
+
+    def pending(self, cpid: str) -> int:
+        return self._pending.get(cpid, 0)
+
+    def put(self, cpid: str, payload: Any) -> None:
+        """Append ``payload`` (a ``call.*Payload``) to the charger's queue."""
+        if self.pending(cpid) >= self.max_per_cp:
+            self._drops[cpid] = self._drops.get(cpid, 0) + 1
+            self.dropped += 1
+            logging.getLogger("sim").warning("outbox of %s full: dropped the oldest message", cpid)
+        else:
+            self._pending[cpid] = self.pending(cpid) + 1
+        self._buffer.append((cpid, _action(payload), json.dumps(remove_nones(asdict(payload))), time.time()))
+        self.queued += 1
+        if self._flusher is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._write(*self._take())  # ไม่มี event loop: เขียนเลย
+                return
+            self._flusher = loop.create_task(self._flush_soon())
+
+    def _take(self) -> Tuple[List[tuple], Dict[str, int]]:
+        rows, drops = self._buffer, self._drops
+        self._buffer, self._drops = [], {}
+        return rows, drops
+
+    def _write(self, rows: List[tuple], drops: Dict[str, int]) -> None:
+        with self._db:
+            self._db.executemany("INSERT INTO outbox (cpid, action, payload, queued_at) VALUES (?, ?, ?, ?)", rows)
+            for cpid, n in drops.items():
+                self._db.execute(
+                    "DELETE FROM outbox WHERE seq IN (SELECT seq FROM outbox WHERE cpid = ?"
+                    " ORDER BY action = 'MeterValues' DESC, seq LIMIT ?)",
+                    (cpid, n),
+                )
+
+    async def flush(self) -> None:
+        """Write every ``put`` so far to SQLite (one transaction per batch)."""
+        async with self._db_lock:
+            while self._buffer:
+                await asyncio.to_thread(self._write, *self._take())
+
+    async def _flush_soon(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            self._flusher = None
+
+    async def _run(self, fn, *args):
+        await self.flush()
+        async with self._db_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def peek(self, cpid: str, limit: int) -> List[Row]:
+        """The oldest ``limit`` messages of the charger, still queued until ``ack``."""
+        rows = await self._run(
+            lambda: self._db.execute(
+                "SELECT seq, action, payload FROM outbox WHERE cpid = ? ORDER BY seq LIMIT ?", (cpid, limit)
+            ).fetchall()
+        )
+        return [(seq, action, json.loads(payload)) for seq, action, payload in rows]
+
+    def _delete(self, seqs: List[int]) -> None:
+        with self._db:
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", [(s,) for s in seqs])
+
+    async def ack(self, cpid: str, seqs: List[int]) -> None:
+        """Delivered: remove from the queue."""
+        await self._run(self._delete, seqs)
+        left = self.pending(cpid) - len(seqs)
+        if left > 0:
+            self._pending[cpid] = left
+        else:
+            self._pending.pop(cpid, None)
+        self.replayed += len(seqs)
+
+    def close(self) -> None:
+        if self._buffer:
+            self._write(*self._take())
+        self._db.close()
@@ -22,6 +22,9 @@ class ConnectorSim:
         # keep track of the current OCPP error code so faults can be
         # injected and cleared via the HTTP API.
         self.error_code = "NoError"
+        # EV ที่เสียบอยู่ระหว่าง transaction (sim.vehicle.Vehicle) และ limit จาก SetChargingProfile
+        self.vehicle = None
+        self.charging_limit = None
 
     def to_status(self) -> str:
         # map internal -> OCPP status set
@@ -74,6 +77,10 @@ class EVSEModel:
         c = self.connectors[cid]
         c.tx_id = None
         c.session_active = False
+        c.vehicle = None
+        # TxProfile ใช้กับ transaction เดียว
+        if c.charging_limit is not None and c.charging_limit.purpose == "TxProfile":
+            c.charging_limit = None
         return c
 
     # ----- state / fault helpers -----
@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import ssl
+from datetime import datetime, timezone
+from typing import Optional
+
+import websockets
+
+from ocpp.v16 import call
+from ocpp.v16.enums import RegistrationStatus
+
+from ocpp_common.logs import ContextLogger
+
+from .config import *
+from .connection import Backoff, LinkMonitor, LinkState
+from .state_machine import EVSEModel, EVSEState
+from .metering import Metering
+from .ocpp_handlers import EVSEChargePoint, default_configuration
+from .outbox import Outbox, batches
+from .vehicle import Vehicle
+
+
+def build_ssl_context(url: str) -> Optional[ssl.SSLContext]:
+    """TLS context for wss:// URLs (CA / client certificate from config)."""
+    if not url.startswith("wss://"):
+        return None
+    ssl_context = ssl.create_default_context(cafile=TLS_CA_CERT) if TLS_CA_CERT else ssl.create_default_context()
+    if TLS_CLIENT_CERT and TLS_CLIENT_KEY:
+        ssl_context.load_cert_chain(TLS_CLIENT_CERT, TLS_CLIENT_KEY)
+    return ssl_context
+
+
+class SimStation:
+    """
+    One simulated charge point: its own EVSEModel, OCPP connection,
+    heartbeat loop and per-connector metering (``sim.metering``). ``sim.evse`` runs one of these behind the
+    HTTP control API; ``sim.fleet`` runs thousands in one event loop.
+
+    The connection goes Disconnected -> Connecting -> Booting -> Online
+    (``sim.connection.LinkState``); ``ready`` is set while Online, and
+    reconnects back off exponentially with decorrelated jitter.
+
+    ``configuration`` holds the values changed from the defaults of
+    ``GetConfiguration`` (MeterValueSampleInterval, ClockAlignedDataInterval,
+    ...); ChangeConfiguration updates it and reschedules metering.
+    Metering keeps running while the CSMS is unreachable. With an
+    ``outbox``, MeterValues and StopTransaction that cannot be sent are
+    queued there and replayed in order after the next accepted boot.
+    """
+
+    def __init__(
+        self,
+        cpid: str = CPID,
+        csms_url: str = CSMS_URL,
+        connectors: int = CONNECTORS,
+        meter_start_wh: int = METER_START_WH,
+        heartbeat_sec: float = SEND_HEARTBEAT_SEC,
+        meter_period_sec: float = METER_PERIOD_SEC,
+        clock_aligned_sec: float = CLOCK_ALIGNED_SEC,
+        meter_rate_w: float = METER_RATE_W,
+        reconnect_sec: float = SIM_RECONNECT_BASE_SEC,
+        reconnect_max_sec: float = SIM_RECONNECT_MAX_SEC,
+        outbox: Optional[Outbox] = None,
+        outbox_batch: int = SIM_OUTBOX_BATCH,
+    ):
+        self.cpid = cpid
+        self.csms_url = csms_url
+        self.heartbeat_sec = heartbeat_sec
+        self.meter_period_sec = meter_period_sec
+        self.meter_rate_w = meter_rate_w
+        self.reconnect_sec = reconnect_sec
+        self.model = EVSEModel(connectors=connectors, meter_start_wh=meter_start_wh)
+        self.cp: Optional[EVSEChargePoint] = None
+        self.log = ContextLogger(logging.getLogger("sim"), {"cpid": cpid})
+        self.configuration = {
+            "MeterValueSampleInterval": f"{meter_period_sec:g}",
+            "ClockAlignedDataInterval": f"{clock_aligned_sec:g}",
+            "HeartbeatInterval": f"{heartbeat_sec:g}",
+            "MeterValuesSampledData": default_configuration("MeterValuesSampledData"),
+            "MeterValuesAlignedData": default_configuration("MeterValuesAlignedData"),
+        }
+        # local authorization list ที่ CSMS ส่งมา (SendLocalList) อยู่ข้ามการเชื่อมต่อใหม่
+        self.local_list = {"version": 0, "tags": {}}
+        self.metering = Metering(
+            self.model, self.send_transaction_message, self.configuration, self.offered_w,
+            log=self.log, on_full=self.vehicle_full,
+        )
+        # สถานะการเชื่อมต่อ + ตัวนับ reconnect/เวลาที่หลุด; ready ถูก set เมื่อ Online
+        self.link = LinkMonitor()
+        self.ready = asyncio.Event()
+        self.backoff = Backoff(reconnect_sec, reconnect_max_sec)
+        self.outbox = outbox
+        self.outbox_batch = outbox_batch
+        # สร้างใหม่ทุกการเชื่อมต่อใน outbox_loop (Event ผูกกับ event loop ที่ใช้มัน)
+        self._outbox_wakeup: Optional[asyncio.Event] = None
+        # counters (รวมใน sim.fleet)
+        self.errors = 0
+        self.boot_retries = 0
+        self.buffered = 0
+        self.replayed = 0
+
+    # -------- connection state --------
+    @property
+    def connected(self) -> bool:
+        return self.link.state in (LinkState.BOOTING, LinkState.ONLINE)
+
+    @property
+    def online(self) -> bool:
+        """BootNotification of the current connection was accepted: other messages may be sent."""
+        return self.link.state == LinkState.ONLINE
+
+    @property
+    def connects(self) -> int:
+        return self.link.connects
+
+    def set_state(self, state: str) -> None:
+        self.link.set(state)
+        if state == LinkState.ONLINE:
+            self.ready.set()
+        else:
+            self.ready.clear()
+
+    async def wait_online(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the station is Online (True) or ``timeout`` passes (False)."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def offered_w(self, c) -> float:
+        """Power the connector can deliver: the charger rating, capped by an installed charging profile."""
+        rating = float(self.meter_rate_w)
+        if c.charging_limit is None:
+            return rating
+        voltage = c.vehicle.voltage_v if c.vehicle is not None else 230.0
+        limit = c.charging_limit.limit_w(voltage)
+        return rating if limit is None else max(0.0, min(rating, limit))
+
+    def vehicle_full(self, c) -> None:
+        # แบตเต็ม: รถหยุดรับไฟ แต่ transaction ยังอยู่จนกว่าจะถอดสาย/สั่งหยุด
+        if c.state == EVSEState.CHARGING:
+            c.state = EVSEState.SUSPENDED_EV
+            asyncio.create_task(self.send_status(c.id))
+
+    def configuration_changed(self, key: str) -> None:
+        if key in ("MeterValueSampleInterval", "ClockAlignedDataInterval"):
+            self.metering.reconfigure()
+        elif key == "HeartbeatInterval":
+            self.heartbeat_sec = float(self.configuration[key]) or self.heartbeat_sec
+
+    # -------- helper: send StatusNotification --------
+    async def send_status(self, connector_id: int):
+        c = self.model.get(connector_id)
+        st = c.to_status()
+        if not self.online:
+            # ตู้จริงไม่เก็บ StatusNotification ไว้ส่งทีหลัง: หลัง boot ส่งสถานะปัจจุบันของทุก connector อยู่แล้ว
+            self.log.debug("offline: StatusNotification for connector %s not sent", connector_id)
+            return
+        req = call.StatusNotificationPayload(
+            connector_id=connector_id,
+            error_code=c.error_code,
+            status=st,
+            timestamp=datetime.now(timezone.utc).isoformat()
+        )
+        await self.cp.call(req)  # type: ignore
+        self.log.info(
+            "StatusNotification sent: connector=%s, status=%s, error=%s", connector_id, st, c.error_code,
+            extra={"action": "StatusNotification"},
+        )
+
+    # -------- local state transitions --------
+    async def start_local(self, connector_id: int, id_tag: str):
+        c = self.model.get(connector_id)
+        c.id_tag = id_tag
+        c.session_active = True
+        c.state = EVSEState.CHARGING
+        if c.vehicle is None:
+            c.vehicle = Vehicle.random(EV_BATTERY_WH, EV_MAX_POWER_W, EV_SOC_START)
+        await self.send_status(connector_id)
+        # inform CSMS and store transaction id
+        req = call.StartTransactionPayload(
+            connector_id=connector_id,
+            id_tag=id_tag,
+            meter_start=c.meter_wh,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+        )
+        conf = await self.cp.call(req)  # type: ignore
+        self.model.assign_tx(connector_id, conf.transaction_id)
+        self.metering.transaction_started(connector_id)
+        self.log.info(
+            "StartTransaction confirmed: connector=%s, tx_id=%s", connector_id, conf.transaction_id,
+            extra={"action": "StartTransaction"},
+        )
+
+    async def stop_local_by_tx(self, tx_id: int, meter_stop: int | None = None):
+        c = self.model.get_by_tx(tx_id)
+        if c is None:
+            return
+        if meter_stop is None:
+            self.metering.advance(c)
+            meter_stop = c.meter_wh
+        req = call.StopTransactionPayload(
+            transaction_id=tx_id,
+            meter_stop=meter_stop,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+        )
+        await self.send_transaction_message(req)
+        c.state = EVSEState.FINISHING
+        await self.send_status(c.id)
+        await asyncio.sleep(1)
+        c.state = EVSEState.AVAILABLE
+        c.id_tag = None
+        await self.send_status(c.id)
+        self.model.clear_tx(tx_id)
+        return
+
+    # -------- transaction messages: send or queue --------
+    async def send_transaction_message(self, req):
+        """
+        MeterValues / StopTransaction: sent right away when online and nothing
+        is queued ahead of it; otherwise (or when the CALL fails) appended to
+        the outbox. Without an outbox this is a plain ``call()``.
+        """
+        if self.outbox is None:
+            return await self.cp.call(req)  # type: ignore
+        action = req.__class__.__name__[:-7]
+        if self.online and not self.outbox.pending(self.cpid):
+            try:
+                return await self.cp.call(req)  # type: ignore
+            except Exception as e:
+                self.log.warning("%s failed (%s): queued for replay", action, e, extra={"action": action})
+        self.outbox.put(self.cpid, req)
+        self.buffered += 1
+        if self.online and self._outbox_wakeup is not None:
+            self._outbox_wakeup.set()
+        return None
+
+    async def replay_outbox(self):
+        """Send what was queued, oldest first and batched; a failed CALL propagates (reconnect)."""
+        while self.outbox is not None and self.outbox.pending(self.cpid):
+            rows = await self.outbox.peek(self.cpid, self.outbox_batch)
+            for seqs, req in batches(rows, self.outbox_batch):
+                action = req.__class__.__name__[:-7]
+                conf = await self.cp.call(req)  # type: ignore
+                if conf is None:
+                    # CallError: CSMS ได้รับแล้วแต่ไม่รับ ส่งซ้ำก็ไม่ต่าง
+                    self.log.warning("replayed %s rejected by the CSMS", action, extra={"action": action})
+                await self.outbox.ack(self.cpid, seqs)
+                self.replayed += len(seqs)
+            self.log.info(
+                "outbox: replayed %s messages, %s left", len(rows), self.outbox.pending(self.cpid),
+                extra={"action": "replay"},
+            )
+
+    async def outbox_loop(self):
+        # ส่งไม่สำเร็จทั้งที่ยังเชื่อมต่ออยู่ (เช่น ไม่มีคำตอบ): ลองใหม่หลัง reconnect_sec
+        wakeup = self._outbox_wakeup = asyncio.Event()
+        if self.outbox is not None and self.outbox.pending(self.cpid):
+            wakeup.set()
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            await asyncio.sleep(self.reconnect_sec)
+            await self.replay_outbox()
+
+    # -------- OCPP client main --------
+    async def run(self):
+        url = f"{self.csms_url}/{self.cpid}"
+        ssl_context = build_ssl_context(self.csms_url)
+        # มิเตอร์เดินต่อแม้ต่อ CSMS ไม่ได้ (MeterValues ช่วงนั้นไปรอใน outbox)
+        self.metering.start()
+        try:
+            await self._run(url, ssl_context)
+        finally:
+            await self.metering.close()
+
+    async def _run(self, url, ssl_context):
+        while True:
+            self.set_state(LinkState.CONNECTING)
+            try:
+                self.log.info("Connecting to CSMS: %s", url, extra={"action": "connect"})
+                async with websockets.connect(url, subprotocols=['ocpp1.6'], ssl=ssl_context) as ws:
+                    self.cp = EVSEChargePoint(
+                        self.cpid, ws, self.model,
+                        send_status_cb=self.send_status,
+                        start_cb=self.start_local,
+                        stop_cb=self.stop_local_by_tx,
+                        configuration=self.configuration,
+                        config_cb=self.configuration_changed,
+                        local_list=self.local_list,
+                    )
+                    self.set_state(LinkState.BOOTING)
+                    reader = asyncio.create_task(self.cp.start())
+                    session = asyncio.create_task(self._session())
+                    try:
+                        # reader จบ = socket ปิด; session จบ = heartbeat/replay ล้มเหลว: ต่อใหม่ทั้งสองกรณี
+                        done, _ = await asyncio.wait({reader, session}, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for t in (reader, session):
+                            t.cancel()
+                        await asyncio.gather(reader, session, return_exceptions=True)
+                    for t in done:
+                        if not t.cancelled() and t.exception() is not None:
+                            raise t.exception()
+                    raise ConnectionError("connection closed")
+            except Exception as e:
+                self.errors += 1
+                self.set_state(LinkState.DISCONNECTED)
+                delay = self.backoff.next()
+                self.log.error("OCPP client error: %s (reconnect in %.1fs)", e, delay, extra={"action": "connect"})
+                await asyncio.sleep(delay)
+            finally:
+                if self.link.state != LinkState.DISCONNECTED:
+                    self.set_state(LinkState.DISCONNECTED)
+
+    async def _session(self):
+        """BootNotification until Accepted, then status, replay of the outbox, heartbeat."""
+        boot_req = call.BootNotificationPayload(
+            charge_point_model=CP_MODEL,
+            charge_point_vendor=CP_VENDOR,
+            charge_point_serial_number=CP_SERIAL_NUMBER,
+            firmware_version=FIRMWARE_VERSION,
+            iccid=ICCID,
+        )
+        # Pending/Rejected: boot ใหม่ตาม interval ที่ CSMS บอก (admission control ฝั่ง CSMS)
+        while True:
+            boot_conf = await self.cp.call(boot_req)  # type: ignore
+            if boot_conf.status == RegistrationStatus.accepted:
+                break
+            self.boot_retries += 1
+            retry = boot_conf.interval or self.reconnect_sec
+            self.log.info(
+                "BootNotification %s, retry in %ss", boot_conf.status, retry,
+                extra={"action": "BootNotification"},
+            )
+            await asyncio.sleep(retry)
+        # ใช้ heartbeat interval ที่ CSMS กำหนด (ถ้ามี) เหมือนตู้จริง
+        if boot_conf.interval:
+            self.heartbeat_sec = boot_conf.interval
+            self.configuration["HeartbeatInterval"] = str(boot_conf.interval)
+        self.set_state(LinkState.ONLINE)
+        self.backoff.reset()
+        for cid in self.model.connectors.keys():
+            await self.send_status(cid)
+        # send connector 0 status to mimic real chargers
+        root_status = call.StatusNotificationPayload(
+            connector_id=0,
+            error_code="NoError",
+            status=EVSEState.AVAILABLE,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+        )
+        await self.cp.call(root_status)  # type: ignore
+        # ข้อความที่ค้างจากช่วง offline ส่งตามลำดับก่อนข้อความใหม่
+        await self.replay_outbox()
+
+        # tasks: heartbeat, outbox retry
+        hb_task = asyncio.create_task(self.send_heartbeat_loop())
+        ob_task = asyncio.create_task(self.outbox_loop())
+        try:
+            await asyncio.gather(hb_task, ob_task)
+        finally:
+            for t in (hb_task, ob_task):
+                t.cancel()
+            await asyncio.gather(hb_task, ob_task, return_exceptions=True)
+
+    async def send_heartbeat_loop(self):
+        while True:
+            try:
+                req = call.HeartbeatPayload()
+                await self.cp.call(req)  # type: ignore
+            except Exception as e:
+                self.log.error("Heartbeat failed: %s", e, extra={"action": "Heartbeat"})
+                raise
+            await asyncio.sleep(self.heartbeat_sec)
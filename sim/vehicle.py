@@ -0,0 +1,165 @@
+import math
+import random
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+# SoC -> ส่วนของกำลังสูงสุดที่รถรับได้ (DC fast charge แบบ CC/CV: เริ่มต่ำ, เต็มช่วงกลาง, taper หลัง ~55%)
+DC_TAPER: Sequence[Tuple[float, float]] = (
+    (0.00, 0.55),
+    (0.05, 0.85),
+    (0.10, 1.00),
+    (0.55, 1.00),
+    (0.65, 0.80),
+    (0.75, 0.58),
+    (0.85, 0.38),
+    (0.95, 0.18),
+    (1.00, 0.05),
+)
+CURVE_STEPS = 1000  # ความละเอียดของตาราง (0.1% SoC)
+
+STEP_SEC = 5.0           # ช่วงเวลาย่อยตอน integrate (แม้ sample ทุก 60s)
+THERMAL_TAU_SEC = 600.0  # time constant ของอุณหภูมิ
+HEAT_C_PER_KW = 0.15     # อุณหภูมิที่สูงขึ้นเมื่อชาร์จต่อเนื่อง (°C ต่อ kW)
+DERATE_START_C = 45.0    # เริ่มลดกำลังเมื่อร้อนเกินนี้
+DERATE_FULL_C = 55.0     # ที่อุณหภูมินี้เหลือ DERATE_MIN ของกำลัง
+DERATE_MIN = 0.4
+
+
+def curve_table(points: Sequence[Tuple[float, float]], steps: int = CURVE_STEPS) -> List[float]:
+    """Piecewise-linear ``points`` sampled at ``steps + 1`` SoC values: lookup instead of interpolation per step."""
+    table = []
+    j = 0
+    for i in range(steps + 1):
+        soc = i / steps
+        while j < len(points) - 2 and soc > points[j + 1][0]:
+            j += 1
+        (s0, f0), (s1, f1) = points[j], points[j + 1]
+        table.append(f0 + (f1 - f0) * (soc - s0) / (s1 - s0))
+    return table
+
+
+_DC_TABLE = curve_table(DC_TAPER)
+
+
+class Vehicle:
+    """
+    EV plugged into a simulated connector: battery capacity, state of
+    charge, pack voltage and temperature. ``charge()`` advances the model
+    incrementally by the elapsed time with the power the charger offers
+    (rating and charging profile); the power actually drawn is limited by
+    the SoC taper curve and by thermal derating. Plain floats and one table
+    lookup per step, so thousands of connectors stay cheap.
+    """
+
+    __slots__ = (
+        "capacity_wh", "soc", "max_power_w", "nominal_voltage_v", "ambient_c", "temperature_c", "power_w", "_curve",
+    )
+
+    def __init__(
+        self,
+        capacity_wh: float = 60000.0,
+        soc: float = 0.2,
+        max_power_w: float = 150000.0,
+        nominal_voltage_v: float = 400.0,
+        ambient_c: float = 25.0,
+        curve: Optional[List[float]] = None,
+    ):
+        self.capacity_wh = capacity_wh
+        self.soc = min(max(soc, 0.0), 1.0)
+        self.max_power_w = max_power_w
+        self.nominal_voltage_v = nominal_voltage_v
+        self.ambient_c = ambient_c
+        self.temperature_c = ambient_c
+        self.power_w = 0.0  # กำลังที่รับล่าสุด
+        self._curve = curve or _DC_TABLE
+
+    @classmethod
+    def random(
+        cls,
+        capacity_wh: float,
+        max_power_w: float,
+        soc_range: Tuple[float, float],
+        rng: random.Random = random,  # type: ignore[assignment]
+    ) -> "Vehicle":
+        """A vehicle of the fleet mix: capacity and acceptance +-30% around the given values."""
+        return cls(
+            capacity_wh=capacity_wh * rng.uniform(0.7, 1.3),
+            soc=rng.uniform(*soc_range),
+            max_power_w=max_power_w * rng.uniform(0.7, 1.3),
+            ambient_c=rng.uniform(20.0, 35.0),
+        )
+
+    @property
+    def full(self) -> bool:
+        return self.soc >= 1.0
+
+    @property
+    def voltage_v(self) -> float:
+        """Pack voltage rises with SoC (about 90% of nominal empty, 105% full)."""
+        return self.nominal_voltage_v * (0.9 + 0.15 * self.soc)
+
+    def acceptance_w(self) -> float:
+        """Power the vehicle accepts now: taper curve at the current SoC, derated when hot."""
+        if self.soc >= 1.0:
+            return 0.0
+        power = self.max_power_w * self._curve[int(self.soc * CURVE_STEPS)]
+        if self.temperature_c > DERATE_START_C:
+            hot = min(1.0, (self.temperature_c - DERATE_START_C) / (DERATE_FULL_C - DERATE_START_C))
+            power *= 1.0 - (1.0 - DERATE_MIN) * hot
+        return power
+
+    def charge(self, offered_w: float, dt: float) -> float:
+        """Advance by ``dt`` seconds with ``offered_w`` available; returns the energy added (Wh)."""
+        added = 0.0
+        power = 0.0
+        while dt > 0:
+            step = min(dt, STEP_SEC)
+            dt -= step
+            power = min(offered_w, self.acceptance_w())
+            wh = min(power * step / 3600, (1.0 - self.soc) * self.capacity_wh)
+            self.soc = min(1.0, self.soc + wh / self.capacity_wh)
+            added += wh
+            # อุณหภูมิเข้าหา ambient + ความร้อนตามกำลัง (first-order lag)
+            target = self.ambient_c + HEAT_C_PER_KW * power / 1000
+            self.temperature_c += (target - self.temperature_c) * (1.0 - math.exp(-step / THERMAL_TAU_SEC))
+        self.power_w = power
+        return added
+
+
+class ChargingLimit:
+    """
+    The charging schedule of an installed profile (SetChargingProfile):
+    periods relative to ``start`` (``startSchedule`` or the time it was
+    received). Limits in A are converted with the present voltage.
+    """
+
+    __slots__ = ("purpose", "unit", "periods", "start")
+
+    def __init__(self, purpose: str, unit: str, periods: List[Tuple[float, float]], start: float):
+        self.purpose = purpose
+        self.unit = unit
+        self.periods = sorted(periods)
+        self.start = start
+
+    @classmethod
+    def from_profile(cls, profile: dict, now: Optional[float] = None) -> "ChargingLimit":
+        """``cs_charging_profiles`` as handed to the handler (snake_case keys)."""
+        schedule = profile["charging_schedule"]
+        start = now if now is not None else time.time()
+        if schedule.get("start_schedule"):
+            start = datetime.fromisoformat(schedule["start_schedule"].replace("Z", "+00:00")).timestamp()
+        periods = [(float(p["start_period"]), float(p["limit"])) for p in schedule["charging_schedule_period"]]
+        return cls(profile["charging_profile_purpose"], schedule["charging_rate_unit"], periods, start)
+
+    def limit_w(self, voltage_v: float, now: Optional[float] = None) -> Optional[float]:
+        """Limit in W at ``now``; None before the first period starts."""
+        elapsed = (now if now is not None else time.time()) - self.start
+        limit = None
+        for start_period, value in self.periods:
+            if start_period > elapsed:
+                break
+            limit = value
+        if limit is None:
+            return None
+        return limit * voltage_v if self.unit == "A" else limit
@@ -118,9 +118,13 @@ async def simulator():
     await csms.start()
 
     os.environ["CSMS_URL"] = csms.url
+    # in-memory outbox: nothing left over from a previous run
+    os.environ.setdefault("SIM_OUTBOX_PATH", "")
 
     # import after setting env vars so config picks them up
     evse = importlib.import_module("sim.evse")
+    # the module (and its station) is imported once: point it at this test's CSMS
+    evse.station.csms_url = csms.url
 
     ocpp_task = asyncio.create_task(evse.ocpp_client())
 
@@ -0,0 +1,53 @@
+from csms.admission import BootAdmission
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_boots_over_budget_get_pending_with_growing_jittered_interval():
+    clock = FakeClock()
+    adm = BootAdmission(rate=1, burst=5, pending_min=1, pending_max=600, jitter=0.5, clock=clock, rng=lambda: 1.0)
+    decisions = [adm.decide(connected=0) for _ in range(30)]
+    assert [ok for ok, _ in decisions[:5]] == [True] * 5
+    pending = [interval for ok, interval in decisions[5:]]
+    assert not any(ok for ok, _ in decisions[5:])
+    # the n-th charger in the backlog waits ~n / rate seconds (+50% jitter)
+    assert pending[0] == 2 and pending[-1] == 38
+    assert pending == sorted(pending)
+    assert adm.stats()["backlog"] == 25
+
+    # the bucket refills and retry times pass
+    clock.now += 60
+    assert adm.decide(connected=0)[0] is True
+    assert adm.backlog() == 0
+
+
+def test_pending_interval_is_clamped_and_unlimited_rate_always_accepts():
+    adm = BootAdmission(rate=1, burst=1, pending_min=10, pending_max=30, clock=FakeClock(), rng=lambda: 0.0)
+    adm.decide(connected=0)
+    assert adm.decide(connected=0) == (False, 10)
+    for _ in range(100):
+        adm.decide(connected=0)
+    assert adm.decide(connected=0) == (False, 30)
+
+    unlimited = BootAdmission(rate=0)
+    assert all(unlimited.decide(connected=0)[0] for _ in range(1000))
+
+
+def test_heartbeat_interval_scales_with_fleet_size():
+    adm = BootAdmission(heartbeat_min=300, heartbeat_max=3600, heartbeat_target_per_sec=50)
+    assert adm.heartbeat_interval(10) == 300
+    assert adm.heartbeat_interval(50_000) == 1000
+    assert adm.heartbeat_interval(1_000_000) == 3600
+
+
+def test_workers_share_the_fleet_wide_budget():
+    adm = BootAdmission(rate=20, burst=50, clock=FakeClock())
+    adm.share(4)
+    assert (adm.rate, adm.burst) == (5, 13)
+    assert sum(adm.decide(0)[0] for _ in range(20)) == 13
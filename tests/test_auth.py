@@ -0,0 +1,264 @@
+import asyncio
+
+import pytest
+import websockets
+from ocpp.routing import on
+from ocpp.v16 import ChargePoint, call, call_result
+from ocpp.v16.enums import Action, UpdateStatus
+
+import central
+from csms.auth import AcceptAllBackend, AuthBackend, Authorizer, SQLiteAuthBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _backend(tmp_path):
+    backend = SQLiteAuthBackend(str(tmp_path / "auth.db"))
+    await backend.open()
+    await backend.put("GOOD", "Accepted")
+    await backend.put("BLOCKED", "Blocked")
+    await backend.put("OLD", "Accepted", expiry_date="2020-01-01T00:00:00Z")
+    return backend
+
+
+@pytest.mark.asyncio
+async def test_authorize_caches_positive_and_negative_results(tmp_path):
+    backend = await _backend(tmp_path)
+    clock = FakeClock()
+    auth = Authorizer(backend, cache_size=3, ttl=300, negative_ttl=60, clock=clock)
+
+    assert (await auth.authorize("GOOD"))["status"] == "Accepted"
+    assert (await auth.authorize("BLOCKED"))["status"] == "Blocked"
+    assert (await auth.authorize("NOBODY"))["status"] == "Invalid"
+    assert (await auth.authorize("GOOD"))["status"] == "Accepted"
+    assert (auth.misses, auth.hits) == (3, 1)
+
+    # an unknown tag added meanwhile is seen once its negative entry expires
+    await backend.put("NOBODY", "Accepted")
+    assert (await auth.authorize("NOBODY"))["status"] == "Invalid"
+    clock.now = 61
+    assert (await auth.authorize("NOBODY"))["status"] == "Accepted"
+    assert (await auth.authorize("GOOD"))["status"] == "Accepted"  # still cached
+    assert auth.misses == 4
+
+    # expiry is checked at every call; the LRU keeps at most cache_size tags
+    assert (await auth.authorize("OLD"))["status"] == "Expired"
+    assert len(auth) == 3 and auth.evictions == 1
+    await backend.close()
+
+
+class SlowBackend(AuthBackend):
+    def __init__(self):
+        self.lookups = 0
+        self.release = asyncio.Event()
+        self.fail = False
+
+    async def lookup(self, id_tag):
+        self.lookups += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("database down")
+        return {"status": "Accepted"}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_query_and_fail_open():
+    backend = SlowBackend()
+    auth = Authorizer(backend)
+    tasks = [asyncio.create_task(auth.authorize("TAG")) for _ in range(10)]
+    await asyncio.sleep(0)
+    backend.release.set()
+    results = await asyncio.gather(*tasks)
+    assert all(r["status"] == "Accepted" for r in results)
+    assert backend.lookups == 1 and auth.coalesced == 9
+
+    backend.fail = True
+    assert (await auth.authorize("OTHER"))["status"] == "Accepted"
+    strict = Authorizer(backend, fail_open=False)
+    assert (await strict.authorize("OTHER"))["status"] == "Invalid"
+    assert auth.errors == 1 and len(strict) == 0  # failures are not cached
+
+
+@pytest.mark.asyncio
+async def test_local_list_updates_are_differential_when_possible(tmp_path):
+    backend = await _backend(tmp_path)
+    auth = Authorizer(backend)
+
+    update_type, version, entries = await auth.local_list_update(0, max_length=10)
+    assert (update_type, version) == ("Full", 3)
+    assert [e["id_tag"] for e in entries] == ["OLD", "BLOCKED", "GOOD"]
+    assert await auth.local_list_update(3, max_length=10) is None
+    assert await auth.local_list_update(-1, max_length=10) is None
+
+    await backend.put("NEW", "Accepted")
+    await backend.delete("BLOCKED")
+    assert await auth.local_list_update(3, max_length=10) == (
+        "Differential", 5, [{"id_tag": "NEW", "id_tag_info": {"status": "Accepted"}}, {"id_tag": "BLOCKED"}]
+    )
+    # too many changes for one message: send the whole list instead
+    update_type, version, entries = await auth.local_list_update(3, max_length=1)
+    assert (update_type, version, len(entries)) == ("Full", 5, 1)
+    await backend.close()
+
+
+class Station(ChargePoint):
+    list_version = 0
+    updates: list
+    configuration = {"LocalAuthListEnabled": "true", "LocalAuthListMaxLength": "100", "SendLocalListMaxLength": "2"}
+
+    @on(Action.GetConfiguration)
+    def on_get_configuration(self, key=None, **kwargs):
+        return call_result.GetConfigurationPayload(
+            configuration_key=[
+                {"key": k, "readonly": True, "value": v} for k, v in self.configuration.items() if k in (key or [])
+            ]
+        )
+
+    @on(Action.GetLocalListVersion)
+    def on_get_local_list_version(self, **kwargs):
+        return call_result.GetLocalListVersionPayload(list_version=self.list_version)
+
+    @on(Action.SendLocalList)
+    def on_send_local_list(self, list_version, update_type, local_authorization_list=None, **kwargs):
+        self.updates.append((update_type, list_version, local_authorization_list))
+        self.list_version = list_version
+        return call_result.SendLocalListPayload(status=UpdateStatus.accepted)
+
+
+@pytest.mark.asyncio
+async def test_authorize_and_local_list_over_ocpp(monkeypatch, tmp_path, unused_tcp_port):
+    backend = await _backend(tmp_path)
+    monkeypatch.setattr(central, "authorizer", Authorizer(backend))
+    url = f"ws://127.0.0.1:{unused_tcp_port}/ocpp/AUTH1"
+
+    async with websockets.serve(central.ocpp_handler, "127.0.0.1", unused_tcp_port, subprotocols=["ocpp1.6"]):
+        ws = await websockets.connect(url, subprotocols=["ocpp1.6"])
+        cp = Station("AUTH1", ws)
+        cp.updates = []
+        reader = asyncio.create_task(cp.start())
+        try:
+            assert (await cp.call(call.AuthorizePayload(id_tag="GOOD"))).id_tag_info["status"] == "Accepted"
+            assert (await cp.call(call.AuthorizePayload(id_tag="BLOCKED"))).id_tag_info["status"] == "Blocked"
+            assert (await cp.call(call.AuthorizePayload(id_tag="NOBODY"))).id_tag_info["status"] == "Invalid"
+
+            csms_side = central.connected_cps["AUTH1"]
+            assert await csms_side.sync_local_list() is None  # not probed yet
+            await csms_side._probe_local_list()
+            assert csms_side.state.local_list_max == 2
+            assert await csms_side.sync_local_list() == "Accepted"
+            await backend.put("NEW", "Accepted")
+            assert await csms_side.sync_local_list() == "Accepted"
+            assert await csms_side.sync_local_list() is None
+        finally:
+            await ws.close()
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    assert [(t, v, len(entries)) for t, v, entries in cp.updates] == [("Full", 3, 2), ("Differential", 4, 1)]
+    assert cp.updates[1][2] == [{"id_tag": "NEW", "id_tag_info": {"status": "Accepted"}}]
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_local_list_is_not_sent_when_the_charger_disables_it(monkeypatch, tmp_path, unused_tcp_port):
+    backend = await _backend(tmp_path)
+    monkeypatch.setattr(central, "authorizer", Authorizer(backend))
+    url = f"ws://127.0.0.1:{unused_tcp_port}/ocpp/AUTH2"
+
+    async with websockets.serve(central.ocpp_handler, "127.0.0.1", unused_tcp_port, subprotocols=["ocpp1.6"]):
+        ws = await websockets.connect(url, subprotocols=["ocpp1.6"])
+        cp = Station("AUTH2", ws)
+        cp.updates = []
+        cp.configuration = {"LocalAuthListEnabled": "false", "LocalAuthListMaxLength": "100"}
+        reader = asyncio.create_task(cp.start())
+        try:
+            csms_side = central.connected_cps["AUTH2"]
+            await csms_side._probe_local_list()
+            assert csms_side.state.local_list_max == 0
+            assert await csms_side.sync_local_list() is None
+        finally:
+            await ws.close()
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    assert cp.updates == []
+    await backend.close()
+
+
+def test_only_writable_backends_accept_id_tag_changes(monkeypatch, tmp_path):
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(central, "authorizer", Authorizer(AcceptAllBackend()))
+    with pytest.raises(HTTPException) as e:
+        central.require_writable_auth_backend()
+    assert e.value.status_code == 409
+
+    monkeypatch.setattr(central, "authorizer", Authorizer(SQLiteAuthBackend(str(tmp_path / "auth.db"))))
+    central.require_writable_auth_backend()
+
+
+@pytest.mark.asyncio
+async def test_boot_skips_the_local_list_until_there_is_one_to_send(monkeypatch, tmp_path):
+    from ocpp.v16.enums import RegistrationStatus
+
+    from csms.capabilities import CapabilityCache
+
+    monkeypatch.setattr(central, "capability_cache", CapabilityCache())
+    configuration = {"LocalAuthListEnabled": "true", "LocalAuthListMaxLength": "100", "SendLocalListMaxLength": "50"}
+    sent = []
+
+    async def send_command(payload, priority="normal", timeout=None):
+        sent.append(type(payload).__name__)
+        if isinstance(payload, call.GetConfigurationPayload):
+            return call_result.GetConfigurationPayload(
+                configuration_key=[{"key": k, "readonly": True, "value": v} for k, v in configuration.items()]
+            )
+        if isinstance(payload, call.GetLocalListVersionPayload):
+            return call_result.GetLocalListVersionPayload(list_version=0)
+        if isinstance(payload, call.SendLocalListPayload):
+            return call_result.SendLocalListPayload(status=UpdateStatus.accepted)
+        return None
+
+    async def boot(cpid):
+        cp = central.CentralSystem(cpid, object())
+        cp.registration = RegistrationStatus.accepted
+        monkeypatch.setattr(cp, "send_command", send_command)
+        monkeypatch.setitem(central.connected_cps, cpid, cp)
+        sent.clear()
+        await cp.after_boot_notification(charge_point_model="M", charge_point_vendor="V", firmware_version="1.0")
+        return cp
+
+    # AUTH_BACKEND=none: nothing to ask or send
+    monkeypatch.setattr(central, "authorizer", Authorizer(AcceptAllBackend()))
+    await boot("LIST0")
+    cp = await boot("LIST1")
+    assert "GetConfigurationPayload" not in sent and "GetLocalListVersionPayload" not in sent
+    assert cp.state.local_list_max == 0 and not cp.local_list_pending
+
+    # an empty writable list: no probe at boot, the first idTag triggers it
+    backend = SQLiteAuthBackend(str(tmp_path / "auth.db"))
+    await backend.open()
+    monkeypatch.setattr(central, "authorizer", Authorizer(backend))
+    cp = await boot("LIST2")
+    assert "GetConfigurationPayload" not in sent and "GetLocalListVersionPayload" not in sent
+    assert cp.local_list_pending
+    await backend.put("GOOD", "Accepted")
+    sent.clear()
+    assert central.local_id_tags_changed(["GOOD"])["chargers"] == 1
+    for _ in range(100):
+        if "SendLocalListPayload" in sent:
+            break
+        await asyncio.sleep(0.01)
+    assert sent == ["GetConfigurationPayload", "GetLocalListVersionPayload", "SendLocalListPayload"]
+    assert cp.state.local_list_max == 50 and not cp.local_list_pending
+
+    # the limits are remembered: the next boot goes straight to the version check
+    cp = await boot("LIST2")
+    assert sent[:2] == ["GetLocalListVersionPayload", "SendLocalListPayload"]
+    await backend.close()
@@ -0,0 +1,29 @@
+from benchmarks.bench_central import compare, percentile, summarize
+
+
+def test_percentile_and_summary():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.5
+    assert round(percentile(values, 99), 2) == 99.01
+    summary = summarize({"Heartbeat": values, "Unknown": [1.0]})
+    assert list(summary) == ["Heartbeat"]
+    assert summary["Heartbeat"]["count"] == 100
+    assert summary["Heartbeat"]["max_ms"] == 100.0
+
+
+def test_compare_flags_latency_and_throughput_regressions(capsys):
+    base = {
+        "actions": {"Heartbeat": {"p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 3.0}},
+        "throughput": {"msgs_per_sec": 1000.0},
+    }
+    same = compare(base, base)
+    assert same == []
+    worse = {
+        "actions": {"Heartbeat": {"p50_ms": 1.05, "p95_ms": 3.0, "p99_ms": 3.0}},
+        "throughput": {"msgs_per_sec": 800.0},
+    }
+    regressions = compare(base, worse, threshold=0.10)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("Heartbeat p95_ms")
+    assert regressions[1].startswith("throughput")
+    assert "Heartbeat p95_ms" in capsys.readouterr().out
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from csms.capabilities import CapabilityCache, parse_configuration_keys, parse_configuration_values
+
+
+def test_parse_configuration_keys_accepts_dicts_and_objects():
+    class Entry:
+        key = "HeartbeatInterval"
+
+    assert parse_configuration_keys({"configurationKey": [{"key": "A"}, {"value": "x"}]}) == ["A"]
+    assert parse_configuration_keys(type("Conf", (), {"configuration_key": [Entry()]})()) == ["HeartbeatInterval"]
+
+
+@pytest.mark.asyncio
+async def test_cache_persists_and_invalidates_on_firmware_change(tmp_path):
+    path = str(tmp_path / "caps.db")
+    cache = CapabilityCache(path)
+    await cache.open()
+    assert await cache.lookup("CP1", "V", "M", "1.0") is None
+    await cache.store("CP1", "V", "M", "1.0", ["QRcodeConnectorID1"])
+    await cache.close()
+
+    cache = CapabilityCache(path)
+    await cache.open()
+    # same charger, and another unit of the same model/firmware
+    assert await cache.lookup("CP1", "V", "M", "1.0") == ["QRcodeConnectorID1"]
+    assert await cache.lookup("CP2", "V", "M", "1.0") == ["QRcodeConnectorID1"]
+    # firmware upgrade: per-charger entry dropped, new firmware unknown
+    assert await cache.lookup("CP1", "V", "M", "2.0") is None
+    assert "CP1" not in cache.by_cp
+    assert cache.stats()["invalidations"] == 1
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    cache = CapabilityCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["A", "B"]
+
+    results = await asyncio.gather(
+        *(cache.resolve(f"CP{i}", "V", "M", "1.0", fetch) for i in range(5))
+    )
+    assert results == [["A", "B"]] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_charger_settings_persist_and_are_dropped_with_the_firmware(tmp_path):
+    path = str(tmp_path / "caps.db")
+    cache = CapabilityCache(path)
+    await cache.open()
+    await cache.store("CP1", "V", "M", "1.0", ["WebSocketPingInterval"])
+    await cache.store_settings("CP1", {"WebSocketPingInterval": "30"})
+    await cache.store_settings("CP2", {"WebSocketPingInterval": None})
+    await cache.close()
+
+    cache = CapabilityCache(path)
+    await cache.open()
+    assert cache.settings("CP1") == {"WebSocketPingInterval": "30"}
+    assert cache.settings("CP2") == {"WebSocketPingInterval": None}  # known to have no value
+    await cache.forget_settings("CP2")
+    assert cache.settings("CP2") == {}
+    assert await cache.lookup("CP1", "V", "M", "2.0") is None
+    assert cache.settings("CP1") == {}
+    await cache.close()
+
+    cache = CapabilityCache(path)
+    await cache.open()
+    assert cache.settings_by_cp == {}
+    await cache.close()
+
+
+def test_parse_configuration_values_marks_unreported_keys():
+    conf = {"configurationKey": [{"key": "WebSocketPingInterval", "value": "45"}, {"key": "Other", "value": "x"}]}
+    assert parse_configuration_values(conf, ["WebSocketPingInterval", "Missing"]) == {
+        "WebSocketPingInterval": "45", "Missing": None
+    }
+
+
+@pytest.mark.asyncio
+async def test_boot_reads_the_ping_interval_once_per_charger(monkeypatch):
+    import central
+    from ocpp.v16 import call, call_result
+    from ocpp.v16.enums import RegistrationStatus
+
+    monkeypatch.setattr(central, "capability_cache", CapabilityCache())
+    sent = []
+
+    async def send_command(payload, priority="normal", timeout=None):
+        sent.append(payload)
+        if isinstance(payload, call.GetConfigurationPayload):
+            keys = [{"key": "WebSocketPingInterval", "readonly": False, "value": "15"}]
+            if payload.key is None:
+                keys.append({"key": "HeartbeatInterval", "readonly": False, "value": "300"})
+            return call_result.GetConfigurationPayload(configuration_key=keys)
+        return None
+
+    async def boot(cpid):
+        cp = central.CentralSystem(cpid, object())
+        cp.registration = RegistrationStatus.accepted
+        monkeypatch.setattr(cp, "send_command", send_command)
+        sent.clear()
+        await cp.after_boot_notification(charge_point_model="M", charge_point_vendor="V", firmware_version="1.0")
+        return cp, [p.key for p in sent if isinstance(p, call.GetConfigurationPayload)]
+
+    # first unit of the model: the full GetConfiguration also carries the value
+    cp, reads = await boot("PING1")
+    assert reads == [None] and cp.state.ping_interval == 15
+    # another unit of the same model: one targeted read, then remembered
+    cp, reads = await boot("PING2")
+    assert reads == [["WebSocketPingInterval"]] and cp.state.ping_interval == 15
+    cp, reads = await boot("PING2")
+    assert reads == [] and cp.state.ping_interval == 15
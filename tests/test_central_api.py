@@ -0,0 +1,108 @@
+import httpx
+import pytest
+import pytest_asyncio
+
+import central
+
+HEADERS = {"X-API-Key": central.API_KEY}
+
+
+@pytest_asyncio.fixture
+async def api():
+    central.session_index = central.SessionIndex()
+    transport = httpx.ASGITransport(app=central.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_active_pagination_and_etag(api):
+    for tx in (1, 2, 3):
+        central.session_index.add(f"CP{tx}", 1, {"transaction_id": tx, "id_tag": "TAG"})
+
+    resp = await api.get("/api/v1/active", params={"limit": 2}, headers=HEADERS)
+    body = resp.json()
+    assert [s["transactionId"] for s in body["sessions"]] == [1, 2]
+    assert body["nextCursor"] == 2
+    etag = resp.headers["ETag"]
+
+    resp = await api.get("/api/v1/active", params={"limit": 2, "cursor": 2}, headers=HEADERS)
+    assert [s["transactionId"] for s in resp.json()["sessions"]] == [3]
+    assert resp.json()["nextCursor"] is None
+
+    resp = await api.get("/api/v1/active", params={"limit": 2}, headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 304
+
+    central.session_index.remove(1)
+    resp = await api.get("/api/v1/active", params={"limit": 2}, headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_active_since_returns_delta(api):
+    central.session_index.add("CP1", 1, {"transaction_id": 1, "id_tag": "A"})
+    version = (await api.get("/api/v1/active", headers=HEADERS)).json()["version"]
+    central.session_index.add("CP2", 1, {"transaction_id": 2, "id_tag": "B"})
+    central.session_index.remove(1)
+
+    body = (await api.get("/api/v1/active", params={"since": version}, headers=HEADERS)).json()
+    assert [s["transactionId"] for s in body["opened"]] == [2]
+    assert [s["transactionId"] for s in body["closed"]] == [1]
+    assert "sessions" not in body
+
+    body = (await api.get("/api/v1/active", params={"since": "999"}, headers=HEADERS)).json()
+    assert body["resync"] is True
+    assert [s["transactionId"] for s in body["sessions"]] == [2]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_http_and_gauges(api):
+    await api.get("/api/v1/active", headers=HEADERS)
+    resp = await api.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert "# TYPE ocpp_handler_seconds histogram" in text
+    assert "ocpp_connected_charge_points 0" in text
+    assert 'http_requests_total{method="GET",route="/api/v1/active",status="200"}' in text
+    # cumulative pipeline counts are counters; sizes stay gauges
+    assert "# TYPE meter_ingest_events counter" in text
+    assert 'meter_ingest_events_total{stat="dropped"} 0' in text
+    assert 'meter_ingest{stat="queued"} 0' in text and 'meter_ingest{stat="dropped"}' not in text
+    assert 'auth_cache_events_total{stat="hits"}' in text and 'auth_cache{stat="size"}' in text
+
+
+@pytest.mark.asyncio
+async def test_bulk_fans_out_and_aggregates(api):
+    class FakeCP:
+        def __init__(self, status):
+            self.status = status
+            self.sent = []
+
+        async def send_command(self, payload, priority="normal", timeout=None):
+            self.sent.append((payload, priority))
+            if self.status == "timeout":
+                raise central.CommandError("timeout", "no answer")
+            return central.call_result.UnlockConnectorPayload(status=self.status)
+
+    cps = {"CP1": FakeCP("Unlocked"), "CP2": FakeCP("UnlockFailed"), "CP3": FakeCP("timeout")}
+    for cpid, cp in cps.items():
+        dict.__setitem__(central.connected_cps, cpid, cp)
+    try:
+        resp = await api.post(
+            "/api/v1/bulk",
+            json={"action": "UnlockConnector", "payload": {"connectorId": 1}, "cpids": ["CP1", "CP2", "CP3", "GONE"]},
+            headers=HEADERS,
+        )
+        body = resp.json()
+        assert body["total"] == 4
+        assert body["summary"] == {"Unlocked": 1, "UnlockFailed": 1, "timeout": 1, "not_connected": 1}
+        payload, priority = cps["CP1"].sent[0]
+        assert payload.connector_id == 1 and priority == "low"
+
+        resp = await api.post("/api/v1/bulk", json={"action": "NoSuchAction"}, headers=HEADERS)
+        assert resp.status_code == 400
+    finally:
+        for cpid in cps:
+            dict.pop(central.connected_cps, cpid, None)
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+import websockets
+from ocpp.v16 import ChargePoint, call
+
+import central
+from csms.charger_state import ChargerStates
+from csms.pending import PendingStarts
+from csms.timers import TimerWheel
+from csms.tx_store import MemoryTransactionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _states(grace):
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    expired = []
+    states = ChargerStates(wheel, grace, lambda: PendingStarts(wheel, 60), expired.append, clock=clock)
+    return clock, wheel, states, expired
+
+
+def test_state_survives_a_reconnect_within_grace():
+    clock, wheel, states, expired = _states(grace=30)
+    state, resumed = states.attach("CP1", "conn1")
+    assert not resumed
+    state.active_tx[1] = {"transaction_id": 5, "id_tag": "TAG"}
+    states.detach("CP1", "conn1")
+    assert states.detached == 1
+
+    clock.now = 20
+    wheel.advance()
+    again, resumed = states.attach("CP1", "conn2")
+    assert resumed and again is state and again.active_tx[1]["transaction_id"] == 5
+    assert len(wheel) == 0  # GC timer cancelled
+
+    # the old connection closing late does not detach the new one
+    states.detach("CP1", "conn1")
+    assert states.detached == 0
+
+    states.detach("CP1", "conn2")
+    clock.now = 51
+    wheel.advance()
+    assert expired == [state] and "CP1" not in states
+    assert (states.created, states.resumed, states.expired) == (1, 1, 1)
+
+
+def test_zero_grace_drops_state_at_disconnect():
+    clock, wheel, states, expired = _states(grace=0)
+    state, _ = states.attach("CP1", "conn")
+    states.detach("CP1", "conn")
+    assert expired == [state] and len(states) == 0 and len(wheel) == 0
+
+
+def test_evict_drops_state_at_once():
+    clock, wheel, states, expired = _states(grace=30)
+    state, _ = states.attach("CP1", "conn1")
+    states.evict("CP1", "other")  # not the owner: ignored
+    assert "CP1" in states
+    states.evict("CP1", "conn1")
+    assert expired == [state] and "CP1" not in states and len(wheel) == 0
+    states.detach("CP1", "conn1")  # the closing handler finds nothing left
+    assert (states.expired, states.detached) == (1, 0)
+
+    # disconnected first (grace period), then moved to another worker
+    state, _ = states.attach("CP2", "conn2")
+    states.detach("CP2", "conn2")
+    states.evict("CP2", "conn2")  # only a detached state matches None
+    assert "CP2" in states and len(wheel) == 1
+    states.evict("CP2", None)
+    assert expired[-1] is state and "CP2" not in states and len(wheel) == 0
+
+
+def test_charger_that_moved_after_disconnecting_loses_its_sessions_here(monkeypatch):
+    monkeypatch.setattr(central, "session_index", central.SessionIndex())
+    monkeypatch.setattr(central, "meter_store", central.MeterSeriesStore(capacity=4, max_series=10))
+    states = ChargerStates(central.timers, 600, central._new_pending_starts, central._charger_state_expired)
+    monkeypatch.setattr(central, "charger_states", states)
+    states.attach("MOVED1", "conn")
+    central.session_index.add("MOVED1", 1, {"transaction_id": 77, "id_tag": "TAG"})
+    central.meter_store.append("MOVED1", 1, "Voltage", 1.0, 230.0)
+    states.detach("MOVED1", "conn")
+
+    central._connection_moved("MOVED1", None)  # claimed by another worker
+    assert "MOVED1" not in states
+    assert central.session_index.get_tx(77) is None and central.meter_store.measurands("MOVED1", 1) == []
+
+
+class Station(ChargePoint):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_websocket_blip_keeps_the_session(monkeypatch, unused_tcp_port):
+    monkeypatch.setattr(central, "tx_store", MemoryTransactionStore())
+    monkeypatch.setattr(central, "session_index", central.SessionIndex())
+    monkeypatch.setattr(central, "charger_states", ChargerStates(central.timers, 60, central._new_pending_starts))
+    url = f"ws://127.0.0.1:{unused_tcp_port}/ocpp/BLIP1"
+
+    async def connect():
+        ws = await websockets.connect(url, subprotocols=["ocpp1.6"])
+        cp = Station("BLIP1", ws)
+        reader = asyncio.create_task(cp.start())
+        await cp.call(call.BootNotificationPayload(charge_point_model="M", charge_point_vendor="V"))
+        return ws, cp, reader
+
+    async def disconnect(ws, reader):
+        await ws.close()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        for _ in range(100):
+            if "BLIP1" not in central.connected_cps:
+                break
+            await asyncio.sleep(0.01)
+
+    async with websockets.serve(central.ocpp_handler, "127.0.0.1", unused_tcp_port, subprotocols=["ocpp1.6"]):
+        ws, cp, reader = await connect()
+        conf = await cp.call(
+            call.StartTransactionPayload(connector_id=1, id_tag="TAG", meter_start=0, timestamp="2024-01-01T00:00:00Z")
+        )
+        central.connected_cps["BLIP1"].pending_starts.accept(2, "NEXT")
+        await disconnect(ws, reader)
+
+        # away: the session is still listed and the state waits for the charger
+        assert "BLIP1" not in central.connected_cps
+        assert central.session_index.get_tx(conf.transaction_id)["cpid"] == "BLIP1"
+        assert central.charger_states.detached == 1
+
+        ws, cp, reader = await connect()
+        csms_side = central.connected_cps["BLIP1"]
+        assert csms_side.resumed
+        assert csms_side.active_tx[1]["transaction_id"] == conf.transaction_id
+        assert csms_side.pending_starts.expected_id_tag(2) == "NEXT"
+        await cp.call(call.StopTransactionPayload(
+            transaction_id=conf.transaction_id, meter_stop=10, timestamp="2024-01-01T00:10:00Z"
+        ))
+        assert csms_side.active_tx == {} and central.session_index.get_tx(conf.transaction_id) is None
+        await disconnect(ws, reader)
+    central.charger_states.get("BLIP1").pending_starts.clear("disconnected")
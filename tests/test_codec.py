@@ -0,0 +1,127 @@
+import copy
+import decimal
+import json
+
+import pytest
+from ocpp.exceptions import FormatViolationError, OCPPError
+from ocpp.messages import Call, CallResult, get_validator
+from ocpp.routing import on
+from ocpp.v16 import ChargePoint, call_result
+from ocpp.v16.enums import Action
+
+from ocpp_common import codec
+
+METER_VALUES = {
+    "connectorId": 1,
+    "transactionId": 42,
+    "meterValue": [
+        {
+            "timestamp": "2024-01-01T00:00:00Z",
+            "sampledValue": [
+                {"value": "12.5", "measurand": "Energy.Active.Import.Register", "unit": "kWh"},
+                {"value": "230", "measurand": "Voltage", "phase": "L1-N", "unit": "V"},
+            ],
+        }
+    ],
+}
+STATUS = {"connectorId": 1, "errorCode": "NoError", "status": "Charging", "timestamp": "2024-01-01T00:00:00Z"}
+
+
+def _variants(payload):
+    """The payload plus a set of broken copies (wrong types, bad enum, extra/missing keys)."""
+    yield payload
+    for key in payload:
+        broken = copy.deepcopy(payload)
+        del broken[key]
+        yield broken
+        for bad in (None, True, 1, 1.5, "x" * 60, [], {}):
+            broken = copy.deepcopy(payload)
+            broken[key] = bad
+            yield broken
+    yield dict(payload, unexpected=1)
+    if "meterValue" in payload:
+        for field, bad in (("unit", "Parsec"), ("phase", "L9"), ("value", 12), ("context", "Sample.Periodic")):
+            broken = copy.deepcopy(payload)
+            broken["meterValue"][0]["sampledValue"][0][field] = bad
+            yield broken
+        broken = copy.deepcopy(payload)
+        broken["meterValue"][0]["sampledValue"] = []
+        yield broken
+        broken = copy.deepcopy(payload)
+        del broken["meterValue"][0]["sampledValue"][1]["value"]
+        yield broken
+
+
+@pytest.mark.parametrize("action,payload", [("MeterValues", METER_VALUES), ("StatusNotification", STATUS)])
+def test_compiled_validator_agrees_with_jsonschema(action, payload):
+    schema = get_validator(2, action, "1.6")
+    check = codec.compile_schema(schema.schema)
+    assert check is not None
+    for variant in _variants(payload):
+        assert check(variant) == schema.is_valid(variant), variant
+
+
+def test_schemas_with_unsupported_keywords_stay_on_jsonschema():
+    # multipleOf (charging profiles) is left to jsonschema + Decimal parsing
+    assert codec.compile_schema(get_validator(2, "SetChargingProfile", "1.6").schema) is None
+
+
+def test_codec_keeps_wire_format_and_errors():
+    codec.uninstall()
+    original = Call("1", "MeterValues", {"connectorId": 1, "x": decimal.Decimal("1.25")}).to_json()
+    error_details = Call("1", "Heartbeat", {}).create_call_error(
+        FormatViolationError(details={"ocpp_message": Call("1", "Heartbeat", {})})
+    ).to_json()
+    for name in ("json", "orjson"):
+        if name == "orjson" and codec.orjson is None:
+            continue
+        assert codec.install(name) == name
+        assert Call("1", "MeterValues", {"connectorId": 1, "x": decimal.Decimal("1.25")}).to_json() == original
+        assert Call("1", "Heartbeat", {}).create_call_error(
+            FormatViolationError(details={"ocpp_message": Call("1", "Heartbeat", {})})
+        ).to_json() == error_details
+        assert CallResult("1", {"currentTime": "t"}).to_json() == '[3,"1",{"currentTime":"t"}]'
+        msg = codec.unpack('[2,"1","Heartbeat",{}]')
+        assert (msg.unique_id, msg.action, msg.payload) == ("1", "Heartbeat", {})
+        with pytest.raises(FormatViolationError):
+            codec.unpack("not json")
+        # invalid payloads still raise the OCPP error from jsonschema
+        with pytest.raises(OCPPError):
+            codec._validate_payload(Call("1", "StatusNotification", dict(STATUS, status="Exploded")), "1.6")
+
+
+class Station(codec.ValidationBypass, ChargePoint):
+    skip_validation = frozenset({"Heartbeat"})
+    trusted_ids = ("SIM*",)
+
+    @on(Action.Heartbeat)
+    def on_heartbeat(self, **kwargs):
+        return call_result.HeartbeatPayload(current_time="t")
+
+    @on(Action.StatusNotification)
+    def on_status(self, **kwargs):
+        return call_result.StatusNotificationPayload()
+
+
+class Conn:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+@pytest.mark.asyncio
+async def test_validation_bypass_only_for_trusted_chargers_and_listed_actions():
+    codec.install("auto")
+    trusted, other = Station("SIM001", Conn()), Station("CP001", Conn())
+    assert trusted.route_map["Heartbeat"]["_skip_schema_validation"] is True
+    assert trusted.route_map["StatusNotification"]["_skip_schema_validation"] is False
+    assert other.route_map["Heartbeat"]["_skip_schema_validation"] is False
+
+    # {"bogus": 1} breaks the Heartbeat schema: trusted skips it, the handler still answers
+    frame = '[2,"1","Heartbeat",{"bogus":1}]'
+    await trusted.route_message(frame)
+    await other.route_message(frame)
+    assert trusted._connection.sent[0][0] == 3
+    assert other._connection.sent[0][0] == 4
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from csms.commands import CommandError, CommandQueue, fan_out, summarize
+
+
+class Payload:
+    def __init__(self, name):
+        self.name = name
+
+
+class ResetPayload(Payload):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_queue_sends_one_at_a_time_in_priority_order():
+    sent = []
+    inflight = 0
+
+    async def send(payload):
+        nonlocal inflight
+        inflight += 1
+        assert inflight == 1
+        sent.append(payload.name)
+        await asyncio.sleep(0.01)
+        inflight -= 1
+        return payload.name
+
+    q = CommandQueue(send)
+    futs = [q.submit(ResetPayload("first"), "low")]
+    await asyncio.sleep(0)
+    futs += [
+        q.submit(ResetPayload("low"), "low"),
+        q.submit(ResetPayload("normal")),
+        q.submit(ResetPayload("high"), "high"),
+    ]
+    assert await asyncio.gather(*futs) == ["first", "low", "normal", "high"]
+    # "first" was already in flight; the rest by priority
+    assert sent == ["first", "high", "normal", "low"]
+
+
+@pytest.mark.asyncio
+async def test_deadlines_queue_limit_and_close():
+    release = asyncio.Event()
+
+    async def send(payload):
+        await release.wait()
+        return "ok"
+
+    expired = []
+    q = CommandQueue(send, max_pending=2, on_expired=expired.append)
+    slow = q.submit(ResetPayload("slow"), timeout=0.05)
+    await asyncio.sleep(0)
+    queued = q.submit(ResetPayload("queued"), timeout=0.02)
+    q.submit(ResetPayload("filler"))
+    with pytest.raises(CommandError) as e:
+        q.submit(ResetPayload("extra"))
+    assert e.value.reason == "queue_full"
+
+    with pytest.raises(CommandError) as e:
+        await slow
+    assert e.value.reason == "timeout"
+    with pytest.raises(CommandError) as e:
+        await queued
+    assert e.value.reason == "expired"
+    assert q.timed_out == 1 and q.expired == 1 and expired == ["Reset"]
+
+    q.close()
+    with pytest.raises(CommandError) as e:
+        q.submit(ResetPayload("late"))
+    assert e.value.reason == "disconnected"
+
+
+@pytest.mark.asyncio
+async def test_fan_out_caps_concurrency():
+    running = peak = 0
+
+    async def run(target):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        if target.endswith("7"):
+            raise CommandError("timeout", "no answer")
+        return None if target.endswith("3") else type("Conf", (), {"status": "Accepted"})()
+
+    results = await fan_out([f"CP{i}" for i in range(100)], run, concurrency=8)
+    assert peak == 8
+    assert summarize(results) == {"Accepted": 80, "call_error": 10, "timeout": 10}
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from conftest import CSMS
+from sim.connection import Backoff, LinkMonitor, LinkState
+from sim.station import SimStation
+
+
+def test_backoff_is_decorrelated_capped_and_resets():
+    low = Backoff(1, 10, rng=lambda a, b: a)
+    high = Backoff(1, 10, rng=lambda a, b: b)
+    assert [low.next() for _ in range(3)] == [1, 1, 1]
+    assert [high.next() for _ in range(4)] == [3, 9, 10, 10]
+    high.reset()
+    assert high.next() == 3
+
+    # real jitter: stations that lost the CSMS together do not retry together
+    delays = [Backoff(1, 60).next() for _ in range(200)]
+    assert all(1 <= d <= 3 for d in delays)
+    assert len({round(d, 2) for d in delays}) > 50
+
+
+def test_link_monitor_counts_reconnects_and_downtime():
+    now = [0.0]
+    link = LinkMonitor(clock=lambda: now[0])
+    for state in (LinkState.CONNECTING, LinkState.BOOTING, LinkState.ONLINE):
+        link.set(state)
+    now[0] = 100
+    link.set(LinkState.DISCONNECTED)
+    now[0] = 104
+    link.set(LinkState.CONNECTING)
+    link.set(LinkState.DISCONNECTED)  # refused
+    assert link.disconnected_sec() == 4
+    now[0] = 107
+    for state in (LinkState.CONNECTING, LinkState.BOOTING, LinkState.ONLINE):
+        link.set(state)
+    now[0] = 200
+    assert link.stats() == {
+        "state": LinkState.ONLINE,
+        "connects": 2,
+        "reconnects": 1,
+        "outages": 1,
+        "disconnectedSec": 7,
+        "lastOutageSec": 7,
+    }
+
+
+@pytest.mark.asyncio
+async def test_station_reconnects_after_csms_restart():
+    csms = CSMS()
+    await csms.start()
+    station = SimStation("RC1", csms.url, reconnect_sec=0.05, reconnect_max_sec=0.2)
+    task = asyncio.create_task(station.run())
+    try:
+        assert await station.wait_online(5)
+        await csms.stop()
+        for _ in range(100):
+            if not station.online:
+                break
+            await asyncio.sleep(0.05)
+        assert not station.ready.is_set()
+
+        csms = CSMS(port=csms.port)
+        await csms.start()
+        assert await station.wait_online(5)
+        assert station.link.reconnects == 1
+        assert station.link.disconnected_sec() > 0
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await csms.stop()
+    assert station.link.state == LinkState.DISCONNECTED
@@ -0,0 +1,111 @@
+import asyncio
+import json
+from dataclasses import asdict
+
+import pytest
+from ocpp.charge_point import camel_to_snake_case, remove_nones, snake_to_camel_case
+from ocpp.routing import after, on
+from ocpp.v16 import ChargePoint, call_result
+from ocpp.v16.enums import Action, DataTransferStatus
+
+from ocpp_common import codec
+from csms.dispatch import PrecompiledDispatch, camel_case, constant_result, snake_case
+
+ACCEPTED = constant_result(call_result.DataTransferPayload(status=DataTransferStatus.accepted))
+
+
+class Station(ChargePoint):
+    def __init__(self, id, connection):
+        super().__init__(id, connection)
+        self.seen = []
+
+    @on(Action.Heartbeat)
+    def on_heartbeat(self, **kwargs):
+        return call_result.HeartbeatPayload(current_time="t")
+
+    @on(Action.StatusNotification)
+    async def on_status(self, connector_id, status, call_unique_id, **kwargs):
+        self.seen.append(("status", connector_id, status, call_unique_id))
+        return call_result.StatusNotificationPayload()
+
+    @on(Action.DataTransfer)
+    def on_data_transfer(self, vendor_id, **kwargs):
+        if vendor_id == "boom":
+            raise ValueError("boom")
+        return ACCEPTED
+
+    @on(Action.Authorize)
+    def on_authorize(self, id_tag, **kwargs):
+        return call_result.AuthorizePayload(id_tag_info={"status": "Accepted", "parent_id_tag": None})
+
+    @after(Action.StatusNotification)
+    async def after_status(self, connector_id, **kwargs):
+        self.seen.append(("after", connector_id))
+
+
+class FastStation(PrecompiledDispatch, Station):
+    pass
+
+
+class Conn:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+FRAMES = [
+    '[2,"1","Heartbeat",{}]',
+    '[2,"2","StatusNotification",{"connectorId":1,"errorCode":"NoError","status":"Charging"}]',
+    '[2,"3","StatusNotification",{"connectorId":2,"errorCode":"NoError","status":"Available"}]',
+    '[2,"4","DataTransfer",{"vendorId":"acme"}]',
+    '[2,"5","DataTransfer",{"vendorId":"acme"}]',
+    '[2,"6","DataTransfer",{"vendorId":"boom"}]',
+    '[2,"7","Authorize",{"idTag":"TAG"}]',
+    '[2,"8","StatusNotification",{"connectorId":1,"status":"Charging"}]',  # errorCode missing
+    '[2,"9","Reset",{"type":"Hard"}]',  # no handler
+    '[2,"10","Bogus",{}]',  # not an OCPP 1.6 action
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec_name", ["ocpp", "auto"])
+async def test_dispatch_answers_exactly_like_ocpp(codec_name):
+    if codec_name == "ocpp":
+        codec.uninstall()
+    else:
+        codec.install(codec_name)
+    plain, fast = Station("CP1", Conn()), FastStation("CP1", Conn())
+    for frame in FRAMES:
+        await plain.route_message(frame)
+        await fast.route_message(frame)
+    await asyncio.sleep(0)  # after hooks
+    assert [json.loads(m) for m in fast._connection.sent] == [json.loads(m) for m in plain._connection.sent]
+    assert fast._connection.sent == plain._connection.sent
+    assert fast.seen == plain.seen
+    assert ("status", 1, "Charging", "2") in fast.seen and ("after", 2) in fast.seen
+    codec.uninstall()
+
+
+def test_constant_replies_are_serialized_once():
+    async def run():
+        cp = FastStation("CP1", Conn())
+        for i in range(3):
+            await cp.route_message(f'[2,"{i}","DataTransfer",{{"vendorId":"acme"}}]')
+        return cp
+
+    cp = asyncio.run(run())
+    assert cp._connection.sent[-1] == '[3,"2",{"status":"Accepted"}]'
+    bodies = [body for key, body in FastStation._constant_bodies.items() if key[0] == "DataTransfer"]
+    assert bodies == ['{"status":"Accepted"}']
+
+
+def test_key_conversion_matches_ocpp():
+    payload = {"connectorId": 1, "meterValue": [{"sampledValue": [{"value": "1", "measurand": "SoC"}]}], "SoC": 5}
+    assert snake_case(payload) == camel_to_snake_case(payload)
+    reply = call_result.GetConfigurationPayload(
+        configuration_key=[{"key": "k", "readonly": True, "value": None}], unknown_key=None
+    )
+    assert camel_case(reply) == snake_to_camel_case(remove_nones(asdict(reply)))
+    assert camel_case({"state_of_charge_soc": 1, "is_v2x": None}) == snake_to_camel_case({"state_of_charge_soc": 1})
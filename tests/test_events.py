@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from csms.events import EventBus
+
+
+@pytest.mark.asyncio
+async def test_subscribers_receive_only_matching_events():
+    bus = EventBus()
+    all_events = bus.subscribe()
+    cp1_status = bus.subscribe(cpids=["CP1"], types=["status"])
+    bus.publish("status", "CP1", {"status": "Charging"})
+    bus.publish("status", "CP2", {"status": "Available"})
+    bus.publish("meter", "CP1", {"samples": []})
+
+    got = [await all_events.get(timeout=0.1) for _ in range(3)]
+    assert [(e["type"], e["cpid"]) for e in got] == [("status", "CP1"), ("status", "CP2"), ("meter", "CP1")]
+    first = await cp1_status.get(timeout=0.1)
+    assert first["data"] == {"status": "Charging"}
+    assert await cp1_status.get(timeout=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_without_blocking_publish():
+    bus = EventBus(buffer_size=2)
+    slow = bus.subscribe()
+    fast = bus.subscribe(maxsize=10)
+    for i in range(3):
+        bus.publish("status", "CP1", {"n": i})
+    assert slow.closed and slow.reason == "overflow"
+    assert bus.subscribers == [fast]
+    assert bus.overflows == 1
+    # buffered events are still delivered before the stream ends
+    assert [e["data"]["n"] async for e in slow] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_publish_without_subscribers_is_a_no_op():
+    bus = EventBus()
+    bus.publish("status", "CP1", {})
+    assert bus.published == 0
+    sub = bus.subscribe()
+    waiter = asyncio.create_task(sub.get())
+    await asyncio.sleep(0)
+    bus.publish("status", "CP1", {})
+    assert (await asyncio.wait_for(waiter, 1))["id"] == 1
@@ -0,0 +1,35 @@
+import pytest
+
+from conftest import CSMS
+from sim.fleet import Fleet, build_stations
+
+
+def test_build_stations_shards_cover_fleet_once():
+    shards = [build_stations(10, "FL", "ws://x/ocpp", shard=s, shards=3) for s in range(3)]
+    cpids = [st.cpid for shard in shards for st in shard]
+    assert sorted(cpids) == [f"FL{i:05d}" for i in range(1, 11)]
+    assert [len(s) for s in shards] == [4, 3, 3]
+
+
+@pytest.mark.asyncio
+async def test_fleet_connects_and_churns_sessions():
+    csms = CSMS()
+    await csms.start()
+    try:
+        stations = build_stations(5, "FL", csms.url, meter_period_sec=1)
+        fleet = Fleet(
+            stations,
+            ramp_per_sec=20,
+            sessions_per_hour=3600 * 5,
+            session_sec=0.2,
+            report_sec=0,
+        )
+        stats = await fleet.run(duration=3)
+    finally:
+        await csms.stop()
+
+    assert stats["stations"] == 5
+    assert stats["connects"] == 5
+    assert stats["errors"] == 0
+    assert stats["sessionsStarted"] > 0
+    assert stats["sessionErrors"] == 0
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+import websockets
+from ocpp.v16 import ChargePoint, call
+
+import central
+from csms.charger_state import ChargerStates
+from csms.liveness import Liveness
+from csms.timers import TimerWheel
+from csms.tx_store import MemoryTransactionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSocket:
+    """Answers pings only while ``answering``; records fail_connection."""
+
+    def __init__(self):
+        self.answering = True
+        self.pings = 0
+        self.failed = None
+
+    async def ping(self):
+        self.pings += 1
+        waiter = asyncio.get_running_loop().create_future()
+        if self.answering:
+            waiter.set_result(None)
+        return waiter
+
+    def fail_connection(self, code, reason):
+        self.failed = (code, reason)
+
+
+@pytest.mark.asyncio
+async def test_missing_pong_fails_the_connection():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    liveness = Liveness(wheel, interval=20, timeout=5)
+    ws = FakeSocket()
+    probe = liveness.watch(ws, "CP1")
+    probe.set_interval(10)  # the charger's WebSocketPingInterval
+
+    clock.now = 10
+    wheel.advance()
+    for _ in range(3):  # ping task, then the waiter's done callback
+        await asyncio.sleep(0)
+    assert ws.pings == 1 and probe.rtt is not None and len(wheel) == 1  # pong arrived, next ping armed
+
+    ws.answering = False
+    clock.now = 20
+    wheel.advance()
+    for _ in range(3):  # ping task, then the waiter's done callback
+        await asyncio.sleep(0)
+    assert ws.pings == 2 and ws.failed is None
+    clock.now = 25
+    wheel.advance()
+    assert ws.failed == (1011, "ping timeout")
+    assert (liveness.pings, liveness.timeouts) == (2, 1) and len(wheel) == 0
+
+
+class Station(ChargePoint):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_reconnect_takes_over_the_open_connection(monkeypatch, unused_tcp_port):
+    monkeypatch.setattr(central, "tx_store", MemoryTransactionStore())
+    monkeypatch.setattr(central, "session_index", central.SessionIndex())
+    monkeypatch.setattr(central, "charger_states", ChargerStates(central.timers, 60, central._new_pending_starts))
+    url = f"ws://127.0.0.1:{unused_tcp_port}/ocpp/DUP1"
+    takeovers = central.connection_takeovers.labels().value
+
+    async def connect():
+        ws = await websockets.connect(url, subprotocols=["ocpp1.6"])
+        cp = Station("DUP1", ws)
+        reader = asyncio.create_task(cp.start())
+        await cp.call(call.BootNotificationPayload(charge_point_model="M", charge_point_vendor="V"))
+        return ws, cp, reader
+
+    async with websockets.serve(central.ocpp_handler, "127.0.0.1", unused_tcp_port, subprotocols=["ocpp1.6"]):
+        old_ws, cp, old_reader = await connect()
+        conf = await cp.call(
+            call.StartTransactionPayload(connector_id=1, id_tag="TAG", meter_start=0, timestamp="2024-01-01T00:00:00Z")
+        )
+        old_side = central.connected_cps["DUP1"]
+
+        # the charger reconnects while the CSMS still holds the first socket
+        new_ws, cp, new_reader = await connect()
+        new_side = central.connected_cps["DUP1"]
+        assert new_side is not old_side and new_side.resumed
+        await asyncio.wait_for(old_ws.wait_closed(), 5)
+        assert old_ws.close_code == 1001
+        for _ in range(100):
+            if old_side.state.owner is not old_side and old_side.probe.closed:
+                break
+            await asyncio.sleep(0.01)
+
+        # the old handler's cleanup left the new connection registered, with the session
+        assert central.connected_cps["DUP1"] is new_side
+        assert new_side.active_tx[1]["transaction_id"] == conf.transaction_id
+        assert central.connection_takeovers.labels().value == takeovers + 1
+        assert central.charger_states.detached == 0
+
+        await new_ws.close()
+        for task in (old_reader, new_reader):
+            task.cancel()
+        await asyncio.gather(old_reader, new_reader, return_exceptions=True)
+        for _ in range(100):
+            if "DUP1" not in central.connected_cps:
+                break
+            await asyncio.sleep(0.01)
+    assert "DUP1" not in central.connected_cps
@@ -0,0 +1,51 @@
+import json
+import logging
+import queue
+
+from ocpp_common.logs import ContextLogger, DroppingQueueHandler, JsonFormatter, Lazy, SamplingFilter, parse_sample_rules
+
+
+def _record(msg, *args, level=logging.INFO, **extra):
+    logger = logging.getLogger("test.logs")
+    return logger.makeRecord("test.logs", level, __file__, 1, msg, args, None, extra=extra)
+
+
+def test_json_formatter_includes_extra_and_evaluates_lazy_late():
+    calls = []
+    lazy = Lazy(lambda: calls.append(1) or "payload")
+    rec = _record("MeterValues %s", lazy, cpid="CP1", action="MeterValues")
+    assert calls == []
+    out = json.loads(JsonFormatter().format(rec))
+    assert out["msg"] == "MeterValues payload"
+    assert out["cpid"] == "CP1"
+    assert out["action"] == "MeterValues"
+    assert out["level"] == "INFO"
+    assert calls == [1]
+
+
+def test_sampling_keeps_one_in_n_and_rate_limits():
+    f = SamplingFilter(parse_sample_rules("Heartbeat=3, MeterValues=2/s"))
+    kept = [f.filter(_record("hb", action="Heartbeat")) for _ in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+    kept = [f.filter(_record("mv", action="MeterValues")) for _ in range(5)]
+    assert kept == [True, True, False, False, False]
+    # ไม่มี action หรือเป็น warning ขึ้นไป: ผ่านเสมอ
+    assert f.filter(_record("other"))
+    assert f.filter(_record("hb", level=logging.WARNING, action="Heartbeat"))
+    assert f.suppressed == 7
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    q = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(q)
+    logger = logging.getLogger("test.logs.queue")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        ContextLogger(logger, {"cpid": "CP9"}).warning("first %s", 1, extra={"action": "x"})
+        logger.warning("second")
+    finally:
+        logger.removeHandler(handler)
+    rec = q.get_nowait()
+    assert rec.args == (1,) and rec.cpid == "CP9" and rec.action == "x"
+    assert handler.dropped == 1
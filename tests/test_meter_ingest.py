@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from csms.meter_ingest import MeterIngestor, SQLiteMeterSink, parse_meter_values
+
+METER_VALUE = [
+    {
+        "timestamp": "2024-01-01T00:00:10Z",
+        "sampled_value": [
+            {"value": "1.250", "measurand": "Energy.Active.Import.Register", "unit": "kWh"},
+            {"value": "31.5", "measurand": "Current.Import", "unit": "A"},
+            {"value": "not-a-number", "measurand": "Voltage", "unit": "V"},
+            {"value": "42"},
+        ],
+    }
+]
+
+
+def test_parse_meter_values_flattens_and_applies_defaults():
+    samples = parse_meter_values("CP1", "2", METER_VALUE, transaction_id=7)
+    assert len(samples) == 3
+    ts, cpid, cid, tx, measurand, phase, unit, value = samples[0]
+    assert (cpid, cid, tx, measurand, unit, value) == ("CP1", 2, 7, "Energy.Active.Import.Register", "kWh", 1.25)
+    assert ts == 1704067210.0
+    assert samples[2][4:] == ("Energy.Active.Import.Register", None, "Wh", 42.0)
+
+
+def test_offer_applies_backpressure():
+    ing = MeterIngestor(max_queue=4, batch_size=2)
+    samples = parse_meter_values("CP1", 1, METER_VALUE)
+    assert ing.offer(samples) == 3
+    assert ing.offer(samples) == 1
+    stats = ing.stats()
+    assert stats["queued"] == 4
+    assert stats["accepted"] == 4
+    assert stats["dropped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batches_to_sqlite(tmp_path):
+    path = str(tmp_path / "mv.db")
+    ing = MeterIngestor(max_queue=100, batch_size=2, flush_interval=0.01)
+    await ing.start(SQLiteMeterSink(path))
+    ing.offer(parse_meter_values("CP1", 1, METER_VALUE, transaction_id=1))
+    await ing.stop()
+    assert ing.stats()["written"] == 3
+    assert ing.stats()["batches"] == 2
+    with sqlite3.connect(path) as db:
+        rows = db.execute("SELECT cpid, measurand, value FROM meter_samples ORDER BY value").fetchall()
+    assert rows == [
+        ("CP1", "Energy.Active.Import.Register", 1.25),
+        ("CP1", "Current.Import", 31.5),
+        ("CP1", "Energy.Active.Import.Register", 42.0),
+    ]
+
+
+class SlowSink:
+    """Records batches; a write holds the sink long enough for stop() to arrive mid-write."""
+
+    def __init__(self):
+        self.rows = 0
+        self.busy = False
+        self.overlaps = 0
+        self.closed = False
+        self.writing = threading.Event()
+
+    def write(self, columns):
+        if self.busy or self.closed:
+            self.overlaps += 1
+        self.busy = True
+        self.writing.set()
+        time.sleep(0.05)
+        self.rows += len(columns["ts"])
+        self.busy = False
+
+    def close(self):
+        if self.busy:
+            self.overlaps += 1
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_the_batch_being_written():
+    sink = SlowSink()
+    ing = MeterIngestor(max_queue=100, batch_size=2, flush_interval=0.01)
+    await ing.start(sink)
+    for _ in range(3):
+        ing.offer(parse_meter_values("CP1", 1, METER_VALUE))
+    while not sink.writing.is_set():
+        await asyncio.sleep(0.001)
+    await ing.stop()  # arrives while the first batch is in the worker thread
+    assert sink.overlaps == 0 and sink.closed
+    assert sink.rows == ing.stats()["written"] == 9
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from sim.metering import Metering, NoisePool, measurands
+from sim.ocpp_handlers import EVSEChargePoint
+from sim.state_machine import EVSEModel, EVSEState
+
+
+def test_noise_pool_is_uniform_and_seedable():
+    a, b = NoisePool(size=1000, seed=1), NoisePool(size=1000, seed=1)
+    values = [v for _ in range(5) for v in a.take(700)]  # crosses several refills
+    assert values[:700] == b.take(700)
+    assert all(-1.0 <= v < 1.0 for v in values)
+    assert abs(sum(values) / len(values)) < 0.05
+
+
+def test_measurands_keep_known_names_in_order():
+    assert measurands("SoC, Voltage,Bogus,Energy.Active.Import.Register") == [
+        "SoC", "Voltage", "Energy.Active.Import.Register",
+    ]
+
+
+def _metering(sent, connectors=2, sample="0.1", aligned="0", send=None):
+    model = EVSEModel(connectors=connectors)
+    for cid in model.connectors:
+        model.get(cid).state = EVSEState.CHARGING
+        model.assign_tx(cid, 100 + cid)
+    configuration = {
+        "MeterValueSampleInterval": sample,
+        "ClockAlignedDataInterval": aligned,
+        "MeterValuesSampledData": "Energy.Active.Import.Register,Power.Active.Import",
+        "MeterValuesAlignedData": "Energy.Active.Import.Register",
+    }
+
+    async def record(req):
+        sent.append((asyncio.get_running_loop().time(), req))
+
+    # 3.6 MW: 1 Wh per millisecond
+    return Metering(model, send or record, configuration, offered_w=lambda c: 3_600_000.0, noise_pool=NoisePool(64, 0))
+
+
+@pytest.mark.asyncio
+async def test_connectors_are_sampled_independently_without_drift():
+    sent = []
+    stuck = asyncio.Event()
+
+    async def send(req):
+        if req.connector_id == 1:
+            await stuck.wait()  # connector 1: the CSMS never answers
+        sent.append((asyncio.get_running_loop().time(), req))
+
+    metering = _metering(sent, send=send)
+    start = asyncio.get_running_loop().time()
+    metering.start()
+    await asyncio.sleep(0.55)
+    stuck.set()
+    await asyncio.sleep(0.02)
+    await metering.close()
+
+    times = [t - start for t, req in sent if req.connector_id == 2]
+    assert len(times) == 5
+    # every sample lands on start + k * interval: no accumulated delay
+    assert all(abs(t - 0.1 * (k + 1)) < 0.03 for k, t in enumerate(times))
+    # connector 1 sent its first sample late and skipped the ticks it missed
+    assert len([req for _, req in sent if req.connector_id == 1]) == 1
+    assert metering.skipped >= 3
+
+    req = sent[-1][1]
+    values = {v["measurand"]: v for v in req.meter_value[0]["sampledValue"]}
+    assert set(values) == {"Energy.Active.Import.Register", "Power.Active.Import"}
+    assert values["Power.Active.Import"]["context"] == "Sample.Periodic"
+    assert req.transaction_id in (101, 102)
+
+
+@pytest.mark.asyncio
+async def test_energy_follows_elapsed_time_not_the_interval():
+    sent = []
+    metering = _metering(sent, connectors=1, sample="0.05")
+    c = metering.model.get(1)
+    metering.start()
+    await asyncio.sleep(0.3)
+    metering.advance(c)
+    await metering.close()
+    assert 280 <= c.meter_wh <= 340
+
+    c.state = EVSEState.SUSPENDED_EV
+    before = c.meter_wh
+    await asyncio.sleep(0.05)
+    metering.advance(c)
+    assert c.meter_wh == before
+
+
+@pytest.mark.asyncio
+async def test_clock_aligned_samples_fall_on_wall_clock_multiples():
+    sent = []
+    metering = _metering(sent, connectors=1, sample="0", aligned="0.1")
+    metering.model.clear_tx(101)
+    metering.start()
+    await asyncio.sleep(0.35)
+    await metering.close()
+    assert len(sent) >= 3
+    for _, req in sent:
+        assert req.transaction_id is None
+        value = req.meter_value[0]["sampledValue"][0]
+        assert value["context"] == "Sample.Clock"
+        at = datetime.fromisoformat(req.meter_value[0]["timestamp"]).timestamp()
+        assert round(at * 10, 3) == round(at * 10)
+
+
+@pytest.mark.asyncio
+async def test_change_configuration_reschedules_metering():
+    sent = []
+    metering = _metering(sent, connectors=1, sample="60")
+    changed = []
+
+    def config_cb(key):
+        changed.append(key)
+        metering.reconfigure()
+
+    cp = EVSEChargePoint(
+        "CP1", None, metering.model, None, None, None, configuration=metering.configuration, config_cb=config_cb
+    )
+    metering.start()
+    results = [
+        (await cp.on_change_configuration(key=key, value=value)).status
+        for key, value in (
+            ("MeterValueSampleInterval", "fast"),
+            ("NumberOfConnectors", "4"),
+            ("NoSuchKey", "1"),
+            ("MeterValueSampleInterval", "0"),
+        )
+    ]
+    assert results == ["Rejected", "Rejected", "NotSupported", "Accepted"]
+    assert changed == ["MeterValueSampleInterval"]
+    conf = await cp.on_get_configuration()
+    assert {"key": "MeterValueSampleInterval", "readonly": False, "value": "0"} in conf.configuration_key
+    # interval 0 = sampled data disabled
+    await asyncio.sleep(0.05)
+    assert metering._sampled == {} and sent == []
+    await metering.close()
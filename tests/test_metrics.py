@@ -0,0 +1,43 @@
+from csms.metrics import MetricsRegistry, merge_families, render
+
+
+def test_counter_histogram_and_gauge_render():
+    reg = MetricsRegistry()
+    c = reg.counter("msgs", "Messages", ["action"])
+    h = reg.histogram("latency_seconds", "Latency", ["action"], buckets=(0.01, 0.1))
+    g = reg.gauge("connected", "Connected")
+    c.labels("Heartbeat").inc()
+    c.labels("Heartbeat").inc(2)
+    for v in (0.005, 0.05, 0.5):
+        h.labels("Heartbeat").observe(v)
+    g.set_function(lambda: 7)
+
+    text = render(reg.collect())
+    assert "# TYPE msgs counter" in text
+    assert 'msgs_total{action="Heartbeat"} 3' in text
+    assert 'latency_seconds_bucket{action="Heartbeat",le="0.01"} 1' in text
+    assert 'latency_seconds_bucket{action="Heartbeat",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{action="Heartbeat",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{action="Heartbeat"} 3' in text
+    assert "connected 7" in text
+
+
+def test_counter_computed_at_scrape_time():
+    reg = MetricsRegistry()
+    fired = {"n": 3}
+    reg.counter("timers_fired", "Fired").set_function(lambda: fired["n"])
+    reg.counter("drops", "Drops", ["reason"]).set_function(lambda: {("full",): 2})
+    text = render(reg.collect())
+    assert "# TYPE timers_fired counter" in text
+    assert "timers_fired_total 3" in text
+    assert 'drops_total{reason="full"} 2' in text
+
+
+def test_merge_families_tags_worker():
+    a, b = MetricsRegistry(), MetricsRegistry()
+    a.counter("msgs", "Messages").inc()
+    b.counter("msgs", "Messages").inc(5)
+    text = render(merge_families({"0": a.collect(), "1": b.collect()}))
+    assert text.count("# TYPE msgs counter") == 1
+    assert 'msgs_total{worker="0"} 1' in text
+    assert 'msgs_total{worker="1"} 5' in text
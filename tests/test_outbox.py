@@ -0,0 +1,121 @@
+import pytest
+from ocpp.v16 import call
+
+from sim.outbox import Outbox, batches
+from sim.connection import LinkState
+from sim.station import SimStation
+
+
+def _meter(tx_id, wh, connector_id=1):
+    return call.MeterValuesPayload(
+        connector_id=connector_id,
+        transaction_id=tx_id,
+        meter_value=[{"timestamp": f"2024-01-01T00:00:{wh:02d}Z", "sampledValue": [{"value": str(wh)}]}],
+    )
+
+
+def _stop(tx_id):
+    return call.StopTransactionPayload(transaction_id=tx_id, meter_stop=99, timestamp="2024-01-01T00:01:00Z")
+
+
+@pytest.mark.asyncio
+async def test_outbox_survives_reopen_and_drops_meter_values_first(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    box = Outbox(path, max_per_cp=3)
+    box.put("CP1", _meter(7, 1))
+    box.put("CP1", _stop(7))
+    box.put("CP1", _meter(8, 2))
+    box.put("CP2", _meter(9, 3))
+    box.put("CP1", _meter(8, 4))  # full: the oldest MeterValues goes
+    assert box.dropped == 1 and box.pending("CP1") == 3
+    await box.flush()
+    box.close()
+
+    box = Outbox(path, max_per_cp=3)
+    assert (box.pending("CP1"), box.pending("CP2"), len(box)) == (3, 1, 4)
+    rows = await box.peek("CP1", 10)
+    assert [action for _, action, _ in rows] == ["StopTransaction", "MeterValues", "MeterValues"]
+    assert rows[0][2] == {"transaction_id": 7, "meter_stop": 99, "timestamp": "2024-01-01T00:01:00Z"}
+    await box.ack("CP1", [seq for seq, _, _ in rows[:2]])
+    assert box.pending("CP1") == 1
+    box.close()
+
+
+@pytest.mark.asyncio
+async def test_batches_merge_consecutive_meter_values_of_one_transaction():
+    box = Outbox()
+    for p in (_meter(1, 1), _meter(1, 2), _meter(1, 3), _meter(1, 4, connector_id=2), _stop(1), _meter(2, 5)):
+        box.put("CP1", p)
+    out = batches(await box.peek("CP1", 10), max_meter_values=2)
+    assert [(len(seqs), type(p).__name__) for seqs, p in out] == [
+        (2, "MeterValuesPayload"),
+        (1, "MeterValuesPayload"),
+        (1, "MeterValuesPayload"),
+        (1, "StopTransactionPayload"),
+        (1, "MeterValuesPayload"),
+    ]
+    assert [mv["timestamp"][-3:-1] for mv in out[0][1].meter_value] == ["01", "02"]
+
+
+@pytest.mark.asyncio
+async def test_puts_are_written_in_one_batch_off_the_event_loop(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), max_per_cp=2)
+    for wh in range(4):
+        box.put("CP1", _meter(1, wh))
+    box.put("CP1", _stop(1))
+    assert box.pending("CP1") == 2 and box.dropped == 3
+    assert box._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0] == 0  # nothing written yet
+    assert box._db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    rows = await box.peek("CP1", 10)
+    assert [(action, kwargs.get("meter_value", [{}])[0].get("timestamp")) for _, action, kwargs in rows] == [
+        ("MeterValues", "2024-01-01T00:00:03Z"),
+        ("StopTransaction", None),
+    ]
+    box.put("CP2", _meter(2, 1))
+    box.close()  # writes what is still buffered
+    box = Outbox(str(tmp_path / "outbox.db"))
+    assert box.pending("CP2") == 1
+    box.close()
+
+
+class Recorder:
+    def __init__(self, fail=0):
+        self.sent = []
+        self.fail = fail
+
+    async def call(self, payload):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("link down")
+        self.sent.append(payload)
+        return object()
+
+
+@pytest.mark.asyncio
+async def test_station_buffers_while_offline_and_replays_in_order():
+    station = SimStation("CP1", "ws://unused/ocpp", outbox=Outbox(), outbox_batch=10)
+    station.cp = Recorder(fail=1)
+    station.set_state(LinkState.ONLINE)
+    # online but the CALL fails: queued, nothing is lost
+    await station.send_transaction_message(_meter(5, 1))
+    assert station.outbox.pending("CP1") == 1 and station.cp.sent == []
+
+    station.set_state(LinkState.DISCONNECTED)
+    for wh in (2, 3):
+        await station.send_transaction_message(_meter(5, wh))
+    await station.send_transaction_message(_stop(5))
+    await station.send_transaction_message(_meter(6, 4))
+    assert station.buffered == 5
+
+    station.set_state(LinkState.ONLINE)
+    await station.replay_outbox()
+
+    sent = station.cp.sent
+    assert [type(p).__name__ for p in sent] == ["MeterValuesPayload", "StopTransactionPayload", "MeterValuesPayload"]
+    assert len(sent[0].meter_value) == 3 and sent[1].transaction_id == 5 and sent[2].transaction_id == 6
+    assert station.replayed == 5 and station.outbox.pending("CP1") == 0
+
+    # queue empty again: sent straight away
+    await station.send_transaction_message(_meter(6, 5))
+    assert len(sent) == 4 and station.buffered == 5
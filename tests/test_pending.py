@@ -0,0 +1,99 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+import central
+from csms.pending import PendingStarts
+from csms.timers import TimerWheel
+from csms.tx_store import MemoryTransactionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _pending(ttl=60, max_entries=64):
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    outcomes = Counter()
+    pending = PendingStarts(wheel, ttl, max_entries, on_outcome=lambda o: outcomes.update([o]), clock=clock)
+    return clock, wheel, pending, outcomes
+
+
+def test_pending_start_expires_and_stops_enforcing_its_id_tag():
+    clock, wheel, pending, outcomes = _pending(ttl=60)
+    pending.expect(1, "TAG", vid="V1")
+    assert pending.expected_id_tag(1) is None  # not accepted yet
+    clock.now = 50
+    pending.accept(1, "TAG")  # TTL restarts here
+    assert pending.expected_id_tag(1) == "TAG"
+    clock.now = 100
+    wheel.advance()
+    assert pending.expected_id_tag(1) == "TAG"
+    clock.now = 111
+    wheel.advance()
+    assert pending.expected_id_tag(1) is None and len(pending) == 0 and len(wheel) == 0
+    assert outcomes == {"expired": 1}
+
+    pending.accept(2, "OTHER")  # accepted without expect (console start)
+    assert pending.finish(2, "completed").id_tag == "OTHER"
+    assert pending.finish(2, "completed") is None
+    assert outcomes == {"expired": 1, "completed": 1} and len(wheel) == 0
+
+
+def test_pending_starts_are_bounded_per_charger():
+    clock, wheel, pending, outcomes = _pending(max_entries=2)
+    pending.expect(1, "A")
+    pending.expect(2, "B")
+    pending.expect(1, "A2")  # same connector: replaces
+    pending.expect(3, "C")  # full: the oldest (connector 2) goes
+    assert sorted(e.connector_id for e in pending) == [1, 3]
+    assert outcomes == {"replaced": 1, "evicted": 1}
+    pending.clear("disconnected")
+    assert len(pending) == 0 and len(wheel) == 0 and outcomes["disconnected"] == 2
+
+
+class Conn:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+@pytest.mark.asyncio
+async def test_stale_remote_start_does_not_reject_a_later_session(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(central, "timers", TimerWheel(tick=1.0, clock=clock))
+    monkeypatch.setattr(central, "tx_store", MemoryTransactionStore())
+    monkeypatch.setattr(central, "session_index", central.SessionIndex())
+    cp = central.CentralSystem("PS1", Conn())
+    cp.unlock_connector = lambda connector_id: asyncio.sleep(0)
+    before = central.remote_start_outcomes.labels("expired").value
+    start = '[2,"{}","StartTransaction",{{"connectorId":{},"idTag":"{}","meterStart":0,"timestamp":"2024-01-01T00:00:00Z"}}]'
+
+    # accepted RemoteStart for REMOTE on connector 1, charger starts with another card: rejected
+    cp.pending_starts.expect(1, "REMOTE", vid="VID1")
+    cp.pending_starts.accept(1, "REMOTE")
+    await cp.route_message(start.format(1, 1, "LOCAL"))
+    assert '"Invalid"' in cp._connection.sent[-1]
+
+    # the charger never starts the next one: after the TTL a local card is fine again
+    cp.pending_starts.expect(1, "REMOTE")
+    cp.pending_starts.accept(1, "REMOTE")
+    clock.now += central.PENDING_START_TTL_SEC + 1
+    central.timers.advance()
+    await cp.route_message(start.format(2, 1, "LOCAL"))
+    assert '"Accepted"' in cp._connection.sent[-1]
+    assert central.remote_start_outcomes.labels("expired").value == before + 1
+
+    # completed remote start hands its vid to the transaction
+    cp.pending_starts.expect(2, "REMOTE", vid="VID2")
+    cp.pending_starts.accept(2, "REMOTE")
+    await cp.route_message(start.format(3, 2, "REMOTE"))
+    assert cp.active_tx[2]["vid"] == "VID2" and len(cp.pending_starts) == 0
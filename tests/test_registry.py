@@ -0,0 +1,159 @@
+import socket
+
+import pytest
+
+from csms.registry import SessionRegistry, RemoteCallError
+
+
+def _free_base_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pair():
+    owners: dict = {}
+    base = _free_base_port()
+    a, b = SessionRegistry(), SessionRegistry()
+    a.share(0, 2, owners, "127.0.0.1", base, rpc_timeout=2)
+    b.share(1, 2, owners, "127.0.0.1", base, rpc_timeout=2)
+    return owners, a, b
+
+
+def test_local_registry_behaves_like_dict():
+    reg = SessionRegistry()
+    reg["CP1"] = object()
+    assert "CP1" in reg
+    assert not reg.is_remote("CP1")
+    assert not reg.is_remote("CP2")
+    assert reg.pop("CP1", None) is not None
+    assert reg.all_cpids() == []
+
+
+def test_discard_leaves_a_newer_connection_in_place():
+    reg = SessionRegistry()
+    old, new = object(), object()
+    reg["CP1"] = old
+    reg["CP1"] = new
+    assert not reg.discard("CP1", old)
+    assert reg["CP1"] is new
+    assert reg.discard("CP1", new)
+    assert "CP1" not in reg
+
+
+async def _serve(*workers):
+    async def dispatch(op, body):
+        return None
+
+    return [await w.serve_rpc(dispatch) for w in workers]
+
+
+async def _close(servers):
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_ownership_is_released_only_by_owner():
+    owners, a, b = _pair()
+    servers = await _serve(a, b)
+    try:
+        a["CP1"] = "conn-a"
+        await a.wait_owner_updates()
+        assert owners == {"CP1": 0}
+        assert b.is_remote("CP1") and b.all_cpids() == ["CP1"]
+        assert a.fleet_size() == b.fleet_size() == 1
+        # charger reconnected to worker 1 before worker 0 noticed the drop
+        b["CP1"] = "conn-b"
+        await b.wait_owner_updates()
+        a.pop("CP1", None)
+        await a.wait_owner_updates()
+        assert owners == {"CP1": 1}
+        assert a.is_remote("CP1") and not b.is_remote("CP1")
+
+        b.pop("CP1", None)
+        await b.wait_owner_updates()
+        assert owners == {} and not a.is_remote("CP1")
+    finally:
+        await _close(servers)
+
+
+@pytest.mark.asyncio
+async def test_reconnect_to_another_worker_evicts_the_stale_connection():
+    owners, a, b = _pair()
+    evicted = []
+    a.on_evict = lambda cpid, cp: evicted.append((cpid, cp))
+    servers = await _serve(a, b)
+    try:
+        a["CP1"] = "conn-a"
+        a["CP2"] = "conn-a2"
+        await a.wait_owner_updates()
+
+        b["CP1"] = "conn-b"
+        await b.wait_owner_updates()
+        assert evicted == [("CP1", "conn-a")]
+        assert "CP1" not in a and a.is_remote("CP1") and owners["CP1"] == 1
+        # the evicted connection's own cleanup changes nothing
+        assert not a.discard("CP1", "conn-a")
+        await a.wait_owner_updates()
+        assert owners["CP1"] == 1
+
+        # a claim older than the local connection does not evict it
+        assert a._owner_changed("claim", {"cpid": "CP2", "worker": 1, "at": 0.0}) == {"evicted": False}
+        assert a["CP2"] == "conn-a2" and evicted == [("CP1", "conn-a")]
+
+        # disconnected from a first (its state waits for a reconnect), then moved to b
+        a["CP3"] = "conn-a3"
+        await a.wait_owner_updates()
+        assert a.discard("CP3", "conn-a3")
+        await a.wait_owner_updates()
+        b["CP3"] = "conn-b3"
+        await b.wait_owner_updates()
+        assert evicted[-1] == ("CP3", None) and a.is_remote("CP3")
+    finally:
+        await _close(servers)
+
+
+@pytest.mark.asyncio
+async def test_restarted_worker_seeds_its_cache_from_the_shared_map():
+    owners, a, b = _pair()
+    owners["CP9"] = 1
+    servers = await _serve(a)
+    try:
+        assert a.is_remote("CP9") and a.owner("CP9") == 1
+    finally:
+        await _close(servers)
+
+
+@pytest.mark.asyncio
+async def test_forward_and_gather_between_workers():
+    owners, a, b = _pair()
+
+    async def dispatch(op, body):
+        if op == "fail":
+            err = Exception("nope")
+            err.status_code, err.detail = 404, "nope"
+            raise err
+        return {"worker": a.worker_id, "op": op, "body": body}
+
+    server = await a.serve_rpc(dispatch)
+    servers = await _serve(b)
+    try:
+        a["CP1"] = "conn"
+        await a.wait_owner_updates()
+        res = await b.forward("CP1", "start", {"connectorId": 1})
+        assert res == {"worker": 0, "op": "start", "body": {"connectorId": 1}}
+
+        with pytest.raises(RemoteCallError) as exc:
+            await b.forward("CP1", "fail", {})
+        assert exc.value.status_code == 404
+
+        with pytest.raises(RemoteCallError):
+            await b.forward("UNKNOWN", "start", {})
+
+        assert await b.gather("active", {}) == [{"worker": 0, "op": "active", "body": {}}]
+    finally:
+        server.close()
+        await server.wait_closed()
+        await _close(servers)
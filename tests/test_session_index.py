@@ -0,0 +1,69 @@
+from csms.session_index import SessionIndex
+
+
+def _info(tx_id, tag):
+    return {"transaction_id": tx_id, "id_tag": tag}
+
+
+def test_add_and_lookup_by_tx_tag_and_cp():
+    idx = SessionIndex()
+    idx.add("CP1", 1, _info(10, "A"))
+    idx.add("CP1", 2, _info(11, "B"))
+    idx.add("CP2", 1, _info(12, "A"))
+    assert idx.get_tx(11) == {"cpid": "CP1", "connectorId": 2, "idTag": "B", "transactionId": 11}
+    assert [s["transactionId"] for s in idx.for_tag("A")] == [10, 12]
+    assert [s["transactionId"] for s in idx.for_tag("A", "CP2")] == [12]
+    assert [s["connectorId"] for s in idx.for_cp("CP1")] == [1, 2]
+    assert [s["transactionId"] for s in idx.sessions()] == [10, 11, 12]
+
+
+def test_remove_and_drop_cp_clean_every_index():
+    idx = SessionIndex()
+    idx.add("CP1", 1, _info(3, "A"))
+    idx.add("CP2", 1, _info(1, "A"))
+    idx.add("CP1", 2, _info(2, "B"))
+    assert [s["transactionId"] for s in idx.sessions()] == [1, 2, 3]
+    assert idx.remove(1)["cpid"] == "CP2"
+    assert idx.remove(1) is None
+    assert len(idx.drop_cp("CP1")) == 2
+    assert len(idx) == 0
+    assert idx.by_tag == {} and idx.by_cp == {} and idx.sessions() == []
+
+
+def test_new_session_on_same_connector_replaces_old_one():
+    idx = SessionIndex()
+    idx.add("CP1", 1, _info(1, "A"))
+    idx.add("CP1", 1, _info(2, "B"))
+    assert idx.get_tx(1) is None
+    assert idx.for_tag("A") == []
+    assert [s["transactionId"] for s in idx.sessions()] == [2]
+
+
+def test_page_walks_sessions_with_cursor():
+    idx = SessionIndex()
+    for tx in range(1, 6):
+        idx.add(f"CP{tx}", 1, _info(tx, "A"))
+    page, cursor = idx.page(limit=2)
+    assert [s["transactionId"] for s in page] == [1, 2] and cursor == 2
+    page, cursor = idx.page(cursor=cursor, limit=2)
+    assert [s["transactionId"] for s in page] == [3, 4] and cursor == 4
+    page, cursor = idx.page(cursor=cursor, limit=2)
+    assert [s["transactionId"] for s in page] == [5] and cursor is None
+
+
+def test_changes_since_reports_net_opened_and_closed():
+    idx = SessionIndex(change_log=4)
+    idx.add("CP1", 1, _info(1, "A"))
+    idx.add("CP1", 2, _info(2, "B"))
+    seen = idx.version
+    idx.remove(1)                       # closed after `seen`
+    idx.add("CP2", 1, _info(3, "C"))    # opened after `seen`
+    idx.add("CP3", 1, _info(4, "D"))
+    idx.remove(4)                       # opened and closed within the window
+    opened, closed = idx.changes_since(seen)
+    assert [s["transactionId"] for s in opened] == [3]
+    assert [s["transactionId"] for s in closed] == [1]
+    assert idx.changes_since(idx.version) == ([], [])
+    # older than the retained log, or from before a restart
+    assert idx.changes_since(0) is None
+    assert idx.changes_since(idx.version + 1) is None
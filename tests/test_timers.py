@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import central
+from csms.timers import TimerWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_timers_fire_once_in_order_never_early():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, slots=8, clock=clock)
+    fired = []
+    for delay in (0.2, 3, 3.5, 20, 100):  # 20 and 100 are more than one revolution away
+        wheel.schedule(delay, fired.append, delay)
+    assert len(wheel) == 5
+
+    clock.now += 0.9
+    assert wheel.advance() == 0
+    clock.now += 0.2
+    wheel.advance()
+    assert fired == [0.2]
+    clock.now += 2.5  # 3.6 s
+    wheel.advance()
+    assert fired == [0.2, 3]  # 3.5 s rounds up to the 4th tick
+    clock.now += 0.5
+    wheel.advance()
+    assert fired == [0.2, 3, 3.5]
+    clock.now += 15.5  # 19.6 s: the 20 s timer shares a bucket with tick 4 but is a later round
+    wheel.advance()
+    assert fired == [0.2, 3, 3.5]
+    # the loop was blocked for longer than a revolution: everything due fires in one pass
+    clock.now += 200
+    assert wheel.advance() == 2
+    assert fired == [0.2, 3, 3.5, 20, 100] and len(wheel) == 0 and wheel.fired == 5
+
+
+def test_cancel_is_idempotent_and_callbacks_can_cancel_others():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=1.0, slots=4, clock=clock)
+    fired = []
+    later = wheel.schedule(1, fired.append, "later")
+    first = wheel.schedule(1, lambda: later.cancel())
+    wheel.schedule(1, fired.append, "other")
+    gone = wheel.schedule(2, fired.append, "gone")
+    assert gone.cancel() and not gone.cancel() and not gone.active
+    wheel.schedule(1, lambda: 1 / 0)  # a failing callback does not stop the others
+    clock.now += 1
+    wheel.advance()
+    assert not first.active
+    # "later" was armed before the canceller: it fired first, the cancel is a no-op
+    assert fired == ["later", "other"] and len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_driver_wakes_per_tick_only_while_armed():
+    wheel = TimerWheel(tick=0.02)
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    wheel.schedule(0.05, done.set)
+    await asyncio.wait_for(done.wait(), 1)
+    assert 0.05 <= loop.time() - start < 0.2
+    for _ in range(1000):
+        wheel.schedule(0.05, lambda: None).cancel()
+    assert len(wheel) == 0 and wheel.cancelled == 1000
+    await wheel.close()
+
+
+class Conn:
+    async def send(self, message):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_no_session_watchdog_runs_on_the_shared_wheel(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(central, "timers", TimerWheel(tick=1.0, clock=clock))
+    cp = central.CentralSystem("WD1", Conn())
+    unlocked = []
+
+    async def unlock(connector_id):
+        unlocked.append(connector_id)
+
+    cp.unlock_connector = unlock
+    status = '[2,"{}","StatusNotification",{{"connectorId":{},"errorCode":"NoError","status":"{}"}}]'
+    await cp.route_message(status.format(1, 1, "Preparing"))
+    await cp.route_message(status.format(2, 2, "Preparing"))
+    await cp.route_message(status.format(3, 1, "Preparing"))  # already armed
+    assert sorted(cp.no_session_timers) == [1, 2] and len(central.timers) == 2
+    await cp.route_message(status.format(4, 2, "Available"))
+    assert list(cp.no_session_timers) == [1] and len(central.timers) == 1
+    cp.pending_starts.accept(1, "TAG")
+
+    clock.now += central.NO_SESSION_TIMEOUT_SEC + 1
+    central.timers.advance()
+    await asyncio.sleep(0)
+    assert unlocked == [1] and cp.no_session_timers == {} and len(cp.pending_starts) == 0
@@ -0,0 +1,69 @@
+from csms.timeseries import MeterSeriesStore, RingSeries
+
+
+def test_ring_series_wraps_and_keeps_order():
+    s = RingSeries(capacity=4)
+    for i in range(6):
+        s.append(float(i), i * 10.0)
+    assert len(s) == 4
+    assert s.range() == ([2.0, 3.0, 4.0, 5.0], [20.0, 30.0, 40.0, 50.0])
+    assert s.range(since=3, until=4) == ([3.0, 4.0], [30.0, 40.0])
+    assert s.last() == (5.0, 50.0)
+
+
+def test_downsample_averages_buckets():
+    s = RingSeries(capacity=16)
+    for t, v in [(0, 1.0), (5, 3.0), (10, 10.0), (19, 20.0), (25, 7.0)]:
+        s.append(float(t), v)
+    assert s.downsample(10) == ([0.0, 10.0, 20.0], [2.0, 15.0, 7.0])
+
+
+def test_store_keys_series_by_connector_and_measurand():
+    store = MeterSeriesStore(capacity=8, max_series=3)
+    store.extend(
+        [
+            (1.0, "CP1", 1, None, "Voltage", None, "V", 230.0),
+            (1.0, "CP1", 1, None, "Current.Import", "L1", "A", 16.0),
+            (2.0, "CP1", 1, None, "Voltage", None, "V", 231.0),
+            (1.0, "CP1", 2, None, "Voltage", None, "V", 229.0),
+            (1.0, "CP2", 1, None, "Voltage", None, "V", 228.0),
+        ]
+    )
+    assert len(store) == 3
+    assert store.rejected_series == 1
+    assert store.measurands("CP1", 1) == ["Voltage", "Current.Import:L1"]
+    [voltage] = store.query("CP1", 1, "Voltage")
+    assert voltage == {"measurand": "Voltage", "unit": "V", "ts": [1.0, 2.0], "value": [230.0, 231.0]}
+    assert store.query("CP2", 1) == []
+
+
+def test_dropping_a_charger_frees_room_for_new_series():
+    store = MeterSeriesStore(capacity=8, max_series=3)
+    store.append("CP1", 1, "Voltage", 1.0, 230.0)
+    store.append("CP1", 2, "Voltage", 1.0, 229.0)
+    store.append("CP2", 1, "Voltage", 1.0, 228.0)
+    store.append("CP3", 1, "Voltage", 1.0, 227.0)
+    assert store.rejected_series == 1
+
+    assert store.drop("CP1") == 2
+    assert store.drop("CP1") == 0
+    assert store.measurands("CP1", 1) == [] and store.get("CP1", 2, "Voltage") is None
+    store.append("CP3", 1, "Voltage", 2.0, 227.0)
+    store.append("CP1", 1, "Voltage", 3.0, 231.0)
+    assert len(store) == 3
+    assert store.query("CP1", 1, "Voltage")[0]["value"] == [231.0]
+
+
+def test_late_samples_are_kept_in_timestamp_order():
+    s = RingSeries(capacity=4)
+    for t in (10.0, 20.0, 40.0):
+        s.append(t, t)
+    s.append(30.0, 30.0)  # replayed after reconnect
+    assert s.range() == ([10.0, 20.0, 30.0, 40.0], [10.0, 20.0, 30.0, 40.0])
+    # full: a late sample evicts the oldest, one older than the window is ignored
+    s.append(15.0, 15.0)
+    s.append(5.0, 5.0)
+    assert s.range() == ([15.0, 20.0, 30.0, 40.0], [15.0, 20.0, 30.0, 40.0])
+    assert s.range(since=18, until=35) == ([20.0, 30.0], [20.0, 30.0])
+    s.append(50.0, 50.0)
+    assert s.range()[0] == [20.0, 30.0, 40.0, 50.0] and s.last() == (50.0, 50.0)
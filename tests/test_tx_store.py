@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from csms.tx_store import MemoryTransactionStore, SQLiteTransactionStore
+
+
+async def _start(store, cpid, connector_id, id_tag="TAG"):
+    tx_id = store.next_transaction_id()
+    await store.start_transaction(cpid, connector_id, {"transaction_id": tx_id, "id_tag": id_tag}, 0, "t0")
+    return tx_id
+
+
+@pytest.mark.asyncio
+async def test_memory_store_tracks_open_transactions():
+    store = MemoryTransactionStore()
+    tx = await _start(store, "CP1", 1)
+    assert await store.load_cp("CP1") == {1: {"transaction_id": tx, "id_tag": "TAG"}}
+    rec = await store.stop_transaction(tx, 100, "t1")
+    assert rec["connector_id"] == 1
+    assert await store.load_cp("CP1") == {}
+    assert await store.stop_transaction(tx, 100, "t1") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_recovers_open_transactions_and_counter(tmp_path):
+    path = str(tmp_path / "tx.db")
+    store = SQLiteTransactionStore(path)
+    await store.open()
+    t1 = await _start(store, "CP1", 1, "A")
+    t2 = await _start(store, "CP1", 2, "B")
+    await store.stop_transaction(t1, 500, "t1", "Local")
+    await store.close()
+
+    reopened = SQLiteTransactionStore(path)
+    await reopened.open()
+    try:
+        assert await reopened.load_cp("CP1") == {2: {"transaction_id": t2, "id_tag": "B"}}
+        # ids are never reissued after a restart
+        assert reopened.next_transaction_id() == t2 + 1
+    finally:
+        await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_group_commits_concurrent_writes(tmp_path):
+    store = SQLiteTransactionStore(str(tmp_path / "tx.db"), commit_delay=0.01)
+    await store.open()
+    try:
+        await asyncio.gather(*(_start(store, f"CP{i}", 1) for i in range(50)))
+        assert store.committed_ops == 50
+        assert store.commits < 5
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_close_commits_the_batch_in_flight(tmp_path):
+    path = str(tmp_path / "tx.db")
+    store = SQLiteTransactionStore(path, commit_delay=0)
+    await store.open()
+    apply, in_thread = store._apply, asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def slow_apply(ops):
+        loop.call_soon_threadsafe(in_thread.set)
+        time.sleep(0.05)
+        apply(ops)
+
+    store._apply = slow_apply
+    first = asyncio.create_task(_start(store, "CP1", 1))
+    await in_thread.wait()
+    second = asyncio.create_task(_start(store, "CP2", 1))  # queued behind the batch in flight
+    await asyncio.sleep(0)
+    await store.close()
+    assert first.done() and second.done()
+    tx1, tx2 = first.result(), second.result()
+
+    reopened = SQLiteTransactionStore(path)
+    await reopened.open()
+    try:
+        assert (await reopened.load_cp("CP1"))[1]["transaction_id"] == tx1
+        assert (await reopened.load_cp("CP2"))[1]["transaction_id"] == tx2
+    finally:
+        await reopened.close()
+
+
+def test_worker_id_spaces_do_not_overlap():
+    a = MemoryTransactionStore(id_stride=3, id_offset=0)
+    b = MemoryTransactionStore(id_stride=3, id_offset=2)
+    ids_a = {a.next_transaction_id() for _ in range(10)}
+    ids_b = {b.next_transaction_id() for _ in range(10)}
+    assert not ids_a & ids_b
+    b._seed_ids(40)
+    assert b.next_transaction_id() == 42
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from sim.metering import Metering, NoisePool
+from sim.ocpp_handlers import EVSEChargePoint
+from sim.station import SimStation
+from sim.state_machine import EVSEState
+from sim.vehicle import DC_TAPER, ChargingLimit, Vehicle, curve_table
+
+
+def test_curve_table_interpolates_the_taper_points():
+    table = curve_table(DC_TAPER, steps=100)
+    assert [table[int(soc * 100)] for soc, _ in DC_TAPER] == pytest.approx([f for _, f in DC_TAPER])
+    assert table[60] == pytest.approx(0.9)
+
+
+def test_vehicle_tapers_heats_up_and_stops_when_full():
+    ev = Vehicle(capacity_wh=60000, soc=0.1, max_power_w=150000, ambient_c=25)
+    offered = 180000.0
+    curve = []
+    energy = 0.0
+    for _ in range(200):  # 200 x 60 s, far more than needed
+        energy += ev.charge(offered, 60)
+        curve.append((ev.soc, ev.power_w, ev.temperature_c))
+        if ev.full:
+            break
+    assert ev.full and ev.acceptance_w() == 0.0
+    assert energy == pytest.approx(60000 * 0.9)
+    # full power in the middle of the curve, tapering towards the end
+    mid = [p for soc, p, _ in curve if 0.2 < soc < 0.5]
+    late = [p for soc, p, _ in curve if soc > 0.9]
+    assert max(mid) <= 150000 and min(mid) > 0.8 * 150000
+    assert max(late) < 0.3 * 150000
+    assert max(t for _, _, t in curve) > 40
+    # offered power caps what the car draws
+    ev = Vehicle(soc=0.3)
+    ev.charge(50000, 10)
+    assert ev.power_w == 50000
+
+
+def test_hot_vehicle_is_derated():
+    ev = Vehicle(soc=0.3, max_power_w=100000)
+    ev.temperature_c = 55.0
+    assert ev.acceptance_w() == pytest.approx(40000)
+
+
+def test_charging_limit_periods_and_amps():
+    profile = {
+        "charging_profile_purpose": "TxDefaultProfile",
+        "charging_schedule": {
+            "charging_rate_unit": "A",
+            "charging_schedule_period": [{"start_period": 60, "limit": 100}, {"start_period": 0, "limit": 200}],
+        },
+    }
+    limit = ChargingLimit.from_profile(profile, now=1000.0)
+    assert limit.limit_w(400, now=1030.0) == 80000
+    assert limit.limit_w(400, now=1061.0) == 40000
+    assert limit.limit_w(400, now=999.0) is None
+
+
+@pytest.mark.asyncio
+async def test_charging_profile_caps_offered_power():
+    station = SimStation("CP1", "ws://unused/ocpp", connectors=2, meter_rate_w=180000)
+    cp = EVSEChargePoint("CP1", None, station.model, None, None, None)
+    c1, c2 = station.model.get(1), station.model.get(2)
+
+    def profile(purpose, limit):
+        return {
+            "charging_profile_id": 1,
+            "stack_level": 0,
+            "charging_profile_purpose": purpose,
+            "charging_profile_kind": "Relative",
+            "charging_schedule": {
+                "charging_rate_unit": "W",
+                "charging_schedule_period": [{"start_period": 0, "limit": limit}],
+            },
+        }
+
+    # TxProfile needs a running transaction
+    assert (await cp.on_set_charging_profile(1, profile("TxProfile", 50000))).status == "Rejected"
+    assert (await cp.on_set_charging_profile(0, profile("TxDefaultProfile", 90000))).status == "Accepted"
+    assert station.offered_w(c1) == station.offered_w(c2) == 90000
+
+    station.model.assign_tx(1, 7)
+    assert (await cp.on_set_charging_profile(1, profile("TxProfile", 50000))).status == "Accepted"
+    assert station.offered_w(c1) == 50000 and station.offered_w(c2) == 90000
+    station.model.clear_tx(7)  # TxProfile ends with the transaction
+    assert c1.charging_limit is None and station.offered_w(c1) == 180000
+
+    assert (await cp.on_clear_charging_profile(charging_profile_purpose="TxDefaultProfile")).status == "Accepted"
+    assert (await cp.on_clear_charging_profile()).status == "Unknown"
+    assert station.offered_w(c2) == 180000
+
+
+@pytest.mark.asyncio
+async def test_metering_reports_soc_and_suspends_a_full_vehicle():
+    station = SimStation("CP1", "ws://unused/ocpp", meter_rate_w=3_600_000)
+    c = station.model.get(1)
+    c.state = EVSEState.CHARGING
+    station.model.assign_tx(1, 3)
+    c.vehicle = Vehicle(capacity_wh=500, soc=0.5, max_power_w=3_600_000)
+    full = []
+    metering = Metering(
+        station.model, None, station.configuration, station.offered_w,
+        noise_pool=NoisePool(64, 0), on_full=lambda c: full.append(c.id),
+    )
+    metering.transaction_started(1)
+    await asyncio.sleep(0.05)
+    values = {v["measurand"]: v["value"] for v in metering.sample(c, "Sample.Periodic", ["SoC", "Power.Offered"])}
+    assert 50 < float(values["SoC"]) < 100 and values["Power.Offered"] == "3600.0"
+    await asyncio.sleep(1.0)
+    metering.advance(c)
+    assert c.vehicle.full and full == [1]
+    await metering.close()